@@ -4,3 +4,6 @@ class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
     verbose_name = 'Пользователи'
+
+    def ready(self):
+        import accounts.signals
@@ -0,0 +1,36 @@
+"""
+Аутентификация с кэшем строки пользователя.
+
+``AuthenticationMiddleware`` на каждом запросе читает пользователя из БД по id
+из сессии. ``CachedModelBackend`` держит строку в кэше ``AUTH_USER_CACHE_SECONDS``
+секунд; сохранение, удаление пользователя и выход из системы сбрасывают запись
+(см. signals.py). Вместе с сессиями ``cached_db`` (при общем кэше) запрос авторизованного
+пользователя при попадании в кэш не обращается к БД до кода представления.
+
+Права (``user_permissions``, группы) не кэшируются - они загружаются как обычно.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def user_cache_key(user_id):
+    return f'accounts:user:{user_id}'
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = get_user_model()._default_manager.get(pk=user_id)
+            except get_user_model().DoesNotExist:
+                return None
+            cache.set(key, user, settings.AUTH_USER_CACHE_SECONDS)
+        return user if self.user_can_authenticate(user) else None
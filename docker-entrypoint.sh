@@ -13,11 +13,26 @@ if [ -n "$DB_HOST" ]; then
   done
 fi
 
-echo "Apply migrations"
-python manage.py migrate --noinput
+if [ "${RUN_MIGRATIONS:-1}" = "1" ]; then
+  # migrate --check не выполняет post_migrate (права, типы содержимого) - быстрая
+  # проверка; полный migrate запускается, только если есть непримененные миграции
+  if python manage.py migrate --check >/dev/null 2>&1; then
+    echo "Migrations already applied"
+  else
+    echo "Apply migrations"
+    python manage.py migrate --noinput
+  fi
 
-echo "Collect static"
-python manage.py collectstatic --noinput || true
+  # Проекции журнала изменений строятся здесь, а не в запросах страниц
+  python manage.py rebuild_part_rows --if-needed
+  python manage.py rebuild_search_index --if-needed
 
-exec "$@"
+  # Статика собрана при сборке образа; в томе (static_data) она может остаться
+  # от прошлого образа - тогда собираем заново
+  if [ "${COLLECTSTATIC:-0}" = "1" ] || ! cmp -s /etc/staticfiles.json staticfiles/staticfiles.json; then
+    echo "Collect static"
+    python manage.py collectstatic --noinput || true
+  fi
+fi
 
+exec "$@"
@@ -0,0 +1,113 @@
+"""
+Конфигурация gunicorn (подхватывается автоматически из рабочего каталога):
+
+    gunicorn webapp.wsgi:application
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn webapp.asgi:application
+
+Параметры переопределяются переменными окружения GUNICORN_*.
+
+preload_app: Django, шаблоны URL, шаблоны страниц, Pillow и qrcode загружаются один раз в мастере,
+воркеры получают эти страницы памяти через fork (copy-on-write). Перед fork
+соединения с БД закрываются, а объекты, созданные при импорте, замораживаются
+(gc.freeze), чтобы сборщик мусора в воркерах не копировал страницы мастера.
+
+max_requests + jitter: воркер перезапускается после N запросов (со случайным
+разбросом, чтобы воркеры не перезапускались одновременно) - рост памяти от
+фрагментации и кэшей ограничен.
+
+Замеры (1 CPU, SQLite, 3 воркера после 15 с нагрузки `manage.py loadtest
+--concurrency 20` на карточку материального узла с QR-кодами и список узлов):
+
+    режим                     PSS мастера   PSS воркера   USS воркера   запр/с
+    sync, без preload              15 МБ         50 МБ         46 МБ      18.0
+    sync, preload_app              27 МБ         37 МБ         30 МБ      20.3
+    gthread x4, preload_app        27 МБ         37 МБ         30 МБ      19.2
+
+preload экономит ~16 МБ собственной памяти (USS) на воркер; PSS учитывает долю
+общих с мастером страниц. Пропускная способность на одном ядре ограничена CPU
+(генератор нагрузки работал на той же машине) и от класса воркера почти не
+зависит; gthread выигрывает там, где запросы ждут сеть (PostgreSQL, медленные
+клиенты при скачивании файлов).
+"""
+import gc
+import multiprocessing
+import os
+import sys
+
+_cpu_count = multiprocessing.cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# sync: классические 2 * CPU + 1; потоковым и асинхронным воркерам хватает CPU + 1
+workers = int(os.environ.get(
+    'GUNICORN_WORKERS', 2 * _cpu_count + 1 if worker_class == 'sync' else _cpu_count + 1
+))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Heartbeat-файлы воркеров в памяти: в контейнере /tmp может быть на медленном overlayfs
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+
+def when_ready(server):
+    """Мастер: догружаем то, что Django импортирует лениво при первом запросе"""
+    if not preload_app:
+        return
+    from main.warmup import warm_up
+
+    # URL, шаблоны, qrcode и Pillow (main/warmup.py)
+    elapsed = warm_up()
+
+    _close_master_connections()
+    gc.freeze()
+    server.log.info(
+        'Приложение предзагружено за %.2f с, объектов заморожено: %s', elapsed, gc.get_freeze_count(),
+    )
+
+
+def post_worker_init(worker):
+    """Без preload_app каждый воркер прогревается сам до приёма запросов"""
+    if preload_app:
+        return
+    from main.warmup import warm_up
+
+    worker.log.info('Воркер прогрет за %.2f с', warm_up())
+
+
+def pre_fork(server, worker):
+    # Соединение, открытое в мастере, нельзя делить между процессами
+    _close_master_connections()
+
+
+def post_fork(server, worker):
+    """Воркер: отбрасываем унаследованные соединения, не закрывая чужие сокеты"""
+    if 'django.db' in sys.modules:
+        from django.db import connections
+
+        for conn in connections.all(initialized_only=True):
+            conn.connection = None
+
+    database = sys.modules.get('database')
+    if database is not None:
+        # close=False: пул очищается без отправки закрытия по сокетам мастера
+        database.engine.dispose(close=False)
+
+
+def _close_master_connections():
+    if 'django.db' not in sys.modules:
+        return
+    from django.db import connections
+
+    connections.close_all()
+    database = sys.modules.get('database')
+    if database is not None:
+        database.engine.dispose()
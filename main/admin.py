@@ -1,16 +1,38 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from .deletion import find_protected
+from .jobs import enqueue
 from .models import (
     AstralType, AstralVariant, AstralPart, AstralRevision, AstralYear, AstralManufacturer,
     MaterialPart, MaterialGroup, MaterialOperationType, MaterialUser, MaterialStatus,
-    MaterialWarehouse, MaterialOperations
+    MaterialWarehouse, MaterialOperations, BackgroundJob, ChangeLog
 )
 
+@admin.action(description='Удалить выбранные в фоне (со всеми зависимыми)', permissions=['delete'])
+def delete_in_background(modeladmin, request, queryset):
+    """Массовое удаление без загрузки зависимых строк в память (deletion.fast_delete)"""
+    protected = find_protected(queryset)
+    if protected:
+        modeladmin.message_user(
+            request,
+            f'Удаление запрещено: на выбранные объекты ссылаются {protected[0]._meta.verbose_name_plural} '
+            f'({", ".join(str(obj) for obj in protected)})',
+            messages.ERROR,
+        )
+        return
+    ids = list(queryset.values_list('pk', flat=True))
+    job = enqueue('deletion.fast_delete', created_by=request.user, model=queryset.model._meta.label, ids=ids)
+    modeladmin.message_user(
+        request, f'Удаление {len(ids)} объектов поставлено в очередь (задача #{job.pk})', messages.SUCCESS,
+    )
+
+
 # ============== АСТРАЛЬНАЯ ЧАСТЬ ==============
 
 @admin.register(AstralType)
 class AstralTypeAdmin(admin.ModelAdmin):
     list_display = ('name', 'code', 'description')
     search_fields = ('name', 'code')
+    actions = [delete_in_background]
 
 
 @admin.register(AstralVariant)
@@ -34,6 +56,7 @@ class AstralRevisionAdmin(admin.ModelAdmin):
     list_filter = ('release_date',)
     date_hierarchy = 'release_date'
     filter_horizontal = ('astral_parts',)
+    actions = [delete_in_background]
 
     def get_astral_parts(self, obj):
         return ", ".join([part.name for part in obj.astral_parts.all()[:3]])
@@ -60,6 +83,7 @@ class MaterialPartAdmin(admin.ModelAdmin):
     list_display = ('serial', 'astral_revision', 'astral_year', 'astral_manufacturer', 'parent')
     search_fields = ('serial', 'astral_revision__name')
     list_filter = ('astral_year', 'astral_manufacturer')
+    actions = [delete_in_background]
 
 
 @admin.register(MaterialGroup)
@@ -105,3 +129,32 @@ class MaterialOperationsAdmin(admin.ModelAdmin):
     search_fields = ('material_part__serial', 'description')
     list_filter = ('material_operation_type', 'material_status', 'material_warehouse', 'datetime')
     date_hierarchy = 'datetime'
+
+
+# ============== ФОНОВЫЕ ЗАДАЧИ ==============
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'status', 'attempts', 'run_at', 'worker', 'finished_at')
+    list_filter = ('status', 'task')
+    search_fields = ('task', 'error')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'worker', 'result', 'error')
+
+
+# ============== ЖУРНАЛ ИЗМЕНЕНИЙ ==============
+
+@admin.register(ChangeLog)
+class ChangeLogAdmin(admin.ModelAdmin):
+    """Журнал только для просмотра: потребители читают его по курсору"""
+    list_display = ('id', 'entity', 'object_id', 'action', 'created_at')
+    list_filter = ('action', 'entity')
+    search_fields = ('entity',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
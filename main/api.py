@@ -0,0 +1,517 @@
+"""
+JSON API (версия 1) для станций сканирования и интеграции с MES.
+
+    GET  /api/v1/<ресурс>/                    список, постраничная выборка по ключу
+    GET  /api/v1/<ресурс>/<id>/               один объект
+    POST /api/v1/material-operations/         пакетное создание операций
+    POST /api/v1/scans/                       операция для пачки отсканированных узлов
+    GET  /api/v1/sync/reference/              справочники для станций без связи (см. sync.py)
+    POST /api/v1/sync/operations/             выгрузка операций, записанных без связи
+    GET  /api/v1/changes/?after=<курсор>      лента изменений для ERP/BI (см. outbox.py)
+
+Параметры списка:
+    ?fields=id,serial        только нужные поля (id возвращается всегда)
+    ?after=<id>&limit=<n>    следующая страница после id (ссылка в ``next``)
+    ?<фильтр>=<значение>     точные фильтры ресурса (см. ``filters``)
+
+Страница читается одним запросом ``.values()`` - связанные таблицы присоединяются
+только для запрошенных полей; многие-ко-многим добавляют по одному запросу на
+страницу. Ответы сжимаются gzip и содержат ETag: повторный запрос с
+``If-None-Match`` получает 304 без тела.
+
+Создание операций проверяется той же ``MaterialOperationsForm``, что и в
+интерфейсе, и выполняется в одной транзакции: при ошибке в любом элементе не
+сохраняется ничего. Авторизация - сессия Django (как у страниц), изменяющие
+запросы передают CSRF-токен в заголовке ``X-CSRFToken``.
+"""
+import hashlib
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_http_methods
+
+from .forms import MaterialOperationsForm, ScanSessionForm, build_bulk_forms
+from .models import AstralPart, AstralRevision, ChangeLog, MaterialOperations, MaterialPart
+from .outbox import ENTITIES, log_changes, models_version, pruned_sequence, read_changes
+from .scans import record_operations, resolve_scans
+from .sync import build_snapshot, ingest_operations
+
+
+@dataclass
+class ApiResource:
+    """Описание ресурса API: поля ответа и фильтры в виде путей ORM"""
+    model: type
+    fields: dict
+    filters: dict = field(default_factory=dict)
+    # Поля многие-ко-многим: имя поля -> (модель связи, колонка объекта, колонка значения)
+    many: dict = field(default_factory=dict)
+    form: type = None
+    # Модели, из которых строятся строки (для ETag по версии данных), - по путям полей и фильтров
+    models: tuple = field(init=False)
+
+    def __post_init__(self):
+        models = {self.model}
+        for path in [*self.fields.values(), *self.filters.values()]:
+            model = self.model
+            for name in path.split('__')[:-1]:
+                model = model._meta.get_field(name).related_model
+                models.add(model)
+        self.models = tuple(sorted(models, key=lambda model: model._meta.label))
+
+
+RESOURCES = {
+    'material-parts': ApiResource(
+        model=MaterialPart,
+        fields={
+            'id': 'id',
+            'serial': 'serial',
+            'astral_revision': 'astral_revision_id',
+            'astral_revision_name': 'astral_revision__name',
+            'astral_manufacturer': 'astral_manufacturer_id',
+            'astral_manufacturer_name': 'astral_manufacturer__name',
+            'astral_year': 'astral_year_id',
+            'year': 'astral_year__year',
+            'parent': 'parent_id',
+            'parent_serial': 'parent__serial',
+        },
+        filters={
+            'serial': 'serial',
+            'astral_revision': 'astral_revision_id',
+            'astral_manufacturer': 'astral_manufacturer_id',
+            'parent': 'parent_id',
+        },
+    ),
+    'material-operations': ApiResource(
+        model=MaterialOperations,
+        fields={
+            'id': 'id',
+            'datetime': 'datetime',
+            'description': 'description',
+            'material_operation_type': 'material_operation_type_id',
+            'material_operation_type_name': 'material_operation_type__name',
+            'material_user': 'material_user_id',
+            'material_status': 'material_status_id',
+            'material_status_name': 'material_status__name',
+            'material_warehouse': 'material_warehouse_id',
+            'material_warehouse_name': 'material_warehouse__name',
+            'material_part': 'material_part_id',
+            'material_part_serial': 'material_part__serial',
+        },
+        filters={
+            'material_part': 'material_part_id',
+            'serial': 'material_part__serial',
+            'material_status': 'material_status_id',
+            'material_operation_type': 'material_operation_type_id',
+            'material_warehouse': 'material_warehouse_id',
+        },
+        form=MaterialOperationsForm,
+    ),
+    'astral-revisions': ApiResource(
+        model=AstralRevision,
+        fields={
+            'id': 'id',
+            'name': 'name',
+            'description': 'description',
+            'release_date': 'release_date',
+            'parent': 'parent_id',
+        },
+        filters={
+            'parent': 'parent_id',
+            'astral_part': 'astral_parts',
+        },
+        many={
+            'astral_parts': (AstralRevision.astral_parts.through, 'astralrevision_id', 'astralpart_id'),
+        },
+    ),
+    'astral-parts': ApiResource(
+        model=AstralPart,
+        fields={
+            'id': 'id',
+            'name': 'name',
+            'decimal_num': 'decimal_num',
+            'description': 'description',
+            'astral_variant': 'astral_variant_id',
+            'astral_variant_name': 'astral_variant__name',
+        },
+        filters={
+            'decimal_num': 'decimal_num',
+            'astral_variant': 'astral_variant_id',
+        },
+    ),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400, details=None):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def version_etag(request, models):
+    """
+    ETag по версии данных ``models`` до выполнения запроса, как у ``conditional_page``:
+    ``(etag, ответ 304 или None)``. Пока версия не устоялась - ``(None, None)``, и
+    ETag считается по телу ответа.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None, None
+    version = models_version(models)
+    if version is None:
+        return None, None
+    etag = '"%s"' % hashlib.md5(f'{version}|{request.get_full_path()}'.encode()).hexdigest()
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+    return etag, not_modified
+
+
+def json_response(request, data, status=200, etag=None):
+    """JSON-ответ с ETag (по умолчанию - по телу); для GET с совпадающим If-None-Match - 304 без тела"""
+    body = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8')
+    etag = etag or f'"{hashlib.md5(body).hexdigest()}"'
+    if request.method in ('GET', 'HEAD') and status == 200:
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+    response = HttpResponse(body, status=status, content_type='application/json; charset=utf-8')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def error_response(request, exc):
+    """Ответ API с описанием ошибки ``ApiError``"""
+    data = {'error': str(exc)}
+    if exc.details is not None:
+        data['details'] = exc.details
+    return json_response(request, data, status=exc.status)
+
+
+NOT_AUTHENTICATED = 'Требуется авторизация'
+
+
+def api_view(view):
+    """Авторизация, gzip и единый формат ошибок для представлений API"""
+    @gzip_page
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error_response(request, ApiError(NOT_AUTHENTICATED, status=401))
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as exc:
+            return error_response(request, exc)
+    return wrapper
+
+
+def get_resource(name):
+    resource = RESOURCES.get(name)
+    if resource is None:
+        raise ApiError(f'Неизвестный ресурс: {name}', status=404)
+    return resource
+
+
+def _selected_fields(request, resource):
+    available = list(resource.fields) + list(resource.many)
+    requested = request.GET.get('fields')
+    if not requested:
+        return available
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}', details={'available': available})
+    return ['id'] + [name for name in names if name != 'id']
+
+
+def _int_param(request, name, default):
+    value = request.GET.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ApiError(f'Параметр {name} должен быть целым числом')
+
+
+def serialize_rows(resource, queryset, names):
+    """Строки ресурса со столбцами ``names``: один запрос + по одному на поле многие-ко-многим"""
+    plain = [name for name in names if name in resource.fields]
+    rows = [
+        {name: row[resource.fields[name]] for name in plain}
+        for row in queryset.values(*[resource.fields[name] for name in plain])
+    ]
+    ids = [row['id'] for row in rows]
+    for name in names:
+        if name not in resource.many or not ids:
+            continue
+        through, owner_column, value_column = resource.many[name]
+        related = {}
+        links = through.objects.filter(**{f'{owner_column}__in': ids}).order_by(value_column)
+        for owner_id, value in links.values_list(owner_column, value_column):
+            related.setdefault(owner_id, []).append(value)
+        for row in rows:
+            row[name] = related.get(row['id'], [])
+    return rows
+
+
+@api_view
+@require_http_methods(['GET', 'HEAD', 'POST'])
+def api_list(request, resource_name):
+    resource = get_resource(resource_name)
+    if request.method == 'POST':
+        if resource.form is None:
+            raise ApiError('Создание объектов этого ресурса через API не поддерживается', status=405)
+        return _bulk_create(request, resource)
+
+    names = _selected_fields(request, resource)
+    etag, not_modified = version_etag(request, resource.models)
+    if not_modified is not None:
+        return not_modified
+    limit = min(max(_int_param(request, 'limit', settings.API_PAGE_SIZE), 1), settings.API_MAX_PAGE_SIZE)
+    after = _int_param(request, 'after', None)
+
+    queryset = resource.model.objects.order_by('id')
+    for param, lookup in resource.filters.items():
+        value = request.GET.get(param)
+        if value not in (None, ''):
+            try:
+                queryset = queryset.filter(**{lookup: value})
+            except (ValueError, ValidationError):
+                raise ApiError(f'Некорректное значение фильтра {param}')
+    if resource.many and any(lookup in resource.many for lookup in resource.filters.values()):
+        queryset = queryset.distinct()
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+
+    # Один лишний элемент показывает, есть ли следующая страница
+    rows = serialize_rows(resource, queryset[:limit + 1], names)
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        params = request.GET.copy()
+        params['after'] = rows[-1]['id']
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+    return json_response(request, {'results': rows, 'next': next_url}, etag=etag)
+
+
+@api_view
+@require_http_methods(['GET', 'HEAD'])
+def api_detail(request, resource_name, object_id):
+    resource = get_resource(resource_name)
+    names = _selected_fields(request, resource)
+    etag, not_modified = version_etag(request, resource.models)
+    if not_modified is not None:
+        return not_modified
+    rows = serialize_rows(resource, resource.model.objects.filter(id=object_id), names)
+    if not rows:
+        raise ApiError('Объект не найден', status=404)
+    return json_response(request, rows[0], etag=etag)
+
+
+# ============== ПАКЕТНОЕ СОЗДАНИЕ ==============
+
+def parse_items(request, key='items'):
+    """Список объектов из JSON-тела: ``[...]`` или ``{"items": [...]}``"""
+    try:
+        payload = json.loads(request.body or b'null')
+    except ValueError:
+        raise ApiError('Тело запроса должно быть JSON')
+    items = payload.get(key) if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ApiError(f'Ожидается список объектов или {{"{key}": [...]}}')
+    if not items:
+        raise ApiError('Пустой список')
+    if len(items) > settings.API_BULK_MAX_ITEMS:
+        raise ApiError(f'Не больше {settings.API_BULK_MAX_ITEMS} объектов за запрос')
+    return items
+
+
+def validate_items(form_class, items):
+    """Проверяет все элементы; при ошибках - ApiError с ошибками по индексам"""
+    form_list = build_bulk_forms(form_class, items)
+    errors = {
+        index: form.errors.get_json_data()
+        for index, form in enumerate(form_list) if not form.is_valid()
+    }
+    if errors:
+        raise ApiError('Ошибки в данных, ничего не сохранено', details=errors)
+    return [form.save(commit=False) for form in form_list]
+
+
+def _bulk_create(request, resource):
+    objects = validate_items(resource.form, parse_items(request))
+    with transaction.atomic():
+        created = resource.model.objects.bulk_create(objects, batch_size=500)
+        log_changes(created, ChangeLog.ACTION_SAVE)
+    return json_response(request, {'created': [obj.id for obj in created]}, status=201)
+
+
+# ============== СКАНИРОВАНИЕ ==============
+
+@api_view
+@require_http_methods(['POST'])
+def api_scans(request):
+    """
+    ``{"scans": [...], "material_operation_type": id, "material_status": id,
+    "material_warehouse": id, "material_user": id, "datetime": ..., "description": ...}``
+    """
+    try:
+        payload = json.loads(request.body or b'null')
+    except ValueError:
+        raise ApiError('Тело запроса должно быть JSON')
+    if not isinstance(payload, dict):
+        raise ApiError('Ожидается JSON-объект')
+    scans = payload.get('scans')
+    if not isinstance(scans, list) or not all(isinstance(scan, str) for scan in scans):
+        raise ApiError('scans - список строк')
+    if len(scans) > settings.API_BULK_MAX_ITEMS:
+        raise ApiError(f'Не больше {settings.API_BULK_MAX_ITEMS} сканов за запрос')
+
+    form = ScanSessionForm(data={**payload, 'scans': '\n'.join(scans)})
+    if not form.is_valid():
+        raise ApiError('Ошибки в данных, ничего не сохранено', details=form.errors.get_json_data())
+    parts, unknown = resolve_scans(form.scan_list())
+    if unknown:
+        raise ApiError('Не найдены узлы, ничего не сохранено', details={'unknown': unknown})
+
+    data = form.cleaned_data
+    created = record_operations(
+        parts,
+        material_operation_type=data['material_operation_type'],
+        material_status=data['material_status'],
+        material_warehouse=data['material_warehouse'],
+        material_user=data['material_user'],
+        datetime=data['datetime'],
+        description=data['description'],
+    )
+    return json_response(request, {
+        'created': [
+            {'id': operation.id, 'material_part': operation.material_part_id, 'serial': operation.material_part.serial}
+            for operation in created
+        ],
+    }, status=201)
+
+
+# ============== СИНХРОНИЗАЦИЯ СТАНЦИЙ ==============
+
+@api_view
+@require_http_methods(['GET', 'HEAD'])
+def api_sync_reference(request):
+    """Снимок справочников; с ``?since=<токен>`` - только изменения после токена"""
+    return json_response(request, build_snapshot(since=_int_param(request, 'since', None)))
+
+
+@api_view
+@require_http_methods(['POST'])
+def api_sync_operations(request):
+    """Очередь операций станции: ``[{"uuid": ..., <поля операции>}, ...]``"""
+    accepted, rejected = ingest_operations(parse_items(request))
+    return json_response(request, {'accepted': accepted, 'rejected': rejected})
+
+
+# ============== ЛЕНТА ИЗМЕНЕНИЙ ==============
+
+def changes_params(request):
+    """
+    Параметры ленты изменений: ``(after, limit, wait, entities)``.
+
+    Курсор до границы удалённых по сроку хранения записей продолжить нельзя -
+    ошибка 410, потребитель выполняет полную выгрузку и продолжает с ``pruned``.
+    """
+    after = max(_int_param(request, 'after', 0), 0)
+    limit = min(max(_int_param(request, 'limit', settings.API_PAGE_SIZE), 1), settings.API_MAX_PAGE_SIZE)
+    wait = min(max(_int_param(request, 'wait', 0), 0), settings.CHANGES_MAX_WAIT)
+    entities = [name.strip() for name in request.GET.get('entity', '').split(',') if name.strip()]
+    unknown = [name for name in entities if name not in ENTITIES]
+    if unknown:
+        raise ApiError(f'Неизвестные сущности: {", ".join(unknown)}', details={'available': list(ENTITIES)})
+    pruned = pruned_sequence()
+    if after < pruned:
+        raise ApiError(
+            'Курсор устарел: записи журнала до него удалены по сроку хранения',
+            status=410, details={'pruned': pruned},
+        )
+    return after, limit, wait, entities
+
+
+def changes_page(changes, cursor, limit):
+    return {
+        'results': [
+            {
+                'seq': change['id'],
+                'entity': change['entity'],
+                'id': change['object_id'],
+                'action': change['action'],
+                'at': change['created_at'],
+                'data': change['payload'],
+            }
+            for change in changes
+        ],
+        'cursor': cursor,
+        'more': len(changes) == limit,
+    }
+
+
+_waiters_lock = threading.Lock()
+_waiters = 0
+
+
+@contextmanager
+def _waiter_slot():
+    """Место для ожидания в длинном опросе: не больше ``CHANGES_MAX_WAITERS`` потоков процесса"""
+    global _waiters
+    with _waiters_lock:
+        acquired = _waiters < settings.CHANGES_MAX_WAITERS
+        if acquired:
+            _waiters += 1
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with _waiters_lock:
+                _waiters -= 1
+
+
+@api_view
+@require_http_methods(['GET', 'HEAD'])
+def api_changes(request):
+    """
+    Изменения после курсора: ``?after=<курсор>&limit=<n>&entity=main.materialpart,...``
+
+    С ``?wait=<секунды>`` запрос ждёт новых изменений (длинный опрос) не дольше
+    ``CHANGES_MAX_WAIT``; пустой ответ означает, что нужно повторить запрос с тем же
+    курсором. Курсор из ответа сохраняется потребителем после обработки страницы.
+
+    Ожидание занимает поток воркера, поэтому ждут не больше ``CHANGES_MAX_WAITERS``
+    запросов процесса; остальные получают ответ сразу, пустой - с ``Retry-After``.
+    В режиме ASGI ленту обслуживает ``async_views.api_changes`` без ограничения.
+    """
+    after, limit, wait, entities = changes_params(request)
+    with _waiter_slot() as acquired:
+        deadline = time.monotonic() + (wait if acquired else 0)
+        while True:
+            changes, cursor = read_changes(after, limit, entities)
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                break
+            time.sleep(min(settings.CHANGES_POLL_INTERVAL, remaining))
+
+    response = json_response(request, changes_page(changes, cursor, limit))
+    if wait and not acquired and not changes:
+        response['Retry-After'] = math.ceil(settings.CHANGES_POLL_INTERVAL)
+    return response
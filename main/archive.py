@@ -0,0 +1,254 @@
+"""
+Холодное хранилище для старых записей журнала операций.
+
+Операции старше заданного горизонта переносятся из таблицы ``material_operations``
+в сжатые сегменты (gzip JSONL) в каталоге ``settings.ARCHIVE_ROOT``. Строки внутри
+сегмента отсортированы по ``material_part_id``, а манифест ``index.json`` хранит
+для каждого сегмента диапазон дат и отсортированный список id узлов (разреженный
+индекс), поэтому чтение истории одного узла открывает только нужные сегменты.
+"""
+import bisect
+import gzip
+import json
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ChangeLog, MaterialOperations
+from .outbox import log_changes
+from .projections import advisory_lock
+
+MANIFEST_NAME = 'index.json'
+MANIFEST_LOCK = 'archive:manifest'
+FORMAT_VERSION = 1
+
+_manifest_cache = {}
+_manifest_lock = threading.Lock()
+
+
+@dataclass
+class ArchivedOperation:
+    """Операция, прочитанная из архива (имена справочников сохранены на момент архивации)"""
+    id: int
+    material_part_id: int
+    datetime: object
+    operation_type: str
+    user: str
+    status: str
+    warehouse: str
+    description: str = ''
+    file: str = ''
+    image: str = ''
+
+
+def get_archive_root():
+    return Path(settings.ARCHIVE_ROOT)
+
+
+def get_horizon():
+    """Граница архивации: всё, что старше, уходит в холодное хранилище"""
+    return timezone.now() - timedelta(days=settings.ARCHIVE_HORIZON_DAYS)
+
+
+# ============== Манифест ==============
+
+def _manifest_path():
+    return get_archive_root() / MANIFEST_NAME
+
+
+def load_manifest():
+    """Загружает манифест архива (с кэшированием по отметке изменения файла)"""
+    path = _manifest_path()
+    try:
+        stamp = _stat_stamp(path)
+    except FileNotFoundError:
+        return {'version': FORMAT_VERSION, 'segments': []}
+
+    with _manifest_lock:
+        cached = _manifest_cache.get(str(path))
+        if cached and cached[0] == stamp:
+            return cached[1]
+        with open(path, encoding='utf-8') as fh:
+            manifest = json.load(fh)
+        _manifest_cache[str(path)] = (stamp, manifest)
+        return manifest
+
+
+def _stat_stamp(path):
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+
+def _save_manifest(manifest):
+    root = get_archive_root()
+    tmp_path = root / f'{MANIFEST_NAME}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, ensure_ascii=False)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, _manifest_path())
+    with _manifest_lock:
+        _manifest_cache[str(_manifest_path())] = (_stat_stamp(_manifest_path()), manifest)
+
+
+# ============== Запись ==============
+
+def _serialize(op):
+    return {
+        'id': op.id,
+        'material_part_id': op.material_part_id,
+        'datetime': op.datetime.isoformat(),
+        'operation_type': op.material_operation_type.name,
+        'user': str(op.material_user),
+        'status': op.material_status.name,
+        'warehouse': op.material_warehouse.name,
+        'material_operation_type_id': op.material_operation_type_id,
+        'material_user_id': op.material_user_id,
+        'material_status_id': op.material_status_id,
+        'material_warehouse_id': op.material_warehouse_id,
+        'description': op.description,
+        'file': op.file.name if op.file else '',
+        'image': op.image.name if op.image else '',
+    }
+
+
+def _write_segment(operations):
+    """Пишет сегмент на диск и возвращает его описание для манифеста"""
+    root = get_archive_root()
+    root.mkdir(parents=True, exist_ok=True)
+    name = f"operations-{timezone.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+    tmp_path = root / f'{name}.tmp'
+
+    part_ids = []
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as fh:
+        for op in operations:
+            # Префикс с id узла позволяет пропускать чужие строки без разбора JSON
+            fh.write(f"{op.material_part_id}\t{json.dumps(_serialize(op), ensure_ascii=False)}\n")
+            if not part_ids or part_ids[-1] != op.material_part_id:
+                part_ids.append(op.material_part_id)
+    os.replace(tmp_path, root / name)
+
+    datetimes = [op.datetime for op in operations]
+    return {
+        'name': name,
+        'rows': len(operations),
+        'min_datetime': min(datetimes).isoformat(),
+        'max_datetime': max(datetimes).isoformat(),
+        'part_ids': part_ids,
+    }
+
+
+def _delete_rows(operations):
+    """
+    Удаляет перенесённые строки запросом DELETE, без сигналов ``post_delete``:
+    архивные записи продолжают ссылаться на прикреплённые файлы, и хранилище не
+    должно их освобождать, а журнал изменений пишется одной пачкой.
+    """
+    table = connection.ops.quote_name(MaterialOperations._meta.db_table)
+    ids = [op.id for op in operations]
+    with connection.cursor() as cursor:
+        # Пачками: число параметров запроса ограничено (SQLite)
+        for start in range(0, len(ids), 1000):
+            chunk = ids[start:start + 1000]
+            cursor.execute(f'DELETE FROM {table} WHERE id IN ({", ".join(["%s"] * len(chunk))})', chunk)
+
+
+def archive_operations(before=None, segment_rows=None, dry_run=False):
+    """
+    Переносит операции старше ``before`` в архив.
+
+    Каждый сегмент регистрируется в манифесте до фиксации удаления строк,
+    поэтому сбой посередине может дать дубликаты (их отбрасывает чтение по id),
+    но не потерю данных. Возвращает количество перенесённых операций.
+    """
+    before = before or get_horizon()
+    segment_rows = segment_rows or settings.ARCHIVE_SEGMENT_ROWS
+
+    queryset = MaterialOperations.objects.filter(datetime__lt=before)
+    if dry_run:
+        return queryset.count()
+
+    queryset = queryset.select_related(
+        'material_operation_type', 'material_user', 'material_status', 'material_warehouse'
+    ).order_by('material_part_id', 'datetime', 'id')
+
+    archived = 0
+    while True:
+        with transaction.atomic():
+            operations = list(queryset.select_for_update(of=('self',))[:segment_rows])
+            if not operations:
+                break
+            segment = _write_segment(operations)
+            # Чтение и запись манифеста - под блокировкой: параллельная архивация
+            # (другой процесс) иначе потеряет свой сегмент
+            with advisory_lock(MANIFEST_LOCK, wait=True):
+                manifest = load_manifest()
+                _save_manifest({
+                    'version': FORMAT_VERSION,
+                    'segments': manifest['segments'] + [segment],
+                })
+            _delete_rows(operations)
+            log_changes(operations, ChangeLog.ACTION_DELETE)
+        archived += len(operations)
+    return archived
+
+
+# ============== Чтение ==============
+
+def _segments_for_part(part_id):
+    for segment in load_manifest()['segments']:
+        part_ids = segment['part_ids']
+        index = bisect.bisect_left(part_ids, part_id)
+        if index < len(part_ids) and part_ids[index] == part_id:
+            yield segment
+
+
+def has_archived_operations(part_id):
+    """Есть ли у узла операции в архиве (проверка только по манифесту)"""
+    return next(_segments_for_part(part_id), None) is not None
+
+
+def get_archived_operations(part_id):
+    """Возвращает архивные операции узла, отсортированные от новых к старым"""
+    prefix = f'{part_id}\t'
+    root = get_archive_root()
+    seen = set()
+    result = []
+
+    for segment in _segments_for_part(part_id):
+        found = False
+        with gzip.open(root / segment['name'], 'rt', encoding='utf-8') as fh:
+            for line in fh:
+                if not line.startswith(prefix):
+                    if found:
+                        # Строки отсортированы по узлу - дальше искать нечего
+                        break
+                    continue
+                found = True
+                data = json.loads(line[len(prefix):])
+                if data['id'] in seen:
+                    continue
+                seen.add(data['id'])
+                result.append(ArchivedOperation(
+                    id=data['id'],
+                    material_part_id=data['material_part_id'],
+                    datetime=parse_datetime(data['datetime']),
+                    operation_type=data['operation_type'],
+                    user=data['user'],
+                    status=data['status'],
+                    warehouse=data['warehouse'],
+                    description=data['description'],
+                    file=data['file'],
+                    image=data['image'],
+                ))
+
+    result.sort(key=lambda op: (op.datetime, op.id), reverse=True)
+    return result
@@ -0,0 +1,306 @@
+"""
+Асинхронные версии представлений только для чтения (режим ASGI, см. ``webapp/asgi.py``).
+
+Данные читаются асинхронным ORM, построение QR-кодов (нагрузка на CPU) уходит в
+отдельный пул потоков, файлы отдаются асинхронными итераторами. Пока запрос ждёт БД,
+диск или QR-код, процесс обслуживает другие запросы - в отличие от синхронного
+воркера gunicorn, который занят запросом целиком.
+
+Запросы и контекст страниц общие с синхронными представлениями из ``views.py``;
+шаблоны рендерятся через ``sync_to_async``, поэтому случайное ленивое обращение к
+связанному объекту в шаблоне не ломает страницу.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.files.storage import default_storage
+from django.db.models import QuerySet
+from django.http import Http404, HttpResponseNotAllowed, StreamingHttpResponse
+from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+
+from . import api, live, views
+from .conditional import conditional_page
+from .downloads import DOWNLOAD_FIELDS, DOWNLOAD_MODELS, _aiter_range, serve_field_file
+from .outbox import read_changes
+from .qr_utils import generate_qr_code, get_astral_revision_info_text, get_material_part_info_text
+from .renditions import RENDITION_FORMATS, RENDITION_MODELS, RENDITION_SIZES, ensure_rendition
+from .streaming import astream_page
+
+_cpu_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_CPU_WORKERS, thread_name_prefix='cpu')
+
+
+def async_login_required(view):
+    """Аналог login_required для асинхронных представлений"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # Пользователь загружается из сессии один раз, дальше request.user без запросов к БД
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def _aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'{queryset.model._meta.object_name} не найден')
+
+
+async def _evaluate(context):
+    """Выполняет ленивые запросы контекста асинхронно, до рендеринга шаблона"""
+    for key, value in context.items():
+        if isinstance(value, QuerySet):
+            context[key] = [item async for item in value]
+    return context
+
+
+async def _render(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, await _evaluate(context))
+
+
+async def _qr_codes(url, info_text):
+    """Оба QR-кода страницы строятся параллельно в пуле потоков"""
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(
+        loop.run_in_executor(_cpu_executor, generate_qr_code, url),
+        loop.run_in_executor(_cpu_executor, generate_qr_code, info_text, (250, 250)),
+    )
+
+
+# ============== СПИСКИ ==============
+
+@async_login_required
+@conditional_page(*views.PARTS_LIST_MODELS)
+async def material_parts_list(request):
+    """Список материальных узлов"""
+    # Догонка проекции, страница по курсору и последние операции выполняются в потоке
+    context = await sync_to_async(views.material_parts_list_context)(request)
+    if context['show_all']:
+        return await astream_page(request, 'main/material_parts_list.html', await _evaluate(context))
+    return await _render(request, 'main/material_parts_list.html', context)
+
+
+@async_login_required
+@conditional_page(*views.OPERATIONS_MODELS)
+async def operations_list(request):
+    """Список операций (журнал); строки таблицы отдаются потоком"""
+    context = await sync_to_async(views.operations_list_context)(request)
+    return await astream_page(request, 'main/operations_list.html', await _evaluate(context))
+
+
+@async_login_required
+@conditional_page(*views.REVISIONS_MODELS)
+async def astral_revisions_list(request):
+    """Список астральных ревизий"""
+    return await _render(request, 'main/astral_revisions_list.html', views.astral_revisions_list_context(request))
+
+
+@async_login_required
+@conditional_page(*views.ASTRAL_PARTS_MODELS)
+async def astral_parts_list(request):
+    """Список астральных узлов"""
+    # Количества фасетов считаются запросом внутри построения контекста
+    context = await sync_to_async(views.astral_parts_list_context)(request)
+    return await _render(request, 'main/astral_parts_list.html', context)
+
+
+@async_login_required
+async def operations_stream(request):
+    """
+    Живой журнал операций (text/event-stream).
+
+    Открытое соединение ждёт событий в очереди и не занимает ни поток, ни
+    соединение с БД: все клиенты процесса обслуживает один слушатель
+    ``live.broadcaster``.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=settings.LIVE_QUEUE_SIZE)
+
+    def deliver(events):
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(_offer, queue, events)
+
+    # Подписка до чтения пропущенного: события между чтением и подпиской не теряются
+    unsubscribe = live.broadcaster.subscribe(deliver)
+    try:
+        after = live.stream_cursor(request)
+        if after is None:
+            after = await sync_to_async(live.last_operation_id)()
+        backfill = await sync_to_async(live.operation_events)(after, settings.LIVE_BATCH_SIZE)
+    except BaseException:
+        unsubscribe()
+        raise
+    response = StreamingHttpResponse(
+        _event_stream(queue, backfill, after, unsubscribe), content_type='text/event-stream'
+    )
+    return live.prepare_stream_response(response)
+
+
+def _offer(queue, events):
+    if queue.full():
+        # Клиент не успевает читать: очищаем очередь и закрываем поток,
+        # браузер переподключится с Last-Event-ID и дочитает из БД
+        while not queue.empty():
+            queue.get_nowait()
+        events = None
+    queue.put_nowait(events)
+
+
+async def _event_stream(queue, backfill, last_id, unsubscribe):
+    loop = asyncio.get_running_loop()
+    # Поток ограничен по времени: Django 4.2 не прерывает ответ при отключении
+    # клиента, а EventSource сам переподключается с Last-Event-ID
+    deadline = loop.time() + settings.LIVE_STREAM_SECONDS
+    try:
+        yield f'retry: {settings.LIVE_RETRY_MS}\n\n'
+        for event in backfill:
+            last_id = event['id']
+            yield live.format_event(event)
+        if len(backfill) == settings.LIVE_BATCH_SIZE:
+            # Пропущено больше пачки - остальное клиент дочитает при переподключении
+            return
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                events = await asyncio.wait_for(queue.get(), timeout=min(settings.LIVE_HEARTBEAT, remaining))
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if events is None:
+                return
+            for event in events:
+                if event['id'] > last_id:
+                    last_id = event['id']
+                    yield live.format_event(event)
+    finally:
+        unsubscribe()
+
+
+# ============== КАРТОЧКИ ==============
+
+@async_login_required
+@conditional_page(*views.PART_DETAIL_MODELS)
+async def material_part_detail(request, part_id):
+    """Детальная информация о материальном узле"""
+    part = await _aget_object_or_404(views.material_part_detail_queryset(), pk=part_id)
+    context = await sync_to_async(views.material_part_detail_context)(request, part)
+
+    info_text = await sync_to_async(get_material_part_info_text)(part)
+    url = request.build_absolute_uri(f'/material-parts/{part.id}/')
+    context['qr_url'], context['qr_info'] = await _qr_codes(url, info_text)
+    return await _render(request, 'main/material_part_detail.html', context)
+
+
+@async_login_required
+@conditional_page(*views.OPERATION_DETAIL_MODELS)
+async def operation_detail(request, operation_id):
+    """Детальная информация об операции"""
+    operation = await _aget_object_or_404(views.operation_detail_queryset(), pk=operation_id)
+    context = {
+        'operation': operation,
+        'is_admin': views.is_admin(request.user)
+    }
+    return await _render(request, 'main/operation_detail.html', context)
+
+
+@async_login_required
+@conditional_page(*views.REVISION_DETAIL_MODELS)
+async def astral_revision_detail(request, revision_id):
+    """Детальная информация об астральной ревизии"""
+    revision = await _aget_object_or_404(views.astral_revision_detail_queryset(), pk=revision_id)
+    context = views.astral_revision_detail_context(request, revision)
+
+    info_text = await sync_to_async(get_astral_revision_info_text)(revision)
+    url = request.build_absolute_uri(f'/astral-revisions/{revision.id}/')
+    context['qr_url'], context['qr_info'] = await _qr_codes(url, info_text)
+    return await _render(request, 'main/astral_revision_detail.html', context)
+
+
+@async_login_required
+@conditional_page(*views.ASTRAL_PARTS_MODELS)
+async def astral_part_detail(request, part_id):
+    """Детальная информация об астральном узле"""
+    part = await _aget_object_or_404(views.astral_part_detail_queryset(), pk=part_id)
+    context = {
+        'part': part,
+        'revisions': part.revisions.all(),
+        'is_admin': views.is_admin(request.user)
+    }
+    return await _render(request, 'main/astral_part_detail.html', context)
+
+
+# ============== ФАЙЛЫ И ИЗОБРАЖЕНИЯ ==============
+
+@async_login_required
+async def media_download(request, kind, object_id, field):
+    """Скачивание файла или изображения операции / ревизии"""
+    model = DOWNLOAD_MODELS.get(kind)
+    if model is None or field not in DOWNLOAD_FIELDS:
+        raise Http404
+    obj = await _aget_object_or_404(model.objects.only(field), pk=object_id)
+    field_file = getattr(obj, field)
+    if not field_file:
+        raise Http404
+    return await sync_to_async(serve_field_file, thread_sensitive=False)(
+        request, field_file, as_attachment=request.GET.get('inline') != '1', asynchronous=True,
+    )
+
+
+@async_login_required
+async def image_rendition(request, kind, object_id, size, fmt):
+    """Уменьшенная копия изображения операции или ревизии"""
+    model = RENDITION_MODELS.get(kind)
+    if model is None or size not in RENDITION_SIZES or fmt not in RENDITION_FORMATS:
+        raise Http404
+    obj = await _aget_object_or_404(model.objects.only('image'), pk=object_id)
+    if not obj.image:
+        raise Http404
+
+    # Если фоновая генерация ещё не успела, копия создаётся в пуле потоков
+    loop = asyncio.get_running_loop()
+    name = await loop.run_in_executor(
+        _cpu_executor, ensure_rendition, obj.image.storage, obj.image.name, size, fmt
+    )
+    fh = await sync_to_async(default_storage.open, thread_sensitive=False)(name, 'rb')
+    length = await sync_to_async(default_storage.size, thread_sensitive=False)(name)
+    response = StreamingHttpResponse(_aiter_range(fh, 0, length), content_type=RENDITION_FORMATS[fmt][1])
+    response['Content-Length'] = str(length)
+    # URL содержит версию изображения (?v=...), поэтому ответ можно кэшировать навсегда
+    patch_cache_control(response, private=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response
+
+
+# ============== ЛЕНТА ИЗМЕНЕНИЙ ==============
+
+async def api_changes(request):
+    """
+    Лента изменений (см. ``api.api_changes``) для режима ASGI: длинный опрос ждёт
+    в ``asyncio.sleep`` и не занимает поток, поэтому число ожидающих клиентов не
+    ограничено. Ответ не сжимается: ``gzip_page`` в Django 4.2 не поддерживает
+    асинхронные представления.
+    """
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return api.error_response(request, api.ApiError(api.NOT_AUTHENTICATED, status=401))
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    try:
+        after, limit, wait, entities = await sync_to_async(api.changes_params)(request)
+    except api.ApiError as exc:
+        return api.error_response(request, exc)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        changes, cursor = await sync_to_async(read_changes)(after, limit, entities)
+        remaining = deadline - loop.time()
+        if changes or remaining <= 0:
+            break
+        await asyncio.sleep(min(settings.CHANGES_POLL_INTERVAL, remaining))
+    return api.json_response(request, api.changes_page(changes, cursor, limit))
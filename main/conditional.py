@@ -0,0 +1,113 @@
+"""
+Условные GET-запросы для страниц списков и карточек.
+
+Версия страницы - номер последней записи журнала изменений (outbox.py) по
+моделям, из которых она строится. ETag складывается из версии, адреса
+страницы, пользователя, CSRF-cookie и отметки шаблонов; если браузер прислал
+тот же ETag в ``If-None-Match``, страница отвечает 304 без основных запросов
+и рендеринга шаблона. Проверка версии - один короткий запрос по индексу.
+
+ETag не выдаётся, пока версия не «устоялась» (см. ``models_version``), и когда у
+пользователя есть непоказанные сообщения - они выводятся в шаблоне.
+"""
+import asyncio
+import hashlib
+from functools import lru_cache, wraps
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.messages.storage.base import BaseStorage
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+
+from .outbox import models_version
+
+
+@lru_cache(maxsize=None)
+def _templates_stamp():
+    """Отметка шаблонов: после выкладки новых шаблонов прежние ETag недействительны"""
+    stamp = 0
+    for directory in settings.TEMPLATES[0]['DIRS']:
+        for path in Path(directory).rglob('*.html'):
+            stamp = max(stamp, path.stat().st_mtime_ns)
+    return stamp
+
+
+def _has_pending_messages(request):
+    storage = messages.get_messages(request)
+    if not isinstance(storage, BaseStorage):
+        # Запрос без MessageMiddleware
+        return False
+    pending = bool(list(storage))
+    # Перебор помечает сообщения прочитанными - возвращаем их для шаблона
+    storage.used = False
+    return pending
+
+
+def page_etag(*models):
+    """Функция ETag для ``condition``: страница зависит от данных ``models``"""
+    def etag_func(request, *args, **kwargs):
+        if _has_pending_messages(request):
+            return None
+        version = models_version(models)
+        if version is None:
+            return None
+        key = '|'.join(str(part) for part in (
+            version, request.get_host(), request.get_full_path(), request.user.pk,
+            request.user.is_staff, request.user.is_superuser,
+            request.META.get('CSRF_COOKIE', ''), _templates_stamp(),
+        ))
+        return hashlib.md5(key.encode()).hexdigest()
+    return etag_func
+
+
+def conditional_page(*models):
+    """
+    ETag и 304 для страницы (синхронной или асинхронной), построенной из ``models``.
+
+    Ставится под ``login_required``: анонимный запрос перенаправляется на вход, а
+    не получает 304.
+    """
+    etag_func = page_etag(*models)
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            return _async_condition(view, etag_func)
+
+        conditional_view = condition(etag_func=etag_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            return _revalidate(response)
+        return wrapper
+    return decorator
+
+
+def _async_condition(view, etag_func):
+    """``condition`` для асинхронных представлений (в Django 4.2 он только синхронный)"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        etag = None
+        if request.method in ('GET', 'HEAD'):
+            etag = await sync_to_async(etag_func)(request, *args, **kwargs)
+        if etag is not None:
+            etag = quote_etag(etag)
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                not_modified['ETag'] = etag
+                return _revalidate(not_modified)
+        response = await view(request, *args, **kwargs)
+        if etag is not None and response.status_code == 200 and not response.has_header('ETag'):
+            response['ETag'] = etag
+        return _revalidate(response)
+    return wrapper
+
+
+def _revalidate(response):
+    # Страница персональная и проверяется при каждом показе
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
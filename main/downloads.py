@@ -0,0 +1,182 @@
+"""
+Отдача загруженных файлов (чертежи, протоколы испытаний, изображения).
+
+Файлы отдаются потоково с поддержкой HTTP Range / If-Range для докачки, ETag и
+Content-Length. Если перед приложением стоит обратный прокси, передача делегируется
+ему через ``X-Accel-Redirect`` (nginx) или ``X-Sendfile`` (Apache, lighttpd), и
+воркер gunicorn освобождается сразу после проверки прав.
+
+В режиме ASGI тело отдаётся асинхронным итератором: синхронный итератор Django
+перед отправкой целиком прочитал бы файл в память.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+from .models import AstralRevision, MaterialOperations
+
+# Модели и поля, файлы которых можно скачать
+DOWNLOAD_MODELS = {
+    'operation': MaterialOperations,
+    'revision': AstralRevision,
+}
+DOWNLOAD_FIELDS = ('file', 'image')
+
+CHUNK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _etag(field_file, size, mtime):
+    digest = hashlib.md5(f'{field_file.name}:{size}:{mtime}'.encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+def _parse_range(header, size):
+    """
+    Разбирает заголовок Range с одним диапазоном.
+
+    Возвращает (start, end) включительно, None если заголовок не поддерживается
+    (тогда отдаётся весь файл) или False если диапазон невыполним.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N: последние N байт
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _range_allowed(request, etag, mtime):
+    """If-Range: диапазон отдаётся, только если файл не изменился"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def _iter_range(fh, start, length):
+    try:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+async def _aiter_range(fh, start, length):
+    # Чтение с диска в пуле потоков, цикл событий не блокируется
+    read = sync_to_async(fh.read, thread_sensitive=False)
+    try:
+        await sync_to_async(fh.seek, thread_sensitive=False)(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+def _disposition(filename, as_attachment):
+    disposition = 'attachment' if as_attachment else 'inline'
+    return f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+
+def _delegate_to_proxy(field_file, content_type, filename, as_attachment):
+    """Ответ без тела: файл отдаёт обратный прокси"""
+    response = HttpResponse(content_type=content_type)
+    if settings.SENDFILE_BACKEND == 'nginx':
+        # Путь к реальному файлу на диске (у дедуплицирующего хранилища он отличается от имени)
+        relative_path = os.path.relpath(field_file.path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = settings.SENDFILE_URL_PREFIX + quote(relative_path)
+    else:
+        response['X-Sendfile'] = field_file.path
+    response['Content-Disposition'] = _disposition(filename, as_attachment)
+    return response
+
+
+def serve_field_file(request, field_file, as_attachment=True, asynchronous=False):
+    """
+    Отдаёт файл из FileField с учётом условных и Range-запросов.
+
+    ``asynchronous=True`` - для асинхронных представлений (ASGI).
+    """
+    filename = os.path.basename(field_file.name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    if settings.SENDFILE_BACKEND:
+        return _delegate_to_proxy(field_file, content_type, filename, as_attachment)
+
+    storage = field_file.storage
+    size = storage.size(field_file.name)
+    mtime = storage.get_modified_time(field_file.name).timestamp()
+    etag = _etag(field_file, size, mtime)
+    last_modified = http_date(mtime)
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and _range_allowed(request, etag, mtime):
+        byte_range = _parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    fh = storage.open(field_file.name, 'rb')
+    iter_range = _aiter_range if asynchronous else _iter_range
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(iter_range(fh, start, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+        response['Content-Disposition'] = _disposition(filename, as_attachment)
+    elif asynchronous:
+        response = StreamingHttpResponse(iter_range(fh, 0, size), content_type=content_type)
+        response['Content-Length'] = str(size)
+        response['Content-Disposition'] = _disposition(filename, as_attachment)
+    else:
+        # FileResponse использует wsgi.file_wrapper (sendfile в gunicorn)
+        response = FileResponse(fh, as_attachment=as_attachment, filename=filename, content_type=content_type)
+        response['Content-Length'] = str(size)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,191 @@
+"""
+Фасетные фильтры: количество строк для каждого значения фильтра.
+
+Выпадающие фильтры списков показывают рядом с каждым вариантом, сколько строк
+он даст при текущем поиске и остальных фильтрах (для фасета не учитывается
+только его собственный фильтр - можно переключиться на другое значение).
+Варианты без строк выводятся неактивными.
+
+Все фасеты страницы считаются одним запросом. Основа - queryset списка с
+поиском, но без фильтров; в PostgreSQL группировка идёт по
+``GROUPING SETS ((фасет 1), (фасет 2), ...)``, фильтры остальных фасетов -
+условием внутри ``COUNT``. В других СУБД (SQLite в тестах) те же группы
+собираются через ``UNION ALL``.
+
+Результат кешируется (``FACETS_CACHE_SECONDS``) по ключу из текста запроса с
+параметрами (поиск и выбранные значения) вместе с версией данных страницы
+(``outbox.models_version``): при другой версии количества пересчитываются. Пока
+версия не «устоялась» (несколько секунд после записи), отдаётся последний
+посчитанный результат.
+
+На потоковых страницах с большой таблицей (журнал операций) количества
+считаются после строк (``deferred_facets``): варианты выводятся в шапке сразу,
+числа подставляет скрипт в конце страницы - время до первого байта не зависит
+от запроса количеств.
+"""
+import hashlib
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import F
+from django.template.loader import render_to_string
+
+from .outbox import models_version
+from .streaming import Deferred
+
+
+@dataclass(frozen=True)
+class FacetOption:
+    value: object
+    label: str
+    count: int  # None - количество ещё не посчитано (deferred_facets)
+    selected: bool
+
+
+class Facet:
+    """
+    Фасет списка: параметр запроса ``name``, поле ``field`` queryset'а.
+
+    ``choices`` - функция, возвращающая пары (значение, подпись) в порядке показа;
+    без неё варианты - найденные значения поля (``descending`` - по убыванию).
+    """
+    def __init__(self, name, field, choices=None, descending=False):
+        self.name = name
+        self.field = field
+        self.choices = choices
+        self.descending = descending
+
+    def parse(self, queryset, raw_value):
+        """Выбранное значение из параметра запроса; None, если не выбрано или некорректно"""
+        if raw_value in (None, ''):
+            return None
+        # Поле фасета - столбец модели или аннотация queryset'а
+        annotation = queryset.query.annotations.get(self.field)
+        field = annotation.output_field if annotation is not None else queryset.model._meta.get_field(self.field)
+        try:
+            return field.to_python(raw_value)
+        except ValidationError:
+            return None
+
+    def options(self, counts, selected):
+        """Варианты фасета; без ``counts`` (None) - только варианты из ``choices``"""
+        if self.choices is not None:
+            pairs = list(self.choices())
+        else:
+            values = set(counts or ())
+            if selected is not None:
+                values.add(selected)
+            pairs = [(value, str(value)) for value in sorted(values, reverse=self.descending)]
+        return [
+            FacetOption(value, label, None if counts is None else counts.get(value, 0), value == selected)
+            for value, label in pairs
+        ]
+
+
+def _count_sql(queryset, facets, selected):
+    """SQL и параметры одного запроса количеств; третий элемент - запрос с GROUPING SETS"""
+    aliases = [f'facet_{index}' for index in range(len(facets))]
+    base = queryset.order_by().values(**{alias: F(facet.field) for alias, facet in zip(aliases, facets)})
+    connection = connections[queryset.db]
+    base_sql, base_params = base.query.get_compiler(connection=connection).as_sql()
+    qn = connection.ops.quote_name
+
+    counts = []
+    counts_params = []
+    for index in range(len(facets)):
+        # Фасет учитывает фильтры остальных фасетов, но не свой
+        others = [other for other in range(len(facets)) if other != index and selected[other] is not None]
+        if others:
+            conditions = ' AND '.join(f'{qn(aliases[other])} = %s' for other in others)
+            counts.append(f'COUNT(CASE WHEN {conditions} THEN 1 END)')
+        else:
+            counts.append('COUNT(*)')
+        counts_params.append([selected[other] for other in others])
+
+    if connection.vendor == 'postgresql':
+        columns = ', '.join(qn(alias) for alias in aliases)
+        grouping = ', '.join(f'GROUPING({qn(alias)})' for alias in aliases)
+        sets = ', '.join(f'({qn(alias)})' for alias in aliases)
+        sql = (
+            f'SELECT {columns}, {grouping}, {", ".join(counts)} '
+            f'FROM ({base_sql}) facet_base GROUP BY GROUPING SETS ({sets})'
+        )
+        return sql, (*sum(counts_params, []), *base_params), True
+
+    parts = []
+    params = []
+    for index, alias in enumerate(aliases):
+        parts.append(
+            f'SELECT {index}, {qn(alias)}, {counts[index]} FROM ({base_sql}) facet_base GROUP BY {qn(alias)}'
+        )
+        params += [*counts_params[index], *base_params]
+    return ' UNION ALL '.join(parts), tuple(params), False
+
+
+def _query_counts(using, sql, params, grouping_sets, size):
+    """Количества по фасетам: список словарей значение -> количество"""
+    counts = [{} for _ in range(size)]
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        for row in cursor.fetchall():
+            if grouping_sets:
+                # Строка группы фасета: GROUPING() = 0 только у его столбца
+                index = row[size:2 * size].index(0)
+                value, count = row[index], row[2 * size + index]
+            else:
+                index, value, count = row
+            if value is not None:
+                counts[index][value] = count
+    return counts
+
+
+def _counts(queryset, facets, selected, models):
+    sql, query_params, grouping_sets = _count_sql(queryset, facets, selected)
+    version = models_version(models)
+    key = 'facets:' + hashlib.md5(f'{queryset.db}|{sql}|{query_params!r}'.encode()).hexdigest()
+    cached = cache.get(key)
+    # Пока версия не устоялась, годится последний посчитанный результат
+    if cached is not None and (version is None or cached[0] == version):
+        return cached[1]
+    counts = _query_counts(queryset.db, sql, query_params, grouping_sets, len(facets))
+    cache.set(key, (version, counts), settings.FACETS_CACHE_SECONDS)
+    return counts
+
+
+def facet_counts(queryset, facets, params, models):
+    """
+    Варианты фасетов: ``{имя фасета: [FacetOption, ...]}``.
+
+    ``queryset`` - строки списка с поиском, без фильтров фасетов; ``params`` -
+    параметры запроса (request.GET); ``models`` - модели, из которых строится
+    страница (для ключа кеша).
+    """
+    selected = [facet.parse(queryset, params.get(facet.name)) for facet in facets]
+    counts = _counts(queryset, facets, selected, models)
+    return {
+        facet.name: facet.options(facet_count, value)
+        for facet, facet_count, value in zip(facets, counts, selected)
+    }
+
+
+def deferred_facets(queryset, facets, params, models):
+    """
+    Фасеты потоковой страницы: ``(варианты без количеств, Deferred со скриптом количеств)``.
+
+    Варианты берутся из ``choices`` без запроса к таблице; количества считаются,
+    когда ``stream_page`` дойдёт до метки ``Deferred`` после строк таблицы. Поле
+    выбора фасета в шаблоне должно иметь ``id``, равный имени фасета.
+    """
+    selected = [facet.parse(queryset, params.get(facet.name)) for facet in facets]
+    options = {facet.name: facet.options(None, value) for facet, value in zip(facets, selected)}
+
+    def render():
+        counts = _counts(queryset, facets, selected, models)
+        return render_to_string('main/includes/facet_counts.html', {
+            'counts': {facet.name: {str(value): count for value, count in facet_count.items()}
+                       for facet, facet_count in zip(facets, counts)},
+        })
+    return options, Deferred('facets', render)
@@ -1,6 +1,9 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from .models import (
-    MaterialPart, MaterialOperations, AstralRevision, AstralPart
+    MaterialPart, MaterialOperations, AstralRevision, AstralPart, MaterialOperationType,
+    MaterialStatus, MaterialWarehouse, MaterialUser
 )
 
 
@@ -64,3 +67,104 @@ class AstralPartForm(forms.ModelForm):
             'astral_variant': forms.Select(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
         }
+
+
+class ScanSessionForm(forms.Form):
+    """Одна операция для пачки отсканированных узлов"""
+    # Поля, которые остаются заполненными для следующей пачки сканов
+    shared_fields = ('material_operation_type', 'material_status', 'material_warehouse', 'material_user', 'description')
+
+    material_operation_type = forms.ModelChoiceField(
+        queryset=MaterialOperationType.objects.all(), label='Тип операции',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    material_status = forms.ModelChoiceField(
+        queryset=MaterialStatus.objects.all(), label='Статус',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    material_warehouse = forms.ModelChoiceField(
+        queryset=MaterialWarehouse.objects.all(), label='Склад',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    material_user = forms.ModelChoiceField(
+        queryset=MaterialUser.objects.all(), label='Пользователь',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    datetime = forms.DateTimeField(
+        required=False, label='Дата и время',
+        widget=forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
+        help_text='Если не указано - текущее время',
+    )
+    description = forms.CharField(
+        required=False, label='Описание',
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 2}),
+    )
+    scans = forms.CharField(
+        label='Сканы',
+        widget=forms.Textarea(attrs={
+            'class': 'form-control', 'rows': 12, 'autofocus': True,
+            'placeholder': 'Серийный номер или ссылка из QR-кода - по одному на строку',
+        }),
+    )
+
+    def clean_datetime(self):
+        return self.cleaned_data['datetime'] or timezone.now()
+
+    def scan_list(self):
+        return [line for line in self.cleaned_data['scans'].splitlines() if line.strip()]
+
+
+# ============== ПАКЕТНАЯ ПРОВЕРКА ==============
+
+class PrefetchedChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField, ищущий значение в заранее загруженном словаре вместо запроса к БД"""
+
+    def __init__(self, objects, *args, **kwargs):
+        self.objects = objects
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            obj = self.objects.get(int(value))
+        except (TypeError, ValueError):
+            obj = None
+        if obj is None:
+            raise ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value},
+            )
+        return obj
+
+
+def build_bulk_forms(form_class, items):
+    """
+    Формы для пакета элементов. Связанные объекты всех элементов загружаются одним
+    запросом на поле, а не отдельным запросом на каждый элемент.
+    """
+    choice_fields = {
+        name: base_field for name, base_field in form_class.base_fields.items()
+        if isinstance(base_field, forms.ModelChoiceField)
+        and not isinstance(base_field, forms.ModelMultipleChoiceField)
+    }
+
+    class BulkForm(form_class):
+        def _get_validation_exclusions(self):
+            # Внешние ключи уже найдены в загруженных словарях - повторная проверка
+            # существования в Model.full_clean() дала бы запрос на каждое поле элемента
+            return super()._get_validation_exclusions() | set(choice_fields)
+
+    form_list = [BulkForm(data=item) for item in items]
+    for name, base_field in choice_fields.items():
+        keys = set()
+        for item in items:
+            try:
+                keys.add(int(item.get(name)))
+            except (TypeError, ValueError):
+                pass
+        objects = base_field.queryset.in_bulk(keys) if keys else {}
+        for form in form_list:
+            form.fields[name] = PrefetchedChoiceField(
+                objects, queryset=base_field.queryset, required=base_field.required,
+            )
+    return form_list
@@ -0,0 +1,171 @@
+"""
+Очередь фоновых задач в базе данных.
+
+Тяжёлая работа (рендишены, архивация, отчёты, импорт/экспорт) не выполняется в
+воркерах gunicorn: представление ставит задачу в таблицу ``background_job``, а
+команда ``manage.py runworker`` забирает её через ``SELECT ... FOR UPDATE SKIP
+LOCKED`` - несколько обработчиков работают параллельно без внешнего брокера.
+
+Задачи регистрируются декоратором ``@task`` (см. ``main/tasks.py``) и принимают
+только JSON-сериализуемые именованные параметры.
+
+Пока задача выполняется, обработчик раз в ``JOB_HEARTBEAT_INTERVAL`` секунд
+обновляет ``heartbeat_at`` своих задач. Задача без сигнала дольше
+``JOB_STALE_TIMEOUT`` считается брошенной упавшим обработчиком и возвращается в
+очередь (или завершается ошибкой, если попытки исчерпаны); долгая задача живого
+обработчика не перезапускается.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name):
+    """Регистрирует функцию как фоновую задачу с указанным именем"""
+    def decorator(func):
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, max_attempts=None, delay=None, created_by=None, **kwargs):
+    """
+    Ставит задачу в очередь; обработчик увидит её после фиксации транзакции.
+
+    ``created_by`` - пользователь, которому доступно состояние задачи (``job_status``).
+    """
+    if name not in TASKS:
+        raise ValueError(f'Неизвестная фоновая задача: {name}')
+    return BackgroundJob.objects.create(
+        task=name,
+        kwargs=kwargs,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_at=timezone.now() + (delay or timedelta(0)),
+        created_by=created_by,
+    )
+
+
+def claim_jobs(worker, limit):
+    """Забирает до ``limit`` готовых задач, пропуская заблокированные другими обработчиками"""
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            BackgroundJob.objects.select_for_update(skip_locked=True)
+            .filter(status=BackgroundJob.STATUS_PENDING, run_at__lte=now)
+            .order_by('run_at', 'id')[:limit]
+        )
+        if jobs:
+            BackgroundJob.objects.filter(id__in=[job.id for job in jobs]).update(
+                status=BackgroundJob.STATUS_RUNNING,
+                attempts=F('attempts') + 1,
+                started_at=now,
+                heartbeat_at=now,
+                worker=worker,
+            )
+    return [job.id for job in jobs]
+
+
+def run_job(job_id):
+    """Выполняет задачу и сохраняет результат; при ошибке планирует повтор"""
+    job = BackgroundJob.objects.get(pk=job_id)
+    func = TASKS.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f'Неизвестная фоновая задача: {job.task}')
+        result = func(**job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.error('Фоновая задача %s #%s завершилась ошибкой:\n%s', job.task, job.id, error)
+        if func is not None and job.attempts < job.max_attempts:
+            # Экспоненциальная задержка перед повтором
+            delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            _finish(
+                job,
+                status=BackgroundJob.STATUS_PENDING,
+                run_at=timezone.now() + timedelta(seconds=delay),
+                error=error,
+            )
+        else:
+            _finish(job, status=BackgroundJob.STATUS_FAILED, finished_at=timezone.now(), error=error)
+        return False
+
+    _finish(job, status=BackgroundJob.STATUS_DONE, finished_at=timezone.now(), result=result, error='')
+    return True
+
+
+def _finish(job, **fields):
+    """
+    Записывает итог попытки, только если задача всё ещё принадлежит ей.
+
+    Задачу, которую ``requeue_stale_jobs`` счёл брошенной, мог забрать другой
+    обработчик (новая попытка) - её состояние не перезаписывается.
+    """
+    updated = BackgroundJob.objects.filter(
+        pk=job.id, status=BackgroundJob.STATUS_RUNNING, attempts=job.attempts,
+    ).update(**fields)
+    if not updated:
+        logger.warning(
+            'Фоновая задача %s #%s (попытка %s) возвращена в очередь во время выполнения, итог не записан',
+            job.task, job.id, job.attempts,
+        )
+    return updated
+
+
+def run_job_in_worker(job_id):
+    """Запуск задачи в потоке/процессе обработчика со своим соединением с БД"""
+    close_old_connections()
+    try:
+        return run_job(job_id)
+    finally:
+        connections.close_all()
+
+
+def heartbeat(worker):
+    """Сигнал обработчика: его выполняющиеся задачи живы"""
+    return BackgroundJob.objects.filter(status=BackgroundJob.STATUS_RUNNING, worker=worker).update(
+        heartbeat_at=timezone.now(),
+    )
+
+
+def requeue_stale_jobs():
+    """
+    Задачи обработчиков, упавших посреди выполнения (нет сигнала дольше
+    ``JOB_STALE_TIMEOUT``): в очередь, если остались попытки, иначе - ошибка
+    """
+    now = timezone.now()
+    stale = BackgroundJob.objects.filter(
+        status=BackgroundJob.STATUS_RUNNING, heartbeat_at__lt=now - timedelta(seconds=settings.JOB_STALE_TIMEOUT),
+    )
+    with transaction.atomic():
+        failed = stale.filter(attempts__gte=F('max_attempts')).update(
+            status=BackgroundJob.STATUS_FAILED, finished_at=now, error='Обработчик перестал отвечать во время выполнения',
+        )
+        requeued = stale.update(status=BackgroundJob.STATUS_PENDING, run_at=now)
+    if failed:
+        logger.error('Фоновые задачи без сигнала обработчика, попытки исчерпаны: %s', failed)
+    return requeued
+
+
+def run_pending(worker='inline', limit=100):
+    """Синхронно выполняет все готовые задачи (для тестов и запуска по расписанию)"""
+    processed = 0
+    while True:
+        job_ids = claim_jobs(worker, limit)
+        if not job_ids:
+            return processed
+        for job_id in job_ids:
+            # Задачи пачки ждут своей очереди в статусе «выполняется»
+            heartbeat(worker)
+            run_job(job_id)
+            processed += 1
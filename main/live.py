@@ -0,0 +1,180 @@
+"""
+Живой журнал операций: новые операции рассылаются открытым страницам через
+Server-Sent Events (``/operations/stream/``).
+
+На процесс работает один слушатель (поток ``OperationsBroadcaster``), а не по
+запросу на каждого клиента. В PostgreSQL он держит отдельное соединение с
+``LISTEN material_operations``; триггер из миграции 0009 отправляет NOTIFY на
+каждую вставку в ``material_operations``. Уведомление служит только сигналом
+«есть новое»: слушатель одним запросом читает операции с id больше последнего
+разосланного, поэтому пропущенное уведомление или пакетная вставка ничего не
+теряют (операция из транзакции, зафиксированной позже операции с большим id,
+в живой журнал не попадёт - она видна после обновления страницы). На других СУБД (SQLite при разработке) таблица опрашивается раз в
+``LIVE_POLL_INTERVAL`` секунд.
+
+Клиенты (асинхронные представления в режиме ASGI) получают события через
+ограниченные очереди: медленный клиент не тормозит остальных - его поток
+закрывается, и браузер переподключается с ``Last-Event-ID``, дочитывая
+пропущенное из БД.
+"""
+import json
+import logging
+import select
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.db import connection, connections
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import MaterialOperations
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'material_operations'
+
+EVENT_FIELDS = (
+    'id', 'datetime', 'material_part_id', 'material_part__serial',
+    'material_operation_type__name', 'material_status__name',
+)
+
+
+def operation_events(after_id, limit):
+    """Операции с id больше ``after_id`` в виде событий журнала - один запрос"""
+    rows = (
+        MaterialOperations.objects.filter(id__gt=after_id)
+        .order_by('id').values(*EVENT_FIELDS)[:limit]
+    )
+    return [
+        {
+            'id': row['id'],
+            'datetime': timezone.localtime(row['datetime']).strftime('%d.%m.%Y %H:%M'),
+            'operation_type': row['material_operation_type__name'],
+            'status': row['material_status__name'],
+            'serial': row['material_part__serial'],
+            'part_url': reverse('main:material_part_detail', args=[row['material_part_id']]),
+        }
+        for row in rows
+    ]
+
+
+def last_operation_id():
+    last = MaterialOperations.objects.order_by('-id').values_list('id', flat=True).first()
+    return last or 0
+
+
+def stream_cursor(request):
+    """id последней полученной операции: заголовок переподключения или ?after= страницы"""
+    value = request.headers.get('Last-Event-ID') or request.GET.get('after')
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def prepare_stream_response(response):
+    response['Cache-Control'] = 'no-cache'
+    # nginx не должен буферизовать поток событий
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def format_event(event):
+    """Событие в формате text/event-stream"""
+    data = json.dumps(event, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: operation\ndata: {data}\n\n"
+
+
+class OperationsBroadcaster:
+    """Один слушатель на процесс; подписчики получают пачки событий в callback"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_id = None
+
+    def subscribe(self, callback):
+        """Подписка; возвращает функцию отписки. Callback вызывается из потока слушателя"""
+        self.start()
+        with self._lock:
+            self._subscribers.add(callback)
+        return lambda: self._unsubscribe(callback)
+
+    def _unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.discard(callback)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='live-operations', daemon=True)
+                self._thread.start()
+
+    def publish(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(events)
+            except Exception:
+                logger.exception('Ошибка доставки событий журнала')
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                logger.exception('Слушатель журнала операций перезапускается')
+                connections.close_all()
+                time.sleep(settings.LIVE_POLL_INTERVAL)
+
+    def _listen(self):
+        if self._last_id is None:
+            self._last_id = last_operation_id()
+        if connection.vendor == 'postgresql':
+            waiter = self._pg_waiter()
+        else:
+            waiter = nullcontext(lambda: time.sleep(settings.LIVE_POLL_INTERVAL))
+        with waiter as wait:
+            while True:
+                wait()
+                self._dispatch()
+
+    @contextmanager
+    def _pg_waiter(self):
+        """
+        Отдельное соединение в режиме autocommit, ожидающее NOTIFY.
+
+        Соединение не входит в ``connections``, поэтому ``close_all()`` при
+        перезапуске его не закрывает - закрываем сами при выходе из ``_listen``.
+        """
+        listener = connection.get_new_connection(connection.get_connection_params())
+        try:
+            listener.autocommit = True
+            with listener.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+
+            def wait():
+                # Таймаут - страховка на случай потерянного соединения или уведомления
+                if select.select([listener], [], [], settings.LIVE_POLL_INTERVAL * 30) != ([], [], []):
+                    listener.poll()
+                    listener.notifies.clear()
+            yield wait
+        finally:
+            listener.close()
+
+    def _dispatch(self):
+        while True:
+            events = operation_events(self._last_id, settings.LIVE_BATCH_SIZE)
+            if not events:
+                return
+            self._last_id = events[-1]['id']
+            self.publish(events)
+            if len(events) < settings.LIVE_BATCH_SIZE:
+                return
+
+
+broadcaster = OperationsBroadcaster()
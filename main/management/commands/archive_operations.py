@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.archive import archive_operations
+
+
+class Command(BaseCommand):
+    help = 'Переносит старые операции журнала в архив (холодное хранилище)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ARCHIVE_HORIZON_DAYS,
+            help='Архивировать операции старше указанного количества дней',
+        )
+        parser.add_argument(
+            '--segment-rows', type=int, default=settings.ARCHIVE_SEGMENT_ROWS,
+            help='Максимальное количество операций в одном сегменте',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать операции, ничего не переносить',
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        count = archive_operations(
+            before=before,
+            segment_rows=options['segment_rows'],
+            dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            self.stdout.write(f'Будет перенесено операций старше {before:%d.%m.%Y}: {count}')
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'Перенесено в архив операций старше {before:%d.%m.%Y}: {count}')
+            )
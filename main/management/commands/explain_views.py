@@ -0,0 +1,196 @@
+import json
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from main.models import (
+    AstralType, AstralVariant, AstralPart, AstralRevision, AstralYear, AstralManufacturer,
+    MaterialPart, MaterialGroup, MaterialOperationType, MaterialUser, MaterialStatus,
+    MaterialWarehouse, MaterialOperations, MaterialPartRow
+)
+from main.projections import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Выполняет EXPLAIN (ANALYZE, BUFFERS) для запросов основных страниц и сообщает о Seq Scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Создать указанное количество тестовых материальных узлов (данные откатываются)',
+        )
+        parser.add_argument(
+            '--operations-per-part', type=int, default=20,
+            help='Количество тестовых операций на каждый узел при --seed',
+        )
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='Игнорировать Seq Scan, просмотревшие меньше указанного количества строк',
+        )
+        parser.add_argument(
+            '--fail-on-seq-scan', action='store_true',
+            help='Завершиться с ошибкой, если найден хотя бы один Seq Scan',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Команда поддерживает только PostgreSQL')
+
+        with transaction.atomic():
+            if options['seed']:
+                self._seed(options['seed'], options['operations_per_part'])
+            seq_scans = self._explain_views(options['min_rows'])
+            # Тестовые данные и побочные эффекты EXPLAIN ANALYZE не сохраняем
+            transaction.set_rollback(True)
+
+        if seq_scans and options['fail_on_seq_scan']:
+            raise CommandError(f'Найдено Seq Scan: {seq_scans}')
+
+    # ============== Сценарии ==============
+
+    def _cases(self):
+        """Страницы и параметры фильтров, повторяющие реальные запросы пользователей"""
+        cases = [
+            ('dashboard', reverse('main:dashboard'), {}),
+            ('operations_list', reverse('main:operations_list'), {}),
+            ('material_parts_list', reverse('main:material_parts_list'), {}),
+            ('material_parts_list [all]', reverse('main:material_parts_list'), {'all': 1}),
+        ]
+
+        status = MaterialStatus.objects.order_by('id').first()
+        op_type = MaterialOperationType.objects.order_by('id').first()
+        if status and op_type:
+            cases.append(('operations_list [status]', reverse('main:operations_list'), {'status': status.id}))
+            cases.append(('operations_list [operation_type]', reverse('main:operations_list'),
+                          {'operation_type': op_type.id}))
+
+        year = AstralYear.objects.order_by('id').first()
+        manufacturer = AstralManufacturer.objects.order_by('id').first()
+        if year and manufacturer:
+            cases.append(('material_parts_list [manufacturer+year]', reverse('main:material_parts_list'),
+                          {'manufacturer': manufacturer.id, 'year': year.year}))
+
+        part = MaterialPart.objects.order_by('id').first()
+        if part:
+            cases.append(('material_part_detail',
+                          reverse('main:material_part_detail', kwargs={'part_id': part.id}), {}))
+        operation = MaterialOperations.objects.order_by('id').first()
+        if operation:
+            cases.append(('operation_detail',
+                          reverse('main:operation_detail', kwargs={'operation_id': operation.id}), {}))
+        revision = AstralRevision.objects.order_by('id').first()
+        if revision:
+            cases.append(('astral_revision_detail',
+                          reverse('main:astral_revision_detail', kwargs={'revision_id': revision.id}), {}))
+        return cases
+
+    def _explain_views(self, min_rows):
+        factory = RequestFactory()
+        user = get_user_model()(username='explain', is_staff=True, is_superuser=True)
+        total = 0
+
+        for name, path, params in self._cases():
+            request = factory.get(path, params)
+            request.user = user
+            match = resolve(path)
+            with CaptureQueriesContext(connection) as ctx:
+                response = match.func(request, *match.args, **match.kwargs)
+                if response.streaming:
+                    # Строки потоковых страниц читаются при отдаче ответа
+                    for _ in response.streaming_content:
+                        pass
+
+            selects = [q['sql'] for q in ctx.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')]
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name}: запросов {len(selects)}'))
+            for sql in selects:
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql)
+                    plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                root = plan[0]
+                for node in _walk(root['Plan']):
+                    if node['Node Type'] != 'Seq Scan':
+                        continue
+                    scanned = node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0)
+                    if scanned < min_rows:
+                        continue
+                    total += 1
+                    self.stdout.write(self.style.WARNING(
+                        f"  Seq Scan on {node['Relation Name']}: строк {scanned}, "
+                        f"буферов {node.get('Shared Hit Blocks', 0) + node.get('Shared Read Blocks', 0)}"
+                    ))
+                    self.stdout.write(f'    {sql[:200]}')
+                self.stdout.write(f"  {root['Execution Time']:.2f} ms  {sql[:100]}")
+
+        style = self.style.WARNING if total else self.style.SUCCESS
+        self.stdout.write(style(f'Всего Seq Scan: {total}'))
+        return total
+
+    # ============== Тестовые данные ==============
+
+    def _seed(self, parts_count, operations_per_part):
+        self.stdout.write(f'Создание {parts_count} узлов и {parts_count * operations_per_part} операций...')
+        astral_type = AstralType.objects.create(name='Explain', code=f'explain-{timezone.now().timestamp()}')
+        variant = AstralVariant.objects.create(name='Explain', code=astral_type.code, astral_type=astral_type)
+        astral_part = AstralPart.objects.create(name='Explain', decimal_num=astral_type.code, astral_variant=variant)
+        years = [AstralYear.objects.create(astral_variant=variant, year=2000 + i) for i in range(10)]
+        manufacturers = [
+            AstralManufacturer.objects.create(name=f'Explain {i}', code=f'{astral_type.code}-{i}') for i in range(10)
+        ]
+        revisions = []
+        for i in range(10):
+            revision = AstralRevision.objects.create(name=f'Explain {i}')
+            revision.astral_parts.add(astral_part)
+            revisions.append(revision)
+
+        group = MaterialGroup.objects.create(name='Explain')
+        op_types = [MaterialOperationType.objects.create(name=f'Explain {i}', material_group=group) for i in range(10)]
+        statuses = [MaterialStatus.objects.create(name=f'Explain {i}') for i in range(5)]
+        warehouses = [MaterialWarehouse.objects.create(name=f'Explain {i}') for i in range(5)]
+        users = [MaterialUser.objects.create(first_name='Explain', second_name=str(i)) for i in range(10)]
+
+        parts = MaterialPart.objects.bulk_create(
+            MaterialPart(
+                serial=f'{astral_type.code}-{i}',
+                astral_revision=random.choice(revisions),
+                astral_manufacturer=random.choice(manufacturers),
+                astral_year=random.choice(years),
+            )
+            for i in range(parts_count)
+        )
+        now = timezone.now()
+        batch = []
+        for part in parts:
+            for _ in range(operations_per_part):
+                batch.append(MaterialOperations(
+                    material_operation_type=random.choice(op_types),
+                    material_user=random.choice(users),
+                    datetime=now - timedelta(minutes=random.randint(0, 365 * 24 * 60)),
+                    material_status=random.choice(statuses),
+                    material_warehouse=random.choice(warehouses),
+                    material_part=part,
+                ))
+            if len(batch) >= 10000:
+                MaterialOperations.objects.bulk_create(batch)
+                batch = []
+        MaterialOperations.objects.bulk_create(batch)
+        # bulk_create не пишет журнал - проекция списка узлов строится целиком
+        rebuild()
+
+        with connection.cursor() as cursor:
+            for model in (MaterialPart, MaterialOperations, AstralYear, MaterialPartRow):
+                cursor.execute('ANALYZE ' + connection.ops.quote_name(model._meta.db_table))
+
+
+def _walk(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from _walk(child)
@@ -1,46 +1,90 @@
-from django.core.management.base import BaseCommand
-from django.db import connection
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+
+
+def get_sequence_targets(app_labels=None):
+    """Таблицы и колонки всех моделей с автоинкрементным первичным ключом"""
+    if app_labels:
+        try:
+            app_configs = [apps.get_app_config(label) for label in app_labels]
+        except LookupError as e:
+            raise CommandError(str(e))
+        model_list = [model for config in app_configs for model in config.get_models(include_auto_created=True)]
+    else:
+        model_list = apps.get_models(include_auto_created=True)
+
+    targets = []
+    for model in model_list:
+        opts = model._meta
+        if opts.proxy or not opts.managed or not isinstance(opts.pk, models.AutoField):
+            continue
+        targets.append((opts.db_table, opts.pk.column))
+    return sorted(set(targets))
+
+
+def build_sequences_sql(targets, dry_run=False):
+    """
+    Один запрос на все таблицы: MAX(id) по каждой и setval для её последовательности.
+
+    Имена таблиц и колонок берутся из метаданных моделей и экранируются через
+    quote_name; в pg_get_serial_sequence они передаются параметрами.
+    """
+    quote = connection.ops.quote_name
+    rows_sql = []
+    params = []
+    for table, column in targets:
+        rows_sql.append(
+            f'SELECT %s AS tbl, pg_get_serial_sequence(%s, %s) AS seq, '
+            f'(SELECT MAX({quote(column)}) FROM {quote(table)}) AS max_id'
+        )
+        params.extend([table, quote(table), column])
+
+    if dry_run:
+        result = 't.max_id'
+    else:
+        # Для пустой таблицы следующий nextval() вернёт 1
+        result = 'setval(t.seq, COALESCE(t.max_id, 1), t.max_id IS NOT NULL)'
+    sql = (
+        f'SELECT t.tbl, t.seq, t.max_id, CASE WHEN t.seq IS NOT NULL THEN {result} END '
+        f'FROM ({" UNION ALL ".join(rows_sql)}) AS t ORDER BY t.tbl'
+    )
+    return sql, params
+
 
 class Command(BaseCommand):
     help = 'Исправляет последовательности автоинкремента для всех таблиц'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--app', action='append', dest='apps', metavar='APP_LABEL',
+            help='Ограничиться указанным приложением (можно повторять)',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Показать текущие значения, не изменяя последовательности',
+        )
+
     def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Команда поддерживает только PostgreSQL')
+
+        targets = get_sequence_targets(options['apps'])
+        if not targets:
+            self.stdout.write(self.style.WARNING('Нет таблиц с автоинкрементным ключом'))
+            return
+
+        sql, params = build_sequences_sql(targets, dry_run=options['dry_run'])
         with connection.cursor() as cursor:
-            # Исправляем последовательность для таблицы devices
-            cursor.execute("SELECT MAX(id) FROM devices;")
-            max_id = cursor.fetchone()[0]
-            
-            if max_id is not None:
-                cursor.execute(f"SELECT setval('devices_id_seq', {max_id});")
-                self.stdout.write(
-                    self.style.SUCCESS(f'Последовательность devices_id_seq сброшена на {max_id}')
-                )
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        for table, sequence, max_id, _ in rows:
+            if sequence is None:
+                self.stdout.write(self.style.WARNING(f'У таблицы {table} нет последовательности'))
+            elif max_id is None:
+                self.stdout.write(self.style.WARNING(f'Таблица {table} пуста, {sequence} начнётся с 1'))
+            elif options['dry_run']:
+                self.stdout.write(f'Последовательность {sequence} будет сброшена на {max_id}')
             else:
-                self.stdout.write(
-                    self.style.WARNING('Таблица devices пуста')
-                )
-                
-            # Проверяем другие таблицы
-            tables_to_fix = [
-                ('parts', 'parts_id_seq'),
-                ('journal', 'journal_id_seq'),
-            ]
-            
-            for table, sequence in tables_to_fix:
-                try:
-                    cursor.execute(f"SELECT MAX(id) FROM {table};")
-                    max_id = cursor.fetchone()[0]
-
-                    if max_id is not None:
-                        cursor.execute(f"SELECT setval('{sequence}', {max_id});")
-                        self.stdout.write(
-                            self.style.SUCCESS(f'Последовательность {sequence} сброшена на {max_id}')
-                        )
-                    else:
-                        self.stdout.write(
-                            self.style.WARNING(f'Таблица {table} пуста')
-                        )
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(f'Ошибка с таблицей {table}: {e}')
-                    )
+                self.stdout.write(self.style.SUCCESS(f'Последовательность {sequence} сброшена на {max_id}'))
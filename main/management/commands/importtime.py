@@ -0,0 +1,97 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# То, что делает воркер до первого запроса: настройка Django, WSGI-приложение и разрешение URL
+STARTUP_SCRIPT = '''
+import django
+django.setup()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+'''
+
+WARM_UP_SCRIPT = STARTUP_SCRIPT + '''
+from main.warmup import warm_up
+warm_up()
+'''
+
+_LINE_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def parse_importtime(output):
+    """Строки ``-X importtime``: список (модуль, собственное время, накопленное время) в мкс"""
+    modules = []
+    for line in output.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            modules.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return modules
+
+
+def summarize(modules, top):
+    """Итог: общее время, самые медленные модули и пакеты верхнего уровня (мс)"""
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split('.')[0]] += self_us
+    slowest = sorted(modules, key=lambda row: row[1], reverse=True)[:top]
+    return {
+        'total_ms': round(sum(row[1] for row in modules) / 1000, 1),
+        'modules': len(modules),
+        'packages': [
+            {'name': name, 'ms': round(us / 1000, 1)}
+            for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        ],
+        'slowest': [
+            {'name': name, 'self_ms': round(self_us / 1000, 1), 'cumulative_ms': round(cumulative_us / 1000, 1)}
+            for name, self_us, cumulative_us in slowest
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Профиль импортов при запуске воркера (python -X importtime): общее время, '
+        'самые медленные пакеты и модули. Отчёт в JSON и порог времени - для отслеживания регрессий'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Сколько пакетов и модулей показать')
+        parser.add_argument('--warm-up', action='store_true', help='Включить прогрев (main/warmup.py)')
+        parser.add_argument('--json', dest='json_path', help='Сохранить отчёт в JSON-файл')
+        parser.add_argument(
+            '--max-ms', type=float,
+            help='Завершиться с ошибкой, если импорт занимает больше указанного времени',
+        )
+
+    def handle(self, *args, **options):
+        script = WARM_UP_SCRIPT if options['warm_up'] else STARTUP_SCRIPT
+        # Отдельный процесс: в текущем всё уже импортировано
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            capture_output=True, text=True, env=os.environ.copy(),
+        )
+        if result.returncode != 0:
+            raise CommandError(f'Запуск завершился ошибкой:\n{result.stderr[-2000:]}')
+
+        report = summarize(parse_importtime(result.stderr), options['top'])
+        self.stdout.write(f"Импорт: {report['total_ms']} мс, модулей: {report['modules']}")
+        self.stdout.write('\nПакеты (собственное время модулей):')
+        for row in report['packages']:
+            self.stdout.write(f"  {row['ms']:>9.1f} мс  {row['name']}")
+        self.stdout.write('\nМодули (собственное / накопленное время):')
+        for row in report['slowest']:
+            self.stdout.write(f"  {row['self_ms']:>9.1f} / {row['cumulative_ms']:>9.1f} мс  {row['name']}")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(report, fh, ensure_ascii=False, indent=2)
+
+        if options['max_ms'] is not None and report['total_ms'] > options['max_ms']:
+            raise CommandError(f"Импорт занимает {report['total_ms']} мс, порог {options['max_ms']} мс")
@@ -0,0 +1,91 @@
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест страниц запущенного сервера: N одновременных клиентов '
+        'в течение заданного времени. Используется для сравнения режимов WSGI и ASGI '
+        '(gunicorn webapp.wsgi vs gunicorn -k uvicorn.workers.UvicornWorker webapp.asgi)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='Полные URL страниц (запрашиваются по кругу)')
+        parser.add_argument('--concurrency', type=int, default=10, help='Одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=10, help='Длительность теста, секунд')
+        parser.add_argument(
+            '--username',
+            help='Пользователь, от имени которого идут запросы (сессия создаётся напрямую в БД)',
+        )
+        parser.add_argument('--timeout', type=float, default=30, help='Таймаут одного запроса, секунд')
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options['username']:
+            headers['Cookie'] = f'{settings.SESSION_COOKIE_NAME}={self._session_key(options["username"])}'
+
+        urls = options['urls']
+        deadline = time.monotonic() + options['duration']
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def client(index):
+            n = index
+            while time.monotonic() < deadline:
+                request = urllib.request.Request(urls[n % len(urls)], headers=headers)
+                n += 1
+                started = time.monotonic()
+                try:
+                    with urllib.request.urlopen(request, timeout=options['timeout']) as response:
+                        response.read()
+                        ok = response.status == 200
+                except (urllib.error.URLError, OSError) as exc:
+                    ok, reason = False, str(exc)
+                else:
+                    reason = f'HTTP {response.status}'
+                elapsed = time.monotonic() - started
+                with lock:
+                    if ok:
+                        latencies.append(elapsed)
+                    else:
+                        errors.append(reason)
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(client, range(options['concurrency'])))
+        total = time.monotonic() - started
+
+        if not latencies:
+            raise CommandError(f'Нет успешных ответов. Ошибки: {errors[:5]}')
+        latencies.sort()
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        self.stdout.write(
+            f'клиентов={options["concurrency"]} запросов={len(latencies)} ошибок={len(errors)} '
+            f'rps={len(latencies) / total:.1f} '
+            f'p50={percentile(0.5):.0f}мс p95={percentile(0.95):.0f}мс p99={percentile(0.99):.0f}мс '
+            f'среднее={statistics.mean(latencies) * 1000:.0f}мс'
+        )
+
+    def _session_key(self, username):
+        user = get_user_model().objects.filter(username=username).first()
+        if user is None:
+            raise CommandError(f'Пользователь {username} не найден')
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session.session_key
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.outbox import prune_change_log
+
+
+class Command(BaseCommand):
+    help = 'Удаляет записи журнала изменений старше срока хранения (не дальше позиций проекций)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.CHANGELOG_RETENTION_DAYS,
+            help='Хранить записи за указанное количество дней',
+        )
+
+    def handle(self, *args, **options):
+        removed = prune_change_log(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей журнала: {removed}'))
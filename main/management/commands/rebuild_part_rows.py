@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from main.projections import material_part_rows
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает таблицу строк списка материальных узлов (material_part_row) из исходных таблиц'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--if-needed', action='store_true',
+            help='Только если таблица ещё не построена или отстаёт от журнала больше PROJECTION_MAX_LAG записей',
+        )
+
+    def handle(self, *args, **options):
+        if options['if_needed'] and not material_part_rows.needs_rebuild():
+            self.stdout.write('Строки списка узлов актуальны')
+            return
+        count = material_part_rows.rebuild()
+        if count is None:
+            self.stdout.write(self.style.WARNING('Перестройка уже выполняется другим процессом'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Строк списка узлов: {count}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from main.search import search_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает таблицу общего поиска (search_index) из исходных таблиц'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--if-needed', action='store_true',
+            help='Только если индекс ещё не построен или отстаёт от журнала больше SEARCH_INDEX_MAX_LAG записей',
+        )
+
+    def handle(self, *args, **options):
+        if options['if_needed'] and not search_index.needs_rebuild():
+            self.stdout.write('Поисковый индекс актуален')
+            return
+        count = search_index.rebuild()
+        if count is None:
+            self.stdout.write(self.style.WARNING('Перестройка уже выполняется другим процессом'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Строк поискового индекса: {count}'))
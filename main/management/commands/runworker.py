@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.jobs import claim_jobs, heartbeat, requeue_stale_jobs, run_job_in_worker, run_pending
+
+# Как часто проверять задачи, зависшие у упавших обработчиков (секунд)
+STALE_CHECK_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = 'Обработчик очереди фоновых задач (рендишены, архивация и т.п.)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=os.cpu_count() or 1,
+            help='Количество одновременно выполняемых задач',
+        )
+        parser.add_argument(
+            '--pool', choices=('thread', 'process'), default='thread',
+            help='Пул потоков (задачи с вводом-выводом) или процессов (тяжёлые вычисления)',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди, секунд',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи в текущем процессе и выйти',
+        )
+
+    def handle(self, *args, **options):
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        if options['once']:
+            processed = run_pending(worker=worker)
+            self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {processed}'))
+            return
+
+        concurrency = max(1, options['concurrency'])
+        poll_interval = options['poll_interval']
+        if options['pool'] == 'process':
+            # spawn: дочерние процессы не наследуют соединения с БД родителя
+            executor = ProcessPoolExecutor(
+                max_workers=concurrency,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        else:
+            executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='worker')
+
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        self.stdout.write(
+            f'Обработчик {worker}: {options["pool"]} x {concurrency}, опрос каждые {poll_interval} с'
+        )
+
+        in_flight = set()
+        last_stale_check = 0
+        last_heartbeat = 0
+        try:
+            while not self._stopping:
+                in_flight = {future for future in in_flight if not future.done()}
+
+                # Задачи выполняются в пуле, сигнал за все подаёт основной цикл
+                if in_flight and time.monotonic() - last_heartbeat > settings.JOB_HEARTBEAT_INTERVAL:
+                    heartbeat(worker)
+                    last_heartbeat = time.monotonic()
+
+                if time.monotonic() - last_stale_check > STALE_CHECK_INTERVAL:
+                    requeued = requeue_stale_jobs()
+                    if requeued:
+                        self.stdout.write(self.style.WARNING(f'Возвращено в очередь зависших задач: {requeued}'))
+                    last_stale_check = time.monotonic()
+
+                free = concurrency - len(in_flight)
+                job_ids = claim_jobs(worker, free) if free > 0 else []
+                for job_id in job_ids:
+                    in_flight.add(executor.submit(run_job_in_worker, job_id))
+
+                if not job_ids:
+                    if in_flight:
+                        wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    else:
+                        time.sleep(poll_interval)
+        finally:
+            # Текущие задачи дорабатывают, новые не забираются
+            executor.shutdown(wait=True)
+        self.stdout.write('Обработчик остановлен')
+
+    def _stop(self, signum, frame):
+        self._stopping = True
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.storage import sweep_blobs
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы хранилища загрузок, на которые не осталось ссылок (например, после отката сохранения)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=settings.BLOB_SWEEP_MIN_AGE,
+            help='Не трогать файлы моложе указанного количества секунд',
+        )
+
+    def handle(self, *args, **options):
+        removed = sweep_blobs(options['min_age'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено файлов без ссылок: {removed}'))
@@ -0,0 +1,359 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:55
+
+from django.db import migrations, models
+from django.db.migrations.operations.base import Operation
+import django.db.models.deletion
+
+
+def _table_exists(schema_editor, table):
+    return table in schema_editor.connection.introspection.table_names()
+
+
+def _column_exists(schema_editor, table, column):
+    if not _table_exists(schema_editor, table):
+        return False
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        return column in {info.name for info in connection.introspection.get_table_description(cursor, table)}
+
+
+class IfNeeded(Operation):
+    """
+    Операция, которая меняет БД, только если её ещё нет в схеме.
+
+    Рабочие базы создавались вручную по новым моделям, без старых таблиц
+    Device/Journal: без проверки ``migrate`` (его запускает entrypoint) падал
+    бы на этой миграции при каждом старте контейнера.
+    """
+    reduces_to_sql = False
+
+    def __init__(self, operation):
+        self.operation = operation
+
+    def deconstruct(self):
+        return self.__class__.__name__, [self.operation], {}
+
+    def state_forwards(self, app_label, state):
+        self.operation.state_forwards(app_label, state)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if self._needed(app_label, schema_editor, from_state, to_state):
+            self.operation.database_forwards(app_label, schema_editor, from_state, to_state)
+        elif isinstance(self.operation, migrations.CreateModel):
+            # Таблица есть - создаём только недостающие таблицы многие-ко-многим
+            model = to_state.apps.get_model(app_label, self.operation.name)
+            for field in model._meta.local_many_to_many:
+                through = field.remote_field.through
+                if not _table_exists(schema_editor, through._meta.db_table):
+                    schema_editor.create_model(through)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if self._needed(app_label, schema_editor, to_state, from_state, backwards=True):
+            self.operation.database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def _needed(self, app_label, schema_editor, before, after, backwards=False):
+        operation = self.operation
+        if isinstance(operation, migrations.CreateModel):
+            table = after.apps.get_model(app_label, operation.name)._meta.db_table
+            return _table_exists(schema_editor, table) == backwards
+        if isinstance(operation, migrations.DeleteModel):
+            table = before.apps.get_model(app_label, operation.name)._meta.db_table
+            return _table_exists(schema_editor, table) != backwards
+        model = (after if isinstance(operation, migrations.AddField) else before).apps.get_model(app_label, operation.model_name)
+        column = model._meta.get_field(operation.name).column
+        exists = _column_exists(schema_editor, model._meta.db_table, column)
+        if isinstance(operation, migrations.AddField):
+            return exists == backwards
+        return exists != backwards
+
+    def describe(self):
+        return f'{self.operation.describe()} (если нужно)'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_remove_device_part_device_parts'),
+    ]
+
+    operations = [
+        IfNeeded(migrations.CreateModel(
+            name='AstralManufacturer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Название производителя')),
+                ('code', models.CharField(max_length=255, unique=True, verbose_name='Код')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+            ],
+            options={
+                'verbose_name': 'Астральный производитель',
+                'verbose_name_plural': 'Астральные производители',
+                'db_table': 'astral_manufacturer',
+            },
+        )),
+        IfNeeded(migrations.CreateModel(
+            name='AstralPart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Название узла')),
+                ('decimal_num', models.CharField(max_length=255, unique=True, verbose_name='Децимальный номер')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+            ],
+            options={
+                'verbose_name': 'Астральный узел',
+                'verbose_name_plural': 'Астральные узлы',
+                'db_table': 'astral_part',
+            },
+        )),
+        IfNeeded(migrations.CreateModel(
+            name='AstralRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Название ревизии')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+                ('image', models.ImageField(blank=True, null=True, upload_to='astral_revisions/images/', verbose_name='Изображение')),
+                ('file', models.FileField(blank=True, null=True, upload_to='astral_revisions/', verbose_name='Файл')),
+                ('release_date', models.DateField(blank=True, null=True, verbose_name='Дата выпуска')),
+                ('astral_parts', models.ManyToManyField(related_name='revisions', to='main.astralpart', verbose_name='Астральные узлы')),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='main.astralrevision', verbose_name='Родительская ревизия')),
+            ],
+            options={
+                'verbose_name': 'Астральная ревизия',
+                'verbose_name_plural': 'Астральные ревизии',
+                'db_table': 'astral_revision',
+            },
+        )),
+        IfNeeded(migrations.CreateModel(
+            name='AstralType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Название типа')),
+                ('code', models.CharField(max_length=255, unique=True, verbose_name='Код')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+            ],
+            options={
+                'verbose_name': 'Астральный тип',
+                'verbose_name_plural': 'Астральные типы',
+                'db_table': 'astral_type',
+            },
+        )),
+        IfNeeded(migrations.CreateModel(
+            name='AstralVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Название варианта')),
+                ('code', models.CharField(max_length=255, unique=True, verbose_name='Код')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+                ('astral_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='main.astraltype', verbose_name='Астральный тип')),
+            ],
+            options={
+                'verbose_name': 'Астральный вариант',
+                'verbose_name_plural': 'Астральные варианты',
+                'db_table': 'astral_variant',
+            },
+        )),
+        IfNeeded(migrations.CreateModel(
+            name='AstralYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(verbose_name='Год выпуска')),
+                ('astral_variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='years', to='main.astralvariant', verbose_name='Астральный вариант')),
+            ],
+            options={
+                'verbose_name': 'Год выпуска астрального варианта',
+                'verbose_name_plural': 'Годы выпуска астральных вариантов',
+                'db_table': 'astral_year',
+                'unique_together': {('astral_variant', 'year')},
+            },
+        )),
+        IfNeeded(migrations.CreateModel(
+            name='MaterialGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Название группы')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+            ],
+            options={
+                'verbose_name': 'Группа операций',
+                'verbose_name_plural': 'Группы операций',
+                'db_table': 'material_group',
+            },
+        )),
+        IfNeeded(migrations.CreateModel(
+            name='MaterialOperations',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime', models.DateTimeField(verbose_name='Дата и время')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+                ('file', models.FileField(blank=True, null=True, upload_to='material_operations/', verbose_name='Файл')),
+                ('image', models.ImageField(blank=True, null=True, upload_to='material_operations/images/', verbose_name='Изображение')),
+            ],
+            options={
+                'verbose_name': 'Материальная операция',
+                'verbose_name_plural': 'Материальные операции',
+                'db_table': 'material_operations',
+                'ordering': ['-datetime'],
+            },
+        )),
+        IfNeeded(migrations.CreateModel(
+            name='MaterialOperationType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Название операции')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+                ('material_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='operation_types', to='main.materialgroup', verbose_name='Группа операций')),
+            ],
+            options={
+                'verbose_name': 'Тип операции',
+                'verbose_name_plural': 'Типы операций',
+                'db_table': 'material_operation_type',
+            },
+        )),
+        IfNeeded(migrations.CreateModel(
+            name='MaterialPart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serial', models.CharField(max_length=255, unique=True, verbose_name='Серийный номер')),
+                ('astral_manufacturer', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='material_parts', to='main.astralmanufacturer', verbose_name='Производитель')),
+                ('astral_revision', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='material_parts', to='main.astralrevision', verbose_name='Астральная ревизия')),
+                ('astral_year', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='material_parts', to='main.astralyear', verbose_name='Год выпуска')),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='main.materialpart', verbose_name='Родительский узел')),
+            ],
+            options={
+                'verbose_name': 'Материальный узел',
+                'verbose_name_plural': 'Материальные узлы',
+                'db_table': 'material_part',
+            },
+        )),
+        IfNeeded(migrations.CreateModel(
+            name='MaterialStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Название статуса')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+            ],
+            options={
+                'verbose_name': 'Материальный статус',
+                'verbose_name_plural': 'Материальные статусы',
+                'db_table': 'material_status',
+            },
+        )),
+        IfNeeded(migrations.CreateModel(
+            name='MaterialUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_name', models.CharField(max_length=255, verbose_name='Имя')),
+                ('second_name', models.CharField(max_length=255, verbose_name='Фамилия')),
+                ('patronymic', models.CharField(blank=True, max_length=255, verbose_name='Отчество')),
+                ('material_group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='users', to='main.materialgroup', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Материальный пользователь',
+                'verbose_name_plural': 'Материальные пользователи',
+                'db_table': 'material_user',
+            },
+        )),
+        IfNeeded(migrations.CreateModel(
+            name='MaterialWarehouse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Название склада')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='main.materialwarehouse', verbose_name='Родительский склад')),
+            ],
+            options={
+                'verbose_name': 'Материальный склад',
+                'verbose_name_plural': 'Материальные склады',
+                'db_table': 'material_warehouse',
+            },
+        )),
+        IfNeeded(migrations.RemoveField(
+            model_name='journal',
+            name='device',
+        )),
+        IfNeeded(migrations.RemoveField(
+            model_name='journal',
+            name='location',
+        )),
+        IfNeeded(migrations.RemoveField(
+            model_name='journal',
+            name='operation',
+        )),
+        IfNeeded(migrations.RemoveField(
+            model_name='journal',
+            name='status',
+        )),
+        IfNeeded(migrations.RemoveField(
+            model_name='journal',
+            name='user',
+        )),
+        IfNeeded(migrations.RemoveField(
+            model_name='part',
+            name='parent',
+        )),
+        IfNeeded(migrations.RemoveField(
+            model_name='part',
+            name='type',
+        )),
+        IfNeeded(migrations.RemoveField(
+            model_name='user',
+            name='job',
+        )),
+        IfNeeded(migrations.DeleteModel(
+            name='Device',
+        )),
+        IfNeeded(migrations.DeleteModel(
+            name='Journal',
+        )),
+        IfNeeded(migrations.DeleteModel(
+            name='Location',
+        )),
+        IfNeeded(migrations.DeleteModel(
+            name='Operation',
+        )),
+        IfNeeded(migrations.DeleteModel(
+            name='Part',
+        )),
+        IfNeeded(migrations.DeleteModel(
+            name='PartType',
+        )),
+        IfNeeded(migrations.DeleteModel(
+            name='Status',
+        )),
+        IfNeeded(migrations.DeleteModel(
+            name='User',
+        )),
+        IfNeeded(migrations.DeleteModel(
+            name='UserJob',
+        )),
+        IfNeeded(migrations.AddField(
+            model_name='materialoperations',
+            name='material_operation_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='operations', to='main.materialoperationtype', verbose_name='Тип операции'),
+        )),
+        IfNeeded(migrations.AddField(
+            model_name='materialoperations',
+            name='material_part',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='operations', to='main.materialpart', verbose_name='Материальный узел'),
+        )),
+        IfNeeded(migrations.AddField(
+            model_name='materialoperations',
+            name='material_status',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='operations', to='main.materialstatus', verbose_name='Статус'),
+        )),
+        IfNeeded(migrations.AddField(
+            model_name='materialoperations',
+            name='material_user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='operations', to='main.materialuser', verbose_name='Пользователь'),
+        )),
+        IfNeeded(migrations.AddField(
+            model_name='materialoperations',
+            name='material_warehouse',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='operations', to='main.materialwarehouse', verbose_name='Склад'),
+        )),
+        IfNeeded(migrations.AddField(
+            model_name='astralpart',
+            name='astral_variant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parts', to='main.astralvariant', verbose_name='Астральный вариант'),
+        )),
+    ]
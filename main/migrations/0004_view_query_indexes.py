@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_new_schema'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='astralrevision',
+            name='parent',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='main.astralrevision', verbose_name='Родительская ревизия'),
+        ),
+        migrations.AlterField(
+            model_name='materialoperations',
+            name='material_operation_type',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='operations', to='main.materialoperationtype', verbose_name='Тип операции'),
+        ),
+        migrations.AlterField(
+            model_name='materialoperations',
+            name='material_part',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='operations', to='main.materialpart', verbose_name='Материальный узел'),
+        ),
+        migrations.AlterField(
+            model_name='materialoperations',
+            name='material_status',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='operations', to='main.materialstatus', verbose_name='Статус'),
+        ),
+        migrations.AlterField(
+            model_name='materialpart',
+            name='astral_manufacturer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='material_parts', to='main.astralmanufacturer', verbose_name='Производитель'),
+        ),
+        migrations.AlterField(
+            model_name='materialpart',
+            name='parent',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='main.materialpart', verbose_name='Родительский узел'),
+        ),
+        migrations.AddIndex(
+            model_name='astralrevision',
+            index=models.Index(condition=models.Q(('parent__isnull', False)), fields=['parent'], name='ar_parent_partial_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='astralyear',
+            index=models.Index(fields=['year'], name='ay_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialoperations',
+            index=models.Index(fields=['-datetime'], include=('id', 'material_operation_type', 'material_user', 'material_part', 'material_status', 'material_warehouse'), name='mo_datetime_cover_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialoperations',
+            index=models.Index(fields=['material_status', '-datetime'], name='mo_status_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialoperations',
+            index=models.Index(fields=['material_operation_type', '-datetime'], name='mo_optype_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialoperations',
+            index=models.Index(fields=['material_part', '-datetime'], name='mo_part_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialpart',
+            index=models.Index(fields=['astral_manufacturer', 'astral_year'], include=('id', 'serial', 'astral_revision', 'parent'), name='mp_manu_year_cover_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialpart',
+            index=models.Index(condition=models.Q(('parent__isnull', False)), fields=['parent'], name='mp_parent_partial_idx'),
+        ),
+    ]
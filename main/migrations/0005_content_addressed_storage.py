@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:02
+
+from django.db import migrations, models
+import main.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_view_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='SHA-256')),
+                ('size', models.BigIntegerField(verbose_name='Размер')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='Количество ссылок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+            ],
+            options={
+                'verbose_name': 'Файл хранилища',
+                'verbose_name_plural': 'Файлы хранилища',
+                'db_table': 'stored_blob',
+            },
+        ),
+        migrations.AlterField(
+            model_name='astralrevision',
+            name='file',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=main.storage.get_upload_storage, upload_to='astral_revisions/', verbose_name='Файл'),
+        ),
+        migrations.AlterField(
+            model_name='astralrevision',
+            name='image',
+            field=models.ImageField(blank=True, max_length=255, null=True, storage=main.storage.get_upload_storage, upload_to='astral_revisions/images/', verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='materialoperations',
+            name='file',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=main.storage.get_upload_storage, upload_to='material_operations/', verbose_name='Файл'),
+        ),
+        migrations.AlterField(
+            model_name='materialoperations',
+            name='image',
+            field=models.ImageField(blank=True, max_length=255, null=True, storage=main.storage.get_upload_storage, upload_to='material_operations/images/', verbose_name='Изображение'),
+        ),
+    ]
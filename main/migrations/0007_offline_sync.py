@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_background_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='materialoperations',
+            name='client_uuid',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name='UUID клиента'),
+        ),
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=100, verbose_name='Модель')),
+                ('object_id', models.BigIntegerField(verbose_name='ID объекта')),
+                ('action', models.CharField(choices=[('save', 'Создание / изменение'), ('delete', 'Удаление')], max_length=16, verbose_name='Действие')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время')),
+            ],
+            options={
+                'verbose_name': 'Изменение',
+                'verbose_name_plural': 'Журнал изменений',
+                'db_table': 'change_log',
+                'indexes': [models.Index(fields=['entity', 'id'], name='cl_entity_id_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:25
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_offline_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changelog',
+            name='payload',
+            field=models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='Состояние объекта'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+CREATE_SQL = """
+CREATE OR REPLACE FUNCTION notify_material_operations() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('material_operations', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER material_operations_notify
+    AFTER INSERT ON material_operations
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_material_operations();
+"""
+
+DROP_SQL = """
+DROP TRIGGER IF EXISTS material_operations_notify ON material_operations;
+DROP FUNCTION IF EXISTS notify_material_operations();
+"""
+
+
+def _run_on_postgresql(sql):
+    def run(apps, schema_editor):
+        # Триггер нужен только PostgreSQL; на SQLite живой журнал опрашивает таблицу
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+    """NOTIFY material_operations после каждой вставки операций (см. main/live.py)"""
+
+    dependencies = [
+        ('main', '0008_change_log_payload'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run_on_postgresql(CREATE_SQL), _run_on_postgresql(DROP_SQL)),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_operations_notify_trigger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['created_at'], name='cl_created_at_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_change_log_created_at_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectionCursor',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Проекция')),
+                ('position', models.BigIntegerField(default=0, verbose_name='Номер записи журнала')),
+                ('rebuilt_at', models.DateTimeField(blank=True, null=True, verbose_name='Полная перестройка')),
+            ],
+            options={
+                'verbose_name': 'Позиция проекции',
+                'verbose_name_plural': 'Позиции проекций',
+                'db_table': 'projection_cursor',
+            },
+        ),
+        migrations.CreateModel(
+            name='MaterialPartRow',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID материального узла')),
+                ('serial', models.CharField(max_length=255, verbose_name='Серийный номер')),
+                ('part_names', models.TextField(blank=True, verbose_name='Астральные узлы')),
+                ('type_names', models.TextField(blank=True, verbose_name='Астральные типы')),
+                ('astral_part_ids', models.TextField(blank=True, verbose_name='ID астральных узлов')),
+                ('revision_id', models.BigIntegerField(verbose_name='ID ревизии')),
+                ('revision_name', models.CharField(max_length=255, verbose_name='Ревизия')),
+                ('manufacturer_id', models.BigIntegerField(verbose_name='ID производителя')),
+                ('manufacturer_name', models.CharField(max_length=255, verbose_name='Производитель')),
+                ('year_id', models.BigIntegerField(verbose_name='ID года выпуска')),
+                ('year', models.IntegerField(verbose_name='Год выпуска')),
+                ('parent_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID родительского узла')),
+                ('parent_serial', models.CharField(blank=True, max_length=255, verbose_name='Родительский узел')),
+            ],
+            options={
+                'verbose_name': 'Строка списка узлов',
+                'verbose_name_plural': 'Строки списка узлов',
+                'db_table': 'material_part_row',
+                'indexes': [models.Index(fields=['manufacturer_id', 'year', 'id'], name='mpr_manu_year_idx'), models.Index(fields=['year', 'id'], name='mpr_year_idx'), models.Index(fields=['revision_id'], name='mpr_revision_idx'), models.Index(fields=['year_id'], name='mpr_year_id_idx'), models.Index(condition=models.Q(('parent_id__isnull', False)), fields=['parent_id'], name='mpr_parent_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:23
+
+from django.db import migrations, models
+
+CREATE_SQL = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX search_index_trgm_idx ON search_index USING gin (text gin_trgm_ops);
+"""
+
+DROP_SQL = """
+DROP INDEX IF EXISTS search_index_trgm_idx;
+"""
+
+
+def _run_on_postgresql(sql):
+    def run(apps, schema_editor):
+        # Триграммы (pg_trgm) есть только в PostgreSQL; на SQLite поиск - по подстроке
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+    """Общий поисковый индекс (main/search.py) с триграммным индексом для нечёткого поиска"""
+
+    dependencies = [
+        ('main', '0011_material_part_row'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=32, verbose_name='Сущность')),
+                ('object_id', models.BigIntegerField(verbose_name='ID объекта')),
+                ('text', models.CharField(max_length=255, verbose_name='Текст')),
+                ('title', models.CharField(max_length=255, verbose_name='Заголовок')),
+                ('weight', models.SmallIntegerField(default=1, verbose_name='Вес')),
+            ],
+            options={
+                'verbose_name': 'Запись поискового индекса',
+                'verbose_name_plural': 'Поисковый индекс',
+                'db_table': 'search_index',
+                'indexes': [models.Index(fields=['entity', 'text'], name='search_index_prefix_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops'])],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(fields=('entity', 'object_id', 'text'), name='search_index_entry_uniq'),
+        ),
+        migrations.RunPython(_run_on_postgresql(CREATE_SQL), _run_on_postgresql(DROP_SQL)),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_search_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='materialpart',
+            name='mp_manu_year_cover_idx',
+        ),
+        migrations.AddIndex(
+            model_name='materialpart',
+            index=models.Index(fields=['astral_manufacturer'], name='mp_manufacturer_idx'),
+        ),
+    ]
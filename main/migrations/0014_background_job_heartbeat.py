@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import F
+
+
+def fill_heartbeat(apps, schema_editor):
+    # Выполняющиеся задачи: сигналом считается время начала
+    BackgroundJob = apps.get_model('main', 'BackgroundJob')
+    BackgroundJob.objects.filter(status='running').update(heartbeat_at=F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0013_material_part_manufacturer_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='backgroundjob',
+            name='bj_running_idx',
+        ),
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Поставил в очередь'),
+        ),
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последний сигнал обработчика'),
+        ),
+        migrations.AddIndex(
+            model_name='backgroundjob',
+            index=models.Index(condition=models.Q(('status', 'running')), fields=['heartbeat_at'], name='bj_heartbeat_idx'),
+        ),
+        migrations.RunPython(fill_heartbeat, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,9 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Q
+
+from .storage import get_upload_storage
 
 # ============== АСТРАЛЬНАЯ ЧАСТЬ (Справочники) ==============
 
@@ -53,10 +58,10 @@ class AstralRevision(models.Model):
     """Ревизии (версии) узлов"""
     name = models.CharField(max_length=255, verbose_name='Название ревизии')
     description = models.TextField(blank=True, verbose_name='Описание')
-    image = models.ImageField(upload_to='astral_revisions/images/', blank=True, null=True, verbose_name='Изображение')
-    file = models.FileField(upload_to='astral_revisions/', blank=True, null=True, verbose_name='Файл')
+    image = models.ImageField(upload_to='astral_revisions/images/', storage=get_upload_storage, max_length=255, blank=True, null=True, verbose_name='Изображение')
+    file = models.FileField(upload_to='astral_revisions/', storage=get_upload_storage, max_length=255, blank=True, null=True, verbose_name='Файл')
     astral_parts = models.ManyToManyField(AstralPart, verbose_name='Астральные узлы', related_name='revisions')
-    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, verbose_name='Родительская ревизия', related_name='children')
+    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, verbose_name='Родительская ревизия', related_name='children', db_index=False)
     release_date = models.DateField(null=True, blank=True, verbose_name='Дата выпуска')
 
     def __str__(self):
@@ -69,6 +74,10 @@ class AstralRevision(models.Model):
         db_table = 'astral_revision'
         verbose_name = 'Астральная ревизия'
         verbose_name_plural = 'Астральные ревизии'
+        indexes = [
+            # Большинство ревизий корневые - индексируем только заполненных родителей
+            models.Index(fields=['parent'], name='ar_parent_partial_idx', condition=Q(parent__isnull=False)),
+        ]
 
 
 class AstralYear(models.Model):
@@ -84,6 +93,10 @@ class AstralYear(models.Model):
         verbose_name = 'Год выпуска астрального варианта'
         verbose_name_plural = 'Годы выпуска астральных вариантов'
         unique_together = [['astral_variant', 'year']]
+        indexes = [
+            # Фильтр API material-parts по astral_year__year
+            models.Index(fields=['year'], name='ay_year_idx'),
+        ]
 
 
 class AstralManufacturer(models.Model):
@@ -107,9 +120,9 @@ class MaterialPart(models.Model):
     """Реальный узел устройства с серийным номером"""
     serial = models.CharField(max_length=255, unique=True, verbose_name='Серийный номер')
     astral_revision = models.ForeignKey(AstralRevision, on_delete=models.PROTECT, verbose_name='Астральная ревизия', related_name='material_parts')
-    astral_manufacturer = models.ForeignKey(AstralManufacturer, on_delete=models.PROTECT, verbose_name='Производитель', related_name='material_parts')
+    astral_manufacturer = models.ForeignKey(AstralManufacturer, on_delete=models.PROTECT, verbose_name='Производитель', related_name='material_parts', db_index=False)
     astral_year = models.ForeignKey(AstralYear, on_delete=models.PROTECT, verbose_name='Год выпуска', related_name='material_parts')
-    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, verbose_name='Родительский узел', related_name='children')
+    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, verbose_name='Родительский узел', related_name='children', db_index=False)
 
     def __str__(self):
         parts = self.astral_revision.astral_parts.all()
@@ -123,6 +136,14 @@ class MaterialPart(models.Model):
         db_table = 'material_part'
         verbose_name = 'Материальный узел'
         verbose_name_plural = 'Материальные узлы'
+        indexes = [
+            # Фильтр API по производителю и проверка PROTECT при удалении производителя
+            # (одиночный индекс внешнего ключа снят). Фильтры списка по производителю и
+            # году (столбец year, а не astral_year_id) - индексы MaterialPartRow
+            models.Index(fields=['astral_manufacturer'], name='mp_manufacturer_idx'),
+            # Большинство узлов корневые - индексируем только заполненных родителей
+            models.Index(fields=['parent'], name='mp_parent_partial_idx', condition=Q(parent__isnull=False)),
+        ]
 
 
 class MaterialGroup(models.Model):
@@ -204,15 +225,17 @@ class MaterialWarehouse(models.Model):
 
 class MaterialOperations(models.Model):
     """Журнал операций"""
-    material_operation_type = models.ForeignKey(MaterialOperationType, on_delete=models.PROTECT, verbose_name='Тип операции', related_name='operations')
+    material_operation_type = models.ForeignKey(MaterialOperationType, on_delete=models.PROTECT, verbose_name='Тип операции', related_name='operations', db_index=False)
     material_user = models.ForeignKey(MaterialUser, on_delete=models.PROTECT, verbose_name='Пользователь', related_name='operations')
     datetime = models.DateTimeField(verbose_name='Дата и время')
     description = models.TextField(blank=True, verbose_name='Описание')
-    file = models.FileField(upload_to='material_operations/', blank=True, null=True, verbose_name='Файл')
-    image = models.ImageField(upload_to='material_operations/images/', blank=True, null=True, verbose_name='Изображение')
-    material_status = models.ForeignKey(MaterialStatus, on_delete=models.PROTECT, verbose_name='Статус', related_name='operations')
+    file = models.FileField(upload_to='material_operations/', storage=get_upload_storage, max_length=255, blank=True, null=True, verbose_name='Файл')
+    image = models.ImageField(upload_to='material_operations/images/', storage=get_upload_storage, max_length=255, blank=True, null=True, verbose_name='Изображение')
+    material_status = models.ForeignKey(MaterialStatus, on_delete=models.PROTECT, verbose_name='Статус', related_name='operations', db_index=False)
     material_warehouse = models.ForeignKey(MaterialWarehouse, on_delete=models.PROTECT, verbose_name='Склад', related_name='operations')
-    material_part = models.ForeignKey(MaterialPart, on_delete=models.CASCADE, verbose_name='Материальный узел', related_name='operations')
+    material_part = models.ForeignKey(MaterialPart, on_delete=models.CASCADE, verbose_name='Материальный узел', related_name='operations', db_index=False)
+    # Идентификатор, выданный станцией при записи без связи: повторная выгрузка не создаёт дубль
+    client_uuid = models.UUIDField(null=True, blank=True, unique=True, editable=False, verbose_name='UUID клиента')
 
     def __str__(self):
         return f"{self.material_operation_type.name} - {self.material_part.serial} ({self.datetime:%d.%m.%Y %H:%M})"
@@ -222,3 +245,200 @@ class MaterialOperations(models.Model):
         verbose_name = 'Материальная операция'
         verbose_name_plural = 'Материальные операции'
         ordering = ['-datetime']
+        # Одиночные индексы по FK заменены составными: ведущая колонка обслуживает
+        # и проверки PROTECT/CASCADE, и фильтр с сортировкой по -datetime
+        indexes = [
+            # operations_list / dashboard без фильтров; колонки строки списка в INCLUDE
+            models.Index(
+                fields=['-datetime'], name='mo_datetime_cover_idx',
+                include=[
+                    'id', 'material_operation_type', 'material_user', 'material_part',
+                    'material_status', 'material_warehouse',
+                ],
+            ),
+            # operations_list с фильтром по статусу / типу операции
+            models.Index(fields=['material_status', '-datetime'], name='mo_status_datetime_idx'),
+            models.Index(fields=['material_operation_type', '-datetime'], name='mo_optype_datetime_idx'),
+            # История операций в material_part_detail
+            models.Index(fields=['material_part', '-datetime'], name='mo_part_datetime_idx'),
+        ]
+
+
+# ============== ПРОЕКЦИИ ДЛЯ ЧТЕНИЯ ==============
+
+class MaterialPartRow(models.Model):
+    """Строка списка материальных узлов без соединений (обновляется по журналу изменений, см. projections.py)"""
+    id = models.BigIntegerField(primary_key=True, verbose_name='ID материального узла')
+    serial = models.CharField(max_length=255, verbose_name='Серийный номер')
+    part_names = models.TextField(blank=True, verbose_name='Астральные узлы')
+    type_names = models.TextField(blank=True, verbose_name='Астральные типы')
+    # ",3,5," - id астральных узлов ревизии, чтобы найти строки при удалении узла
+    astral_part_ids = models.TextField(blank=True, verbose_name='ID астральных узлов')
+    revision_id = models.BigIntegerField(verbose_name='ID ревизии')
+    revision_name = models.CharField(max_length=255, verbose_name='Ревизия')
+    manufacturer_id = models.BigIntegerField(verbose_name='ID производителя')
+    manufacturer_name = models.CharField(max_length=255, verbose_name='Производитель')
+    year_id = models.BigIntegerField(verbose_name='ID года выпуска')
+    year = models.IntegerField(verbose_name='Год выпуска')
+    parent_id = models.BigIntegerField(null=True, blank=True, verbose_name='ID родительского узла')
+    parent_serial = models.CharField(max_length=255, blank=True, verbose_name='Родительский узел')
+
+    def __str__(self):
+        return self.serial
+
+    class Meta:
+        db_table = 'material_part_row'
+        verbose_name = 'Строка списка узлов'
+        verbose_name_plural = 'Строки списка узлов'
+        indexes = [
+            # Фильтры списка (производитель, год) со страницами по id
+            models.Index(fields=['manufacturer_id', 'year', 'id'], name='mpr_manu_year_idx'),
+            models.Index(fields=['year', 'id'], name='mpr_year_idx'),
+            # Обновление строк по изменениям ревизий, лет и родителей
+            models.Index(fields=['revision_id'], name='mpr_revision_idx'),
+            models.Index(fields=['year_id'], name='mpr_year_id_idx'),
+            models.Index(fields=['parent_id'], name='mpr_parent_idx', condition=Q(parent_id__isnull=False)),
+        ]
+
+
+class ProjectionCursor(models.Model):
+    """Позиция проекции в журнале изменений: записи до неё уже применены"""
+    name = models.CharField(max_length=100, primary_key=True, verbose_name='Проекция')
+    position = models.BigIntegerField(default=0, verbose_name='Номер записи журнала')
+    rebuilt_at = models.DateTimeField(null=True, blank=True, verbose_name='Полная перестройка')
+
+    def __str__(self):
+        return f"{self.name}: {self.position}"
+
+    class Meta:
+        db_table = 'projection_cursor'
+        verbose_name = 'Позиция проекции'
+        verbose_name_plural = 'Позиции проекций'
+
+
+class SearchEntry(models.Model):
+    """Строка общего поискового индекса: одно искомое поле объекта (обновляется по журналу, см. search.py)"""
+    entity = models.CharField(max_length=32, verbose_name='Сущность')
+    object_id = models.BigIntegerField(verbose_name='ID объекта')
+    # Нормализованный текст: нижний регистр, «ё» -> «е», одиночные пробелы
+    text = models.CharField(max_length=255, verbose_name='Текст')
+    title = models.CharField(max_length=255, verbose_name='Заголовок')
+    weight = models.SmallIntegerField(default=1, verbose_name='Вес')
+
+    def __str__(self):
+        return f"{self.entity} {self.object_id}: {self.text}"
+
+    class Meta:
+        db_table = 'search_index'
+        verbose_name = 'Запись поискового индекса'
+        verbose_name_plural = 'Поисковый индекс'
+        constraints = [
+            # Также индекс для обновления записей объекта
+            models.UniqueConstraint(fields=['entity', 'object_id', 'text'], name='search_index_entry_uniq'),
+        ]
+        indexes = [
+            # Поиск по началу строки (LIKE 'запрос%') внутри сущности;
+            # триграммный GIN-индекс по text создаётся миграцией 0012 (только PostgreSQL)
+            models.Index(
+                fields=['entity', 'text'], name='search_index_prefix_idx',
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops'],
+            ),
+        ]
+
+
+# ============== ХРАНИЛИЩЕ ФАЙЛОВ ==============
+
+class StoredBlob(models.Model):
+    """Уникальное содержимое загруженного файла и количество ссылок на него"""
+    digest = models.CharField(max_length=64, primary_key=True, verbose_name='SHA-256')
+    size = models.BigIntegerField(verbose_name='Размер')
+    ref_count = models.PositiveIntegerField(default=0, verbose_name='Количество ссылок')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создан')
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.ref_count})"
+
+    class Meta:
+        db_table = 'stored_blob'
+        verbose_name = 'Файл хранилища'
+        verbose_name_plural = 'Файлы хранилища'
+
+
+# ============== ФОНОВЫЕ ЗАДАЧИ ==============
+
+class BackgroundJob(models.Model):
+    """Фоновая задача, выполняемая командой runworker"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Выполнена'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    task = models.CharField(max_length=255, verbose_name='Задача')
+    kwargs = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name='Статус')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    max_attempts = models.PositiveIntegerField(default=3, verbose_name='Максимум попыток')
+    run_at = models.DateTimeField(verbose_name='Запустить после')
+    result = models.JSONField(null=True, blank=True, verbose_name='Результат')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    worker = models.CharField(max_length=255, blank=True, verbose_name='Обработчик')
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='+', verbose_name='Поставил в очередь',
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создана')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начата')
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name='Последний сигнал обработчика')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершена')
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.get_status_display()})"
+
+    class Meta:
+        db_table = 'background_job'
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            # Выборка очереди обработчиком: только ожидающие задачи
+            models.Index(fields=['run_at', 'id'], name='bj_pending_idx', condition=Q(status='pending')),
+            # Зависшие задачи упавших обработчиков
+            models.Index(fields=['heartbeat_at'], name='bj_heartbeat_idx', condition=Q(status='running')),
+        ]
+
+
+# ============== ЖУРНАЛ ИЗМЕНЕНИЙ ==============
+
+class ChangeLog(models.Model):
+    """Изменение объекта (outbox); номер записи - курсор потребителя и токен синхронизации"""
+    ACTION_SAVE = 'save'
+    ACTION_DELETE = 'delete'
+    ACTION_CHOICES = [
+        (ACTION_SAVE, 'Создание / изменение'),
+        (ACTION_DELETE, 'Удаление'),
+    ]
+
+    entity = models.CharField(max_length=100, verbose_name='Модель')
+    object_id = models.BigIntegerField(verbose_name='ID объекта')
+    action = models.CharField(max_length=16, choices=ACTION_CHOICES, verbose_name='Действие')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Время')
+    payload = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name='Состояние объекта')
+
+    def __str__(self):
+        return f"#{self.pk} {self.entity}:{self.object_id} {self.action}"
+
+    class Meta:
+        db_table = 'change_log'
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+        indexes = [
+            # Дельта для станции: изменения сущности после токена
+            models.Index(fields=['entity', 'id'], name='cl_entity_id_idx'),
+            # Граница «устоявшихся» записей (outbox.settled_sequence)
+            models.Index(fields=['created_at'], name='cl_created_at_idx'),
+        ]
@@ -0,0 +1,190 @@
+"""
+Журнал изменений (outbox) для станций синхронизации и внешних систем (ERP, BI).
+
+Каждое создание, изменение и удаление объектов из ``CDC_MODELS`` записывается в
+таблицу ``change_log`` в той же транзакции, что и само изменение: откат
+транзакции откатывает и запись журнала. Запись хранит состояние строки
+(``payload``), поэтому потребителю не нужно перечитывать таблицы.
+
+Одиночные сохранения и удаления журналируются сигналами (см. signals.py).
+``bulk_create``, ``update()`` и ``_raw_delete`` сигналов не отправляют - такие пути
+вызывают ``log_changes`` явно, быстрое удаление (deletion.py) - ``log_deletions``.
+
+Номер записи - курсор потребителя. Транзакции фиксируются не по порядку
+номеров, поэтому выдача не заходит дальше записей моложе
+``CHANGELOG_SETTLE_SECONDS`` (см. ``settled_sequence``): запись с меньшим номером,
+зафиксированная позже, не будет пропущена.
+
+Журнал хранится ``CHANGELOG_RETENTION_DAYS`` дней (``manage.py prune_change_log``).
+Записи удаляются не дальше позиций проекций, граница удаления запоминается
+(``pruned_sequence``): курсор до неё уже нельзя продолжить - лента отвечает 410,
+станция получает полный снимок справочников.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FileField, Max, Min
+from django.utils import timezone
+
+from .models import (
+    AstralManufacturer, AstralPart, AstralRevision, AstralType, AstralVariant, AstralYear,
+    ChangeLog, MaterialGroup, MaterialOperationType, MaterialOperations, MaterialPart,
+    MaterialStatus, MaterialUser, MaterialWarehouse, ProjectionCursor
+)
+
+CDC_MODELS = (
+    MaterialPart, MaterialOperations, AstralRevision,
+    # Справочники
+    AstralType, AstralVariant, AstralPart, AstralYear, AstralManufacturer,
+    MaterialGroup, MaterialOperationType, MaterialUser, MaterialStatus, MaterialWarehouse,
+)
+
+ENTITIES = {model._meta.label_lower: model for model in CDC_MODELS}
+
+# Граница удалённых по сроку хранения записей хранится рядом с позициями проекций
+PRUNED_MARK = 'change_log.pruned'
+
+
+def serialize_instance(instance):
+    """Значения столбцов строки без обращений к БД: внешние ключи - id, файлы - имена"""
+    data = {}
+    for field in instance._meta.concrete_fields:
+        value = getattr(instance, field.attname)
+        if isinstance(field, FileField):
+            value = value.name or ''
+        data[field.attname] = value
+    return data
+
+
+def _entry(instance, action):
+    return ChangeLog(
+        entity=instance._meta.label_lower,
+        object_id=instance.pk,
+        action=action,
+        payload=serialize_instance(instance),
+    )
+
+
+def log_change(instance, action):
+    """Запись в журнал изменений (в той же транзакции, что и само изменение)"""
+    _entry(instance, action).save()
+
+
+def log_changes(objects, action):
+    """Журналирование пакетных изменений, прошедших мимо сигналов"""
+    ChangeLog.objects.bulk_create([_entry(obj, action) for obj in objects], batch_size=500)
+
+
+def log_deletions(queryset):
+    """
+    Журналирование удаления строк queryset'а одним ``INSERT ... SELECT`` (до удаления).
+
+    Состояние строк не сохраняется (``payload`` пуст): при массовом удалении
+    потребителю достаточно id.
+    """
+    model = queryset.model
+    select_sql, select_params = queryset.values('pk').query.sql_with_params()
+    table = ChangeLog._meta.db_table
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (entity, object_id, action, created_at) '
+            f'SELECT %s, doomed.{connection.ops.quote_name(model._meta.pk.column)}, %s, %s '
+            f'FROM ({select_sql}) AS doomed',
+            (model._meta.label_lower, ChangeLog.ACTION_DELETE, now, *select_params),
+        )
+
+
+def settle_from():
+    """Записи моложе этого момента ещё могут «обгонять» незафиксированные записи с меньшими номерами"""
+    return timezone.now() - timedelta(seconds=settings.CHANGELOG_SETTLE_SECONDS)
+
+
+def settled_sequence():
+    """Номер записи, до которого журнал гарантированно заполнен"""
+    # Два запроса по индексам (первичный ключ и created_at) вместо одного агрегата по всей таблице
+    last = ChangeLog.objects.aggregate(last=Max('id'))['last'] or 0
+    first_unsettled = ChangeLog.objects.filter(created_at__gt=settle_from()).aggregate(first=Min('id'))['first']
+    if first_unsettled is not None:
+        return min(last, first_unsettled - 1)
+    return last
+
+
+def models_version(models):
+    """
+    Версия данных моделей - номер последней записи журнала по любой из них.
+
+    Один запрос из ``UNION ALL`` коротких выборок по индексу (entity, id): каждая
+    читает одну строку, сколько бы записей ни было у модели. Пока последняя запись
+    моложе ``CHANGELOG_SETTLE_SECONDS``, возвращает None: запись с меньшим номером
+    может ещё не быть зафиксирована, и версия не отражала бы её.
+    """
+    table = ChangeLog._meta.db_table
+    part = (
+        f'SELECT * FROM (SELECT id, created_at > %s AS fresh FROM {table} '
+        f'WHERE entity = %s ORDER BY id DESC LIMIT 1) AS latest'
+    )
+    threshold = connection.ops.adapt_datetimefield_value(settle_from())
+    params = []
+    for model in models:
+        params += [threshold, model._meta.label_lower]
+    with connection.cursor() as cursor:
+        cursor.execute(' UNION ALL '.join([part] * len(models)), params)
+        rows = cursor.fetchall()
+    if any(fresh for _, fresh in rows):
+        return None
+    return max((pk for pk, _ in rows), default=0)
+
+
+def read_changes(after, limit, entities=None):
+    """
+    Записи журнала после курсора ``after``, не дальше ``settled_sequence()``.
+
+    Возвращает ``(записи, курсор)``; следующий запрос передаёт курсор как ``after``.
+    """
+    settled = settled_sequence()
+    queryset = ChangeLog.objects.filter(id__gt=after, id__lte=settled)
+    if entities:
+        queryset = queryset.filter(entity__in=entities)
+    changes = list(
+        queryset.order_by('id').values('id', 'entity', 'object_id', 'action', 'created_at', 'payload')[:limit]
+    )
+    if len(changes) == limit:
+        return changes, changes[-1]['id']
+    # Страница неполная - просмотрено всё до settled, включая записи других сущностей
+    return changes, max(after, settled)
+
+
+def pruned_sequence():
+    """Номер последней записи, удалённой по сроку хранения (0 - журнал не усекался)"""
+    return ProjectionCursor.objects.filter(name=PRUNED_MARK).values_list('position', flat=True).first() or 0
+
+
+def prune_change_log(days, chunk_size=None):
+    """
+    Удаляет записи журнала старше ``days`` дней, пачками по первичному ключу.
+
+    Граница не заходит дальше ``settled_sequence`` и позиций проекций (их записи
+    ещё не применены) и сохраняется до удаления: потребитель с более старым
+    курсором узнаёт, что часть изменений ему уже не получить. Возвращает число
+    удалённых записей.
+    """
+    chunk_size = chunk_size or settings.CHANGELOG_PRUNE_CHUNK_SIZE
+    cutoff = timezone.now() - timedelta(days=days)
+    boundary = ChangeLog.objects.filter(created_at__lt=cutoff).aggregate(last=Max('id'))['last']
+    if boundary is None:
+        return 0
+    positions = ProjectionCursor.objects.exclude(name=PRUNED_MARK).values_list('position', flat=True)
+    boundary = min(boundary, settled_sequence(), *positions)
+    if boundary <= pruned_sequence():
+        return 0
+    ProjectionCursor.objects.update_or_create(name=PRUNED_MARK, defaults={'position': boundary})
+
+    removed = 0
+    start = ChangeLog.objects.aggregate(first=Min('id'))['first'] - 1
+    while start < boundary:
+        end = min(start + chunk_size, boundary)
+        removed += ChangeLog.objects.filter(id__gt=start, id__lte=end).delete()[0]
+        start = end
+    return removed
@@ -0,0 +1,119 @@
+"""
+Ограниченная подгрузка связанных строк: не больше N на родителя одним запросом.
+
+``top_related`` строит ``Prefetch`` по срезу queryset'а. Django 4.2 выполняет
+такой prefetch как ``ROW_NUMBER() OVER (PARTITION BY <внешний ключ> ORDER BY ...)``
+с фильтром по номеру строки, поэтому и карточка, и страница списка читают не
+больше N строк на родителя, сколько бы их ни было всего. Загружается N + 1
+строка: лишняя означает, что есть продолжение, и ``split_top`` отдаёт курсор
+для «Показать ещё».
+
+``keyset_page`` - следующая страница после курсора (значения полей сортировки
+последней показанной строки) без OFFSET: запрос идёт по индексу с той же
+сортировкой и не перечитывает пропущенные строки.
+"""
+import base64
+import datetime
+import json
+
+from collections import defaultdict
+
+from django.db.models import F, Prefetch, Q, Window
+from django.db.models.functions import RowNumber
+
+
+def top_related(lookup, queryset, limit, to_attr):
+    """Prefetch не больше ``limit`` связанных строк на объект (плюс одна - признак продолжения)"""
+    if not queryset.ordered:
+        raise ValueError('Для ограниченной подгрузки нужна явная сортировка')
+    return Prefetch(lookup, queryset=queryset[:limit + 1], to_attr=to_attr)
+
+
+def top_by_parent(queryset, field_name, parent_ids, limit):
+    """
+    Не больше ``limit`` строк на каждое значение ``field_name`` из ``parent_ids``
+    одним запросом - тот же ``ROW_NUMBER()``, что и у ``top_related``, но без
+    объектов-родителей (например, для строк проекции). Словарь id -> строки.
+    """
+    if not queryset.ordered:
+        raise ValueError('Для ограниченной подгрузки нужна явная сортировка')
+    ordering = queryset.query.order_by
+    rows = queryset.filter(**{f'{field_name}__in': parent_ids}).annotate(
+        _row_number=Window(RowNumber(), partition_by=F(field_name), order_by=[
+            F(name[1:]).desc() if name.startswith('-') else F(name).asc() for name in ordering
+        ]),
+    ).filter(_row_number__lte=limit)
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[getattr(row, field_name)].append(row)
+    return grouped
+
+
+def split_top(rows, limit, ordering):
+    """Строки из ``top_related``: ``(первые limit, курсор продолжения или None)``"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1], ordering)
+
+
+# ============== КУРСОРЫ ==============
+
+def _field_names(ordering):
+    return [name.lstrip('-') for name in ordering]
+
+
+def _cursor_value(value):
+    # DjangoJSONEncoder отбрасывает микросекунды - курсор должен совпадать точно
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def encode_cursor(obj, ordering):
+    values = [_cursor_value(getattr(obj, name)) for name in _field_names(ordering)]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """Значения полей сортировки из курсора; ValueError, если курсор повреждён"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Некорректный курсор')
+    names = _field_names(ordering)
+    if not isinstance(values, list) or len(values) != len(names):
+        raise ValueError('Некорректный курсор')
+    try:
+        return [model._meta.get_field(name).to_python(value) for name, value in zip(names, values)]
+    except Exception:
+        raise ValueError('Некорректный курсор')
+
+
+def _after_q(ordering, values):
+    """Условие «строго после курсора» для составной сортировки"""
+    condition = Q()
+    equal = Q()
+    for name, value in zip(ordering, values):
+        field = name.lstrip('-')
+        lookup = 'lt' if name.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{field}__{lookup}': value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor, limit):
+    """
+    Страница после ``cursor``: ``(строки, курсор следующей страницы или None)``.
+
+    ``ordering`` должен однозначно упорядочивать строки (последним полем - id).
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(_after_q(ordering, decode_cursor(cursor, queryset.model, ordering)))
+    rows = list(queryset[:limit + 1])
+    return split_top(rows, limit, ordering)
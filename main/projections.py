@@ -0,0 +1,326 @@
+"""
+Проекция для чтения: плоская таблица строк списка материальных узлов.
+
+Строка списка собиралась из MaterialPart, ревизии, её астральных узлов с
+вариантами и типами, производителя, года и родителя - цепочка соединений и
+prefetch, растущая с размером страницы. ``MaterialPartRow`` хранит всё это в
+одной строке; список и его фильтры читают одну таблицу с индексами.
+
+Таблица обновляется по журналу изменений (outbox.py), а не сигналами: журнал
+пишут и сигналы, и пакетные пути (API, синхронизация, быстрое удаление), и
+изменения состава ревизий. ``catch_up`` применяет новые записи журнала перед
+показом списка - без новых записей это несколько коротких запросов по индексам.
+Записи переводятся в набор затронутых узлов, и их строки пересобираются из
+исходных таблиц (операция идемпотентна, повторное применение безвредно).
+
+Позиция проекции (``ProjectionCursor``) продвигается только до
+``settled_sequence``: записи моложе ``CHANGELOG_SETTLE_SECONDS`` применяются, но
+остаются за позицией, чтобы не пропустить запись с меньшим номером из
+транзакции, зафиксированной позже. Процесс помнит, какие из них уже применил.
+
+Запрос страницы применяет не больше ``PROJECTION_MAX_LAG`` записей. Если позиции
+нет (новая установка) или отставание больше, полная перестройка уходит в фоновую
+задачу (``projections.rebuild``), а список до её завершения читает исходные
+таблицы (``live_part_rows``). Перестройка выполняется под advisory-блокировкой -
+одновременно её делает только один процесс; при развёртывании таблицу строит
+``manage.py rebuild_part_rows --if-needed``.
+
+Общая часть - ``ChangeLogProjection``; по той же схеме обновляется поисковый
+индекс (search.py).
+"""
+import hashlib
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from .jobs import enqueue
+from .models import AstralPart, BackgroundJob, ChangeLog, MaterialPart, MaterialPartRow, ProjectionCursor
+from .outbox import settled_sequence
+
+NAME = 'material_part_rows'
+
+REBUILD_TASK = 'projections.rebuild'
+
+# Проекции по имени - для фоновой перестройки
+PROJECTIONS = {}
+
+REBUILD_CHUNK_SIZE = 1000
+
+ROW_FIELDS = (
+    'serial', 'part_names', 'type_names', 'astral_part_ids', 'revision_id', 'revision_name',
+    'manufacturer_id', 'manufacturer_name', 'year_id', 'year', 'parent_id', 'parent_serial',
+)
+
+# Записи журнала, от которых зависят строки
+ENTITIES = (
+    'main.materialpart', 'main.astralrevision', 'main.astralpart', 'main.astralvariant',
+    'main.astraltype', 'main.astralmanufacturer', 'main.astralyear',
+)
+
+
+@contextmanager
+def advisory_lock(name, wait=False):
+    """
+    Сессионная advisory-блокировка PostgreSQL по имени: ``True``, если получена.
+    Без ``wait`` не ждёт (``False``, если занята), с ``wait`` - ждёт освобождения.
+    В остальных СУБД (SQLite в тестах) - всегда ``True``.
+    """
+    if connection.vendor != 'postgresql':
+        yield True
+        return
+    key = int.from_bytes(hashlib.md5(name.encode()).digest()[:8], 'big', signed=True)
+    with connection.cursor() as cursor:
+        if wait:
+            cursor.execute('SELECT pg_advisory_lock(%s)', [key])
+            acquired = True
+        else:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [key])
+            acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [key])
+
+
+class ChangeLogProjection:
+    """
+    Таблица для чтения, которая догоняет журнал изменений.
+
+    Наследник задаёт ``affected`` (ключи строк, зависящих от изменённых
+    объектов), ``refresh`` (пересборка строк по ключам) и ``rebuild_rows``
+    (пересборка всей таблицы, возвращает количество строк). ``max_lag_setting`` -
+    настройка с наибольшим отставанием, которое применяется в запросе.
+    """
+    max_lag_setting = 'PROJECTION_MAX_LAG'
+
+    def __init__(self, name, entities):
+        self.name = name
+        self.entities = entities
+        # Записи после позиции, уже применённые этим процессом
+        self._applied = set()
+        self._lock = threading.Lock()
+        PROJECTIONS[name] = self
+
+    @property
+    def max_lag(self):
+        return getattr(settings, self.max_lag_setting)
+
+    def affected(self, entity, object_ids):
+        raise NotImplementedError
+
+    def refresh(self, keys):
+        raise NotImplementedError
+
+    def rebuild_rows(self):
+        raise NotImplementedError
+
+    def rebuild(self):
+        """
+        Полная перестройка таблицы; возвращает количество строк или None, если
+        перестройку уже выполняет другой процесс.
+        """
+        with advisory_lock(f'projection:{self.name}') as acquired:
+            if not acquired:
+                return None
+            # Позиция берётся до чтения таблиц: изменения во время перестройки применятся повторно
+            position = settled_sequence()
+            count = self.rebuild_rows()
+            ProjectionCursor.objects.update_or_create(
+                name=self.name, defaults={'position': position, 'rebuilt_at': timezone.now()},
+            )
+        with self._lock:
+            self._applied.clear()
+        return count
+
+    def _position(self):
+        return ProjectionCursor.objects.filter(name=self.name).values_list('position', flat=True).first()
+
+    def _entries(self, position):
+        """Записи журнала после позиции - не больше ``max_lag + 1``"""
+        return list(
+            ChangeLog.objects.filter(id__gt=position, entity__in=self.entities)
+            .order_by('id').values_list('id', 'entity', 'object_id')[:self.max_lag + 1]
+        )
+
+    def needs_rebuild(self):
+        """Позиции нет или отставание больше, чем применяется в запросе"""
+        position = self._position()
+        return position is None or len(self._entries(position)) > self.max_lag
+
+    def schedule_rebuild(self):
+        """Ставит полную перестройку в очередь фоновых задач, если она ещё не стоит там"""
+        queued = BackgroundJob.objects.filter(
+            task=REBUILD_TASK, kwargs__projection=self.name,
+            status__in=[BackgroundJob.STATUS_PENDING, BackgroundJob.STATUS_RUNNING],
+        ).exists()
+        if not queued:
+            enqueue(REBUILD_TASK, projection=self.name)
+
+    def catch_up(self):
+        """
+        Применяет новые записи журнала к таблице; возвращает количество применённых записей.
+
+        Если позиции нет или отставание больше ``max_lag``, ставит перестройку в
+        очередь и возвращает None: таблица пока не отражает журнал.
+        """
+        position = self._position()
+        if position is None:
+            self.schedule_rebuild()
+            return None
+        # До выборки записей: всё до settled к этому моменту зафиксировано и попадёт в выборку
+        settled = settled_sequence()
+
+        entries = self._entries(position)
+        if len(entries) > self.max_lag:
+            self.schedule_rebuild()
+            return None
+        with self._lock:
+            entries = [entry for entry in entries if entry[0] not in self._applied]
+        if entries:
+            changed = defaultdict(set)
+            for _, entity, object_id in entries:
+                changed[entity].add(object_id)
+            keys = set()
+            for entity, object_ids in changed.items():
+                keys |= self.affected(entity, object_ids)
+            self.refresh(keys)
+
+        if settled > position:
+            ProjectionCursor.objects.filter(name=self.name, position__lt=settled).update(position=settled)
+        with self._lock:
+            self._applied.update(entry[0] for entry in entries)
+            # Записи до позиции больше не перечитываются
+            self._applied.difference_update({entry_id for entry_id in self._applied if entry_id <= settled})
+        return len(entries)
+
+
+def _parts_queryset():
+    return MaterialPart.objects.select_related(
+        'astral_revision', 'astral_manufacturer', 'astral_year', 'parent'
+    ).prefetch_related('astral_revision__astral_parts__astral_variant__astral_type')
+
+
+def build_row(part):
+    astral_parts = sorted(part.astral_revision.astral_parts.all(), key=lambda astral_part: astral_part.pk)
+    type_names = []
+    for astral_part in astral_parts:
+        name = astral_part.astral_variant.astral_type.name
+        if name not in type_names:
+            type_names.append(name)
+    return MaterialPartRow(
+        id=part.pk,
+        serial=part.serial,
+        part_names=', '.join(astral_part.name for astral_part in astral_parts),
+        type_names=', '.join(type_names),
+        astral_part_ids=''.join(f',{astral_part.pk}' for astral_part in astral_parts) + ',' if astral_parts else '',
+        revision_id=part.astral_revision_id,
+        revision_name=part.astral_revision.name,
+        manufacturer_id=part.astral_manufacturer_id,
+        manufacturer_name=part.astral_manufacturer.name,
+        year_id=part.astral_year_id,
+        year=part.astral_year.year,
+        parent_id=part.parent_id,
+        parent_serial=part.parent.serial if part.parent_id else '',
+    )
+
+
+def refresh_rows(part_ids):
+    """Пересобирает строки узлов ``part_ids``; строки удалённых узлов удаляются"""
+    part_ids = sorted(set(part_ids))
+    for start in range(0, len(part_ids), REBUILD_CHUNK_SIZE):
+        chunk = part_ids[start:start + REBUILD_CHUNK_SIZE]
+        rows = [build_row(part) for part in _parts_queryset().filter(pk__in=chunk)]
+        with transaction.atomic():
+            MaterialPartRow.objects.filter(pk__in=set(chunk) - {row.pk for row in rows}).delete()
+            MaterialPartRow.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['id'], update_fields=ROW_FIELDS,
+            )
+
+
+def live_part_rows():
+    """
+    Узлы из исходных таблиц с полями строки проекции для фильтров и сортировки -
+    пока проекция не готова. Строки страницы собираются ``build_row``.
+    """
+    return _parts_queryset().annotate(
+        revision_name=F('astral_revision__name'),
+        manufacturer_id=F('astral_manufacturer_id'),
+        year=F('astral_year__year'),
+    )
+
+
+def live_part_names_match(search_query):
+    """Условие поиска по названиям астральных узлов ревизии для ``live_part_rows``"""
+    return Exists(AstralPart.objects.filter(
+        revisions=OuterRef('astral_revision_id'), name__icontains=search_query,
+    ))
+
+
+def _ids(queryset):
+    return set(queryset.values_list('id', flat=True))
+
+
+def affected_parts(entity, object_ids):
+    """id узлов, строки которых зависят от объектов ``object_ids`` модели ``entity``"""
+    if entity == 'main.materialpart':
+        # Дочерние узлы показывают серийный номер родителя
+        return (
+            set(object_ids)
+            | _ids(MaterialPart.objects.filter(parent_id__in=object_ids))
+            | _ids(MaterialPartRow.objects.filter(parent_id__in=object_ids))
+        )
+    if entity == 'main.astralrevision':
+        return _ids(MaterialPart.objects.filter(astral_revision_id__in=object_ids))
+    if entity == 'main.astralpart':
+        affected = _ids(MaterialPart.objects.filter(astral_revision__astral_parts__in=object_ids))
+        # Удалённый узел уже исключён из ревизий - строки находятся по сохранённым id
+        for object_id in object_ids:
+            affected |= _ids(MaterialPartRow.objects.filter(astral_part_ids__contains=f',{object_id},'))
+        return affected
+    if entity == 'main.astralvariant':
+        return _ids(MaterialPart.objects.filter(astral_revision__astral_parts__astral_variant__in=object_ids))
+    if entity == 'main.astraltype':
+        return _ids(MaterialPart.objects.filter(
+            astral_revision__astral_parts__astral_variant__astral_type__in=object_ids
+        ))
+    if entity == 'main.astralmanufacturer':
+        return _ids(MaterialPartRow.objects.filter(manufacturer_id__in=object_ids))
+    if entity == 'main.astralyear':
+        return _ids(MaterialPartRow.objects.filter(year_id__in=object_ids))
+    return set()
+
+
+class MaterialPartRows(ChangeLogProjection):
+    def affected(self, entity, object_ids):
+        return affected_parts(entity, object_ids)
+
+    def refresh(self, keys):
+        refresh_rows(keys)
+
+    def rebuild_rows(self):
+        last_id = 0
+        count = 0
+        while True:
+            ids = list(
+                MaterialPart.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:REBUILD_CHUNK_SIZE]
+            )
+            if not ids:
+                break
+            refresh_rows(ids)
+            MaterialPartRow.objects.filter(pk__gt=last_id, pk__lt=ids[-1]).exclude(pk__in=ids).delete()
+            last_id = ids[-1]
+            count += len(ids)
+        MaterialPartRow.objects.filter(pk__gt=last_id).delete()
+        return count
+
+
+material_part_rows = MaterialPartRows(NAME, ENTITIES)
+rebuild = material_part_rows.rebuild
+catch_up = material_part_rows.catch_up
@@ -1,4 +1,3 @@
-import qrcode
 import base64
 from io import BytesIO
 from django.conf import settings
@@ -8,6 +7,9 @@ def generate_qr_code(data, size=(200, 200)):
     """
     Генерирует QR-код и возвращает его в формате base64 для встраивания в HTML
     """
+    # qrcode и Pillow импортируются при первом QR-коде, а не при запуске воркера
+    import qrcode
+
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -101,6 +103,13 @@ def get_material_part_info_qr(part):
     """
     Генерирует QR-код с текстовой информацией о материальном узле для оффлайн чтения
     """
+    return generate_qr_code(get_material_part_info_text(part), size=(250, 250))
+
+
+def get_material_part_info_text(part):
+    """
+    Текст для QR-кода материального узла (обращается к БД, сам QR-код не строит)
+    """
     astral_part = part.astral_revision.astral_parts.first()
     if not astral_part:
         astral_part_name = "Без узла"
@@ -121,7 +130,7 @@ S/N: {part.serial}
 ГОД: {year}
 СИСТЕМА: НТДЦ"""
 
-    return generate_qr_code(info_text, size=(250, 250))
+    return info_text
 
 
 # ============== QR-коды для астральных ревизий ==============
@@ -138,6 +147,13 @@ def get_astral_revision_info_qr(revision):
     """
     Генерирует QR-код с текстовой информацией об астральной ревизии для оффлайн чтения
     """
+    return generate_qr_code(get_astral_revision_info_text(revision), size=(250, 250))
+
+
+def get_astral_revision_info_text(revision):
+    """
+    Текст для QR-кода астральной ревизии (обращается к БД, сам QR-код не строит)
+    """
     astral_part = revision.astral_parts.first()
     if not astral_part:
         astral_part_name = "Без узла"
@@ -156,4 +172,4 @@ def get_astral_revision_info_qr(revision):
 ДАТА ВЫПУСКА: {release_date}
 СИСТЕМА: НТДЦ"""
 
-    return generate_qr_code(info_text, size=(250, 250))
+    return info_text
@@ -0,0 +1,99 @@
+"""
+Справочники в памяти процесса: статусы, типы операций, склады, группы,
+пользователи и производители.
+
+Таблицы маленькие и меняются редко, а списки операций и узлов присоединяли их к
+каждой строке и перечитывали для выпадающих фильтров. ``registry`` загружает их
+целиком в словари id -> объект; списки читают только большую таблицу, а
+связанные объекты подставляются из реестра (``attach``) - шаблоны обращаются к
+``operation.material_status.name`` как раньше, без запросов.
+
+Актуальность: версия - номер последней записи журнала изменений по этим
+моделям (``outbox.models_version``), проверяется не чаще раза в
+``REFERENCE_CHECK_INTERVAL`` секунд. Пока версия не «устоялась», таблицы
+перечитываются при каждой проверке. Изменение в этом процессе сбрасывает реестр
+сразу (signals.py).
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from .models import (
+    AstralManufacturer, MaterialGroup, MaterialOperationType, MaterialStatus, MaterialUser,
+    MaterialWarehouse
+)
+from .outbox import models_version
+
+REFERENCE_MODELS = (
+    MaterialStatus, MaterialOperationType, MaterialWarehouse, MaterialGroup, MaterialUser,
+    AstralManufacturer,
+)
+
+
+class ReferenceRegistry:
+    def __init__(self, models):
+        self.models = models
+        self._tables = None
+        self._version = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Следующее обращение перечитает таблицы"""
+        self._checked_at = None
+        self._version = None
+
+    def _expired(self):
+        return (
+            self._tables is None or self._checked_at is None
+            or time.monotonic() - self._checked_at >= settings.REFERENCE_CHECK_INTERVAL
+        )
+
+    def tables(self):
+        if self._expired():
+            with self._lock:
+                if self._expired():
+                    self._refresh()
+        return self._tables
+
+    def _refresh(self):
+        checked_at = time.monotonic()
+        version = models_version(self.models)
+        if self._tables is None or version is None or version != self._version:
+            self._tables = {
+                model: {obj.pk: obj for obj in model._base_manager.order_by(*model._meta.ordering or ['pk'])}
+                for model in self.models
+            }
+        self._version = version
+        self._checked_at = checked_at
+
+    def table(self, model):
+        """id -> объект; порядок - сортировка модели по умолчанию (для выпадающих списков)"""
+        return self.tables()[model]
+
+    def get(self, model, pk):
+        return self.table(model).get(pk)
+
+    def attach(self, objects, *field_names):
+        """
+        Подставляет объекты справочников во внешние ключи ``field_names`` объектов.
+
+        Объект, которого ещё нет в реестре (создан в другом процессе после
+        последней проверки), не подставляется - Django загрузит его при обращении.
+        """
+        objects = list(objects)
+        if not objects:
+            return objects
+        fields = [objects[0]._meta.get_field(name) for name in field_names]
+        tables = self.tables()
+        for field in fields:
+            table = tables[field.related_model]
+            for obj in objects:
+                record = table.get(getattr(obj, field.attname))
+                if record is not None:
+                    field.set_cached_value(obj, record)
+        return objects
+
+
+registry = ReferenceRegistry(REFERENCE_MODELS)
@@ -0,0 +1,131 @@
+"""
+Уменьшенные копии (рендишены) загруженных изображений.
+
+Для ``AstralRevision.image`` и ``MaterialOperations.image`` после загрузки фоновая
+задача (``manage.py runworker``) создаёт WebP и JPEG копии нескольких размеров. Они сохраняются рядом
+с логическим именем оригинала (``photo.jpg`` -> ``photo.jpg.thumb.webp``) в обычном
+хранилище по умолчанию, а страницы загружают их по кэшируемым URL вместо встраивания
+оригинала в HTML через base64.
+"""
+import hashlib
+import logging
+import os
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .jobs import enqueue
+from .models import AstralRevision, MaterialOperations
+
+logger = logging.getLogger(__name__)
+
+# Максимальные размеры (ширина, высота) с сохранением пропорций
+RENDITION_SIZES = {
+    'thumb': (480, 480),
+    'preview': (1280, 1280),
+}
+
+RENDITION_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpg': ('JPEG', 'image/jpeg'),
+}
+
+# Модели с полем image, для которых строятся рендишены
+RENDITION_MODELS = {
+    'operation': MaterialOperations,
+    'revision': AstralRevision,
+}
+
+def get_kind(instance):
+    for kind, model in RENDITION_MODELS.items():
+        if isinstance(instance, model):
+            return kind
+    raise ValueError(f'Рендишены не поддерживаются для {type(instance).__name__}')
+
+
+def get_version(image_name):
+    """Короткий хэш имени оригинала: при замене изображения меняется и URL"""
+    return hashlib.md5(image_name.encode('utf-8')).hexdigest()[:12]
+
+
+def rendition_name(image_name, size, fmt):
+    # Имя оригинала целиком, с расширением: у photo.png и photo.jpg в одном каталоге
+    # рендишены не должны совпадать
+    directory, filename = posixpath.split(image_name)
+    return posixpath.join(directory, f'{filename}.{size}.{fmt}')
+
+
+def _render(image_file, size, fmt):
+    from PIL import Image, ImageOps
+
+    with Image.open(image_file) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.thumbnail(RENDITION_SIZES[size], Image.LANCZOS)
+        buffer = BytesIO()
+        img.save(buffer, format=RENDITION_FORMATS[fmt][0], quality=80, optimize=True)
+    return buffer.getvalue()
+
+
+def generate_renditions(storage, image_name):
+    """Создаёт все рендишены для файла изображения из хранилища ``storage``"""
+    for size in RENDITION_SIZES:
+        for fmt in RENDITION_FORMATS:
+            ensure_rendition(storage, image_name, size, fmt)
+
+
+def ensure_rendition(storage, image_name, size, fmt):
+    """
+    Возвращает имя рендишена в ``default_storage``, при необходимости создавая его синхронно.
+
+    Оригинал читается из хранилища поля (оно может быть дедуплицирующим), а
+    производные файлы пишутся в обычное хранилище под предсказуемым именем.
+    """
+    name = rendition_name(image_name, size, fmt)
+    if not default_storage.exists(name):
+        with storage.open(image_name, 'rb') as original:
+            data = _render(original, size, fmt)
+        # Параллельная генерация могла успеть раньше - сохраняем под тем же именем
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(data))
+    return name
+
+
+def delete_renditions(image_name):
+    """Удаляет рендишены одного имени оригинала (файлы без дедупликации)"""
+    for size in RENDITION_SIZES:
+        for fmt in RENDITION_FORMATS:
+            default_storage.delete(rendition_name(image_name, size, fmt))
+
+
+def delete_content_renditions(digest):
+    """
+    Удаляет рендишены всех имён с содержимым ``digest``.
+
+    Вызывается хранилищем, когда удалён сам blob: пока на содержимое есть ссылки,
+    рендишены в каталоге ``<upload_to>/<digest>/`` могут понадобиться другим записям.
+    """
+    suffixes = tuple(f'.{size}.{fmt}' for size in RENDITION_SIZES for fmt in RENDITION_FORMATS)
+    for model in RENDITION_MODELS.values():
+        directory = posixpath.join(model._meta.get_field('image').upload_to, digest)
+        try:
+            _, filenames = default_storage.listdir(directory)
+        except FileNotFoundError:
+            continue
+        for filename in filenames:
+            if filename.endswith(suffixes):
+                default_storage.delete(posixpath.join(directory, filename))
+        try:
+            os.rmdir(default_storage.path(directory))
+        except (NotImplementedError, OSError):
+            # Каталог не пуст или хранилище не локальное
+            pass
+
+
+def schedule_renditions(instance):
+    """Ставит генерацию рендишенов изображения объекта в очередь фоновых задач"""
+    if instance.image:
+        enqueue('renditions.generate', kind=get_kind(instance), object_id=instance.pk)
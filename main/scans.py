@@ -0,0 +1,89 @@
+"""
+Сеанс сканирования: одна операция для пачки отсканированных узлов.
+
+Скан - серийный номер или содержимое QR-кода со ссылкой на узел
+(``get_material_part_url_qr``: ``https://.../material-parts/<id>/``). Все сканы
+разрешаются в узлы одним запросом, операции создаются одним ``bulk_create`` в
+транзакции.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import ChangeLog, MaterialOperations, MaterialPart
+from .outbox import log_changes
+
+_PART_URL_RE = re.compile(r'/material-parts/(\d+)/?(?:[?#].*)?$')
+# Строка из QR-кода с информацией об узле (get_material_part_info_qr)
+_SERIAL_LINE_RE = re.compile(r'^S/N:\s*(.+)$')
+
+
+def parse_scan(payload):
+    """Скан -> ('id', <id узла>) для ссылки из QR-кода или ('serial', <номер>)"""
+    payload = payload.strip()
+    if '://' in payload or payload.startswith('/'):
+        match = _PART_URL_RE.search(payload)
+        if match:
+            return 'id', int(match.group(1))
+    match = _SERIAL_LINE_RE.match(payload)
+    if match:
+        return 'serial', match.group(1).strip()
+    return 'serial', payload
+
+
+def resolve_scans(payloads):
+    """
+    Узлы для списка сканов (в порядке сканирования, без повторов) одним запросом.
+
+    Возвращает ``(parts, unknown)``, где ``unknown`` - сканы, для которых узел не найден.
+    """
+    parsed = []
+    seen = set()
+    for payload in payloads:
+        if not payload or not payload.strip():
+            continue
+        key = parse_scan(payload)
+        if key not in seen:
+            seen.add(key)
+            parsed.append((payload.strip(), key))
+
+    serials = [value for (_, (kind, value)) in parsed if kind == 'serial']
+    ids = [value for (_, (kind, value)) in parsed if kind == 'id']
+    found = {}
+    if parsed:
+        for part in MaterialPart.objects.filter(Q(serial__in=serials) | Q(id__in=ids)).only('id', 'serial'):
+            found[('id', part.id)] = part
+            found[('serial', part.serial)] = part
+
+    parts, unknown, part_ids = [], [], set()
+    for payload, key in parsed:
+        part = found.get(key)
+        if part is None:
+            unknown.append(payload)
+        elif part.id not in part_ids:
+            # Один узел мог быть отсканирован и по номеру, и по QR-коду
+            part_ids.add(part.id)
+            parts.append(part)
+    return parts, unknown
+
+
+def record_operations(parts, *, material_operation_type, material_status, material_warehouse,
+                      material_user, datetime, description=''):
+    """Создаёт по операции на каждый узел в одной транзакции"""
+    operations = [
+        MaterialOperations(
+            material_part=part,
+            material_operation_type=material_operation_type,
+            material_status=material_status,
+            material_warehouse=material_warehouse,
+            material_user=material_user,
+            datetime=datetime,
+            description=description,
+        )
+        for part in parts
+    ]
+    with transaction.atomic():
+        created = MaterialOperations.objects.bulk_create(operations, batch_size=500)
+        log_changes(created, ChangeLog.ACTION_SAVE)
+    return created
@@ -0,0 +1,234 @@
+"""
+Общий поиск по серийным номерам, децимальным номерам, названиям узлов и
+ревизий и описаниям операций.
+
+Пользователь не знает, что именно он ищет - серийный номер, децимальный номер
+или название, - поэтому все искомые поля лежат в одной таблице
+``search_index`` (``SearchEntry``): сущность, id объекта, нормализованный текст,
+заголовок для выдачи и вес поля. Таблица обновляется по журналу изменений, как
+и проекция списка узлов (``projections.ChangeLogProjection``), - это покрывает и
+сохранения через формы, и пакетные пути (API, сканирование, быстрое удаление).
+
+Поиск - один запрос из ``UNION ALL`` коротких выборок по каждой сущности, не
+больше ``SEARCH_GROUP_SIZE`` строк в каждой:
+
+- совпадение с начала поля (``text LIKE 'запрос%'``) по индексу
+  (entity, text varchar_pattern_ops), без сортировки всех совпадений;
+- в PostgreSQL с ``SEARCH_TRIGRAM_MIN_LENGTH`` символов - нечёткое совпадение
+  по триграммам со словами поля (``запрос <% text``, ``word_similarity``: длинное
+  описание не снижает похожесть; индекс GIN gin_trgm_ops, миграция 0012),
+  в других СУБД - вхождение подстроки.
+
+Совпадения с начала идут первыми, дальше - по весу поля и похожести.
+
+Запрос поиска применяет не больше ``SEARCH_INDEX_MAX_LAG`` записей журнала; при
+большем отставании (или до первой перестройки) индекс перестраивается фоновой
+задачей под блокировкой, а поиск до её завершения отвечает по имеющимся записям.
+При развёртывании индекс строит ``manage.py rebuild_search_index --if-needed``.
+"""
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.timezone import localtime
+
+from .models import AstralPart, AstralRevision, MaterialOperations, MaterialPart, SearchEntry
+from .projections import ChangeLogProjection
+from .streaming import RowUrl
+
+NAME = 'search_index'
+
+TEXT_LENGTH = 255
+
+_SPACES_RE = re.compile(r'\s+')
+
+
+def normalize(text):
+    """Текст для индекса и запроса: нижний регистр, «ё» -> «е», одиночные пробелы"""
+    return _SPACES_RE.sub(' ', (text or '').lower().replace('ё', 'е')).strip()[:TEXT_LENGTH]
+
+
+class Source:
+    """Сущность поиска: модель, искомые поля с весами, заголовок и страница объекта"""
+    def __init__(self, entity, model, fields, title, view_name, select_related=()):
+        self.entity = entity
+        self.model = model
+        self.fields = fields
+        self.title = title
+        self.view_name = view_name
+        self.select_related = select_related
+
+    @property
+    def label(self):
+        return self.model._meta.label_lower
+
+    @property
+    def group_title(self):
+        return str(self.model._meta.verbose_name_plural)
+
+    def entries(self, ids):
+        queryset = self.model._base_manager.filter(pk__in=ids).select_related(*self.select_related)
+        for obj in queryset:
+            title = self.title(obj)[:TEXT_LENGTH]
+            texts = set()
+            for field, weight in self.fields:
+                text = normalize(getattr(obj, field))
+                if text and text not in texts:
+                    texts.add(text)
+                    yield SearchEntry(entity=self.entity, object_id=obj.pk, text=text, title=title, weight=weight)
+
+
+def _operation_title(operation):
+    return f'{localtime(operation.datetime):%d.%m.%Y %H:%M} - {operation.description[:80]}'
+
+
+SOURCES = (
+    Source('material_part', MaterialPart, (('serial', 3),), lambda part: part.serial, 'main:material_part_detail'),
+    Source(
+        'astral_part', AstralPart, (('decimal_num', 3), ('name', 2)),
+        lambda part: f'{part.name} ({part.decimal_num})', 'main:astral_part_detail',
+    ),
+    Source('astral_revision', AstralRevision, (('name', 2),), lambda revision: revision.name, 'main:astral_revision_detail'),
+    Source('operation', MaterialOperations, (('description', 1),), _operation_title, 'main:operation_detail'),
+)
+
+SOURCES_BY_LABEL = {source.label: source for source in SOURCES}
+
+
+class SearchIndex(ChangeLogProjection):
+    """Ключи строк - пары (сущность журнала, id объекта)"""
+    max_lag_setting = 'SEARCH_INDEX_MAX_LAG'
+
+    def affected(self, entity, object_ids):
+        return {(entity, object_id) for object_id in object_ids}
+
+    def refresh(self, keys):
+        ids_by_label = {}
+        for label, object_id in keys:
+            ids_by_label.setdefault(label, set()).add(object_id)
+        for label, ids in ids_by_label.items():
+            source = SOURCES_BY_LABEL[label]
+            ids = sorted(ids)
+            for start in range(0, len(ids), settings.SEARCH_INDEX_CHUNK_SIZE):
+                chunk = ids[start:start + settings.SEARCH_INDEX_CHUNK_SIZE]
+                entries = list(source.entries(chunk))
+                with transaction.atomic():
+                    SearchEntry.objects.filter(entity=source.entity, object_id__in=chunk).delete()
+                    # Параллельная догонка могла вставить те же строки
+                    SearchEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+    def rebuild_rows(self):
+        # Без очистки таблицы: записи объектов заменяются пачками, каждая в своей
+        # транзакции, - поиск работает всё время перестройки
+        for source in SOURCES:
+            last_id = 0
+            while True:
+                ids = list(
+                    source.model._base_manager.filter(pk__gt=last_id).order_by('pk')
+                    .values_list('pk', flat=True)[:settings.SEARCH_INDEX_CHUNK_SIZE]
+                )
+                if not ids:
+                    break
+                self.refresh({(source.label, pk) for pk in ids})
+                # Записи удалённых объектов между id пачки
+                SearchEntry.objects.filter(
+                    entity=source.entity, object_id__gt=last_id, object_id__lt=ids[-1],
+                ).exclude(object_id__in=ids).delete()
+                last_id = ids[-1]
+            SearchEntry.objects.filter(entity=source.entity, object_id__gt=last_id).delete()
+        SearchEntry.objects.exclude(entity__in=[source.entity for source in SOURCES]).delete()
+        return SearchEntry.objects.count()
+
+
+search_index = SearchIndex(NAME, tuple(SOURCES_BY_LABEL))
+rebuild = search_index.rebuild
+
+_checked_at = None
+_checked_lock = threading.Lock()
+
+
+def catch_up():
+    """Догонка индекса не чаще раза в ``SEARCH_INDEX_CHECK_INTERVAL`` секунд: запросы идут на каждое нажатие клавиши"""
+    global _checked_at
+    now = time.monotonic()
+    with _checked_lock:
+        if _checked_at is not None and now - _checked_at < settings.SEARCH_INDEX_CHECK_INTERVAL:
+            return 0
+        _checked_at = now
+    return search_index.catch_up()
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _search_sql(query, limit):
+    table = SearchEntry._meta.db_table
+    columns = 'entity, object_id, title, weight'
+    prefix = _escape_like(query) + '%'
+    trigram = connection.vendor == 'postgresql'
+    parts = []
+    params = []
+    for source in SOURCES:
+        # Без ORDER BY: первые строки диапазона индекса, без сортировки всех совпадений
+        parts.append(
+            f"SELECT * FROM (SELECT {columns}, 2.0 AS score FROM {table} "
+            f"WHERE entity = %s AND text LIKE %s ESCAPE '\\' LIMIT %s) AS prefix_{source.entity}"
+        )
+        params += [source.entity, prefix, limit]
+        if trigram and len(query) >= settings.SEARCH_TRIGRAM_MIN_LENGTH:
+            parts.append(
+                f"SELECT * FROM (SELECT {columns}, word_similarity(%s, text) AS score FROM {table} "
+                f"WHERE entity = %s AND %s <%% text ORDER BY score DESC LIMIT %s) AS similar_{source.entity}"
+            )
+            params += [query, source.entity, query, limit]
+        elif not trigram:
+            parts.append(
+                f"SELECT * FROM (SELECT {columns}, 1.0 AS score FROM {table} "
+                f"WHERE entity = %s AND text LIKE %s ESCAPE '\\' LIMIT %s) AS contains_{source.entity}"
+            )
+            params += [source.entity, '%' + _escape_like(query) + '%', limit]
+    return ' UNION ALL '.join(parts), params
+
+
+def search(query, limit=None):
+    """
+    Результаты, сгруппированные по сущностям: список
+    ``{'entity', 'title', 'results': [{'id', 'title', 'url'}]}`` в порядке ``SOURCES``;
+    сущности без результатов пропускаются.
+    """
+    limit = limit or settings.SEARCH_GROUP_SIZE
+    query = normalize(query)
+    if len(query) < settings.SEARCH_MIN_LENGTH:
+        return []
+    catch_up()
+    sql, params = _search_sql(query, limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    best = {}
+    for entity, object_id, title, weight, score in rows:
+        rank = (float(score), weight)
+        key = (entity, object_id)
+        # Объект может найтись по нескольким полям и обоими способами
+        if key not in best or rank > best[key][0]:
+            best[key] = (rank, title)
+
+    groups = []
+    for source in SOURCES:
+        found = sorted(
+            ((rank, object_id, title) for (entity, object_id), (rank, title) in best.items() if entity == source.entity),
+            key=lambda item: (-item[0][0], -item[0][1], item[2]),
+        )[:limit]
+        if not found:
+            continue
+        url = RowUrl(source.view_name)
+        groups.append({
+            'entity': source.entity,
+            'title': source.group_title,
+            'results': [{'id': object_id, 'title': title, 'url': url(object_id)} for _, object_id, title in found],
+        })
+    return groups
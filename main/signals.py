@@ -1,4 +1,95 @@
-# Сигналы отключены во время миграции на новую схему БД
-# Все старые модели (Device, PartInstance, Journal) больше не существуют
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.core.files.storage import default_storage
+from django.dispatch import receiver
 
-# Здесь будут добавлены новые сигналы для новой схемы БД при необходимости
+from .models import AstralRevision, ChangeLog, MaterialOperations
+from .renditions import rendition_name, schedule_renditions
+from .storage import release_file
+from .outbox import CDC_MODELS, log_change
+from .registry import REFERENCE_MODELS, registry
+
+FILE_FIELDS = ('file', 'image')
+
+
+@receiver(post_save, sender=AstralRevision)
+@receiver(post_save, sender=MaterialOperations)
+def create_image_renditions(sender, instance, **kwargs):
+    """Уменьшенные копии нового изображения создаются в фоне"""
+    image = instance.image
+    # Имя файла уникально для каждой загрузки: если thumb уже есть, изображение не менялось
+    if image and not default_storage.exists(rendition_name(image.name, 'thumb', 'webp')):
+        schedule_renditions(instance)
+
+
+# ============== Ссылки на файлы в дедуплицирующем хранилище ==============
+
+@receiver(pre_save, sender=AstralRevision)
+@receiver(pre_save, sender=MaterialOperations)
+def remember_replaced_files(sender, instance, **kwargs):
+    """
+    Запоминает прежние файлы, чтобы снять ссылки после сохранения.
+
+    Ссылка снимается и при том же имени: загрузка того же содержимого даёт то же
+    имя, но ``_save`` берёт новую ссылку (файл поля ещё не сохранён - ``_committed``).
+    """
+    if not instance.pk:
+        return
+    old = sender.objects.filter(pk=instance.pk).values(*FILE_FIELDS).first()
+    if old:
+        instance._replaced_files = {}
+        for field in FILE_FIELDS:
+            field_file = getattr(instance, field)
+            if old[field] and (old[field] != field_file.name or not field_file._committed):
+                instance._replaced_files[field] = old[field]
+
+
+@receiver(post_save, sender=AstralRevision)
+@receiver(post_save, sender=MaterialOperations)
+def release_replaced_files(sender, instance, **kwargs):
+    for field, name in getattr(instance, '_replaced_files', {}).items():
+        release_file(name, sender._meta.get_field(field).storage)
+    instance._replaced_files = {}
+
+
+@receiver(post_delete, sender=AstralRevision)
+@receiver(post_delete, sender=MaterialOperations)
+def release_deleted_files(sender, instance, **kwargs):
+    for field in FILE_FIELDS:
+        field_file = getattr(instance, field)
+        release_file(field_file.name, field_file.storage)
+
+
+# ============== Журнал изменений (outbox) ==============
+
+def log_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        log_change(instance, ChangeLog.ACTION_SAVE)
+
+
+def log_deleted(sender, instance, **kwargs):
+    log_change(instance, ChangeLog.ACTION_DELETE)
+
+
+for _model in CDC_MODELS:
+    post_save.connect(log_saved, sender=_model, dispatch_uid=f'changelog_save_{_model._meta.label_lower}')
+    post_delete.connect(log_deleted, sender=_model, dispatch_uid=f'changelog_delete_{_model._meta.label_lower}')
+
+
+@receiver(m2m_changed, sender=AstralRevision.astral_parts.through)
+def log_revision_parts_changed(sender, instance, action, **kwargs):
+    """Состав ревизии: изменение связей журналируется как изменение объекта, с которого оно сделано"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        log_change(instance, ChangeLog.ACTION_SAVE)
+
+
+# ============== Справочники в памяти процесса (registry.py) ==============
+
+def reset_registry(sender, **kwargs):
+    # Сброс сразу, до фиксации: если реестр успеет прочитать незафиксированные
+    # данные, версия журнала ещё не устоялась, и он перечитает таблицы позже
+    registry.invalidate()
+
+
+for _model in REFERENCE_MODELS:
+    post_save.connect(reset_registry, sender=_model, dispatch_uid=f'registry_save_{_model._meta.label_lower}')
+    post_delete.connect(reset_registry, sender=_model, dispatch_uid=f'registry_delete_{_model._meta.label_lower}')
@@ -0,0 +1,180 @@
+"""
+Статические файлы: имена с хэшем содержимого, сжатие при сборке и отдача самим
+приложением.
+
+``CompressedManifestStorage`` (``collectstatic``) копирует файлы под именами вида
+``css/custom.3f2a9c1b7e4d.css`` (манифест ``staticfiles.json``, тег ``{% static %}``
+подставляет хэшированное имя) и рядом с каждым текстовым файлом кладёт
+``.gz`` и ``.br`` (brotli - если установлен пакет ``Brotli``). Сжатая копия
+сохраняется, только если она заметно меньше исходной.
+
+``StaticFilesMiddleware`` отдаёт файлы из ``STATIC_ROOT`` без обращения к
+представлениям: сжатый вариант по ``Accept-Encoding``, ETag и 304. Файлы с
+хэшем в имени отдаются с ``Cache-Control: immutable`` на год - при повторной
+загрузке страницы браузер их не запрашивает; после выкладки меняется имя, а не
+содержимое по старому адресу. Список файлов строится один раз при запуске
+процесса, поэтому ``collectstatic`` выполняется до старта воркеров.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # сжатие brotli необязательно
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico')
+
+# Сжатая копия сохраняется, если она меньше исходного файла хотя бы на 5%
+MIN_RATIO = 0.95
+
+# Кодировки в порядке предпочтения: (название, расширение файла)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=60'
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    """Хэшированные имена из манифеста плюс gzip / brotli копии"""
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            # collectstatic ещё не выполнялся (разработка, тесты) - отдаётся исходное имя
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name:
+                names.update((name, hashed_name))
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                compress_file(self.path(name))
+
+
+def compress_file(path):
+    """Сжатые копии файла (``.gz``, ``.br``); возвращает расширения созданных копий"""
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    variants = {'.gz': lambda: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = lambda: brotli.compress(data, quality=11)
+    created = []
+    for suffix, compress in variants.items():
+        compressed = compress()
+        if len(compressed) < len(data) * MIN_RATIO:
+            with open(path + suffix, 'wb') as fh:
+                fh.write(compressed)
+            created.append(suffix)
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return created
+
+
+# ============== ОТДАЧА ==============
+
+class StaticFile:
+    def __init__(self, path, immutable):
+        self.path = path
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type == 'application/javascript':
+            self.content_type += '; charset=utf-8'
+        self.cache_control = IMMUTABLE if immutable else REVALIDATE
+        # Варианты: кодировка -> (путь, размер); None - без сжатия
+        self.variants = {}
+        for encoding, suffix in (*ENCODINGS, (None, '')):
+            if os.path.isfile(path + suffix):
+                self.variants[encoding] = (path + suffix, os.path.getsize(path + suffix))
+        stat = os.stat(path)
+        self.mtime_ns = stat.st_mtime_ns
+        self.last_modified = http_date(stat.st_mtime)
+
+    def variant(self, accept_encoding):
+        """(кодировка, путь, размер) с учётом Accept-Encoding"""
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding, _ in ENCODINGS:
+            if encoding in accepted and encoding in self.variants:
+                return (encoding, *self.variants[encoding])
+        return (None, *self.variants[None])
+
+    def etag(self, encoding, size):
+        # У каждого варианта сжатия свой ETag
+        return f'"{size:x}-{self.mtime_ns:x}{"-" + encoding if encoding else ""}"'
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for item in header.split(','):
+        token, _, params = item.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+def build_index(root, hashed_names):
+    """URL-путь относительно STATIC_URL -> StaticFile для всех файлов STATIC_ROOT"""
+    index = {}
+    compressed = tuple(suffix for _, suffix in ENCODINGS)
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(compressed):
+                continue
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            index[name] = StaticFile(path, immutable=name in hashed_names)
+    return index
+
+
+class StaticFilesMiddleware:
+    """Отдача собранной статики (``STATIC_ROOT``) до остальной обработки запроса"""
+
+    def __init__(self, get_response):
+        if not settings.STATIC_SERVE or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        self.files = build_index(str(settings.STATIC_ROOT), hashed_names)
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            name = posixpath.normpath(request.path_info[len(self.prefix):]).lstrip('/')
+            static_file = self.files.get(name)
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return self.get_response(request)
+
+    def serve(self, request, static_file):
+        encoding, path, size = static_file.variant(request.headers.get('Accept-Encoding', ''))
+        etag = static_file.etag(encoding, size)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=static_file.last_modified)
+        if not_modified is None:
+            response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+            # Имя файла в Content-Disposition для статики не нужно
+            del response['Content-Disposition']
+            response['Content-Length'] = size
+            if encoding:
+                response['Content-Encoding'] = encoding
+        else:
+            response = not_modified
+        response['ETag'] = etag
+        response['Last-Modified'] = static_file.last_modified
+        response['Cache-Control'] = static_file.cache_control
+        if len(static_file.variants) > 1:
+            response['Vary'] = 'Accept-Encoding'
+        return response
@@ -0,0 +1,247 @@
+"""
+Дедуплицирующее хранилище загруженных файлов.
+
+Содержимое хэшируется (SHA-256) во время потоковой записи на диск и хранится один
+раз в ``MEDIA_ROOT/blobs/<xx>/<digest>``. В поле модели сохраняется имя вида
+``<upload_to>/<digest>/<исходное имя файла>``, поэтому имя файла для скачивания не
+теряется. Количество ссылок на каждый blob ведётся в таблице ``StoredBlob``; файл
+удаляется с диска, когда на него не остаётся ссылок.
+
+Файл blob'а создаётся и удаляется только под блокировкой его строки
+``StoredBlob``: сохранение сначала берёт ссылку (``UPDATE ... ref_count + 1`` или
+вставка строки), потом кладёт или переиспользует файл; сборка мусора удаляет файл,
+только если под той же блокировкой ссылок по-прежнему ноль. Файлы, оставшиеся без
+строки после отката транзакции сохранения, удаляет ``sweep_blobs``
+(``manage.py sweep_blobs``).
+
+Имена без каталога-хэша (файлы, загруженные до включения хранилища) обрабатываются
+как в обычном ``FileSystemStorage``.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+BLOBS_DIR = 'blobs'
+
+DIGEST_LENGTH = 64
+
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def content_digest(name):
+    """Хэш содержимого из имени файла или None, если имя не контентно-адресуемое"""
+    if not name:
+        return None
+    digest = posixpath.basename(posixpath.dirname(name))
+    return digest if _DIGEST_RE.match(digest) else None
+
+
+def release_file(name, storage):
+    """Снимает ссылку удалённой записи на файл (обычные хранилища файл не трогают)"""
+    if name and isinstance(storage, ContentAddressedStorage):
+        storage.delete(str(name))
+
+
+def _delete_renditions(name):
+    # Импорт при вызове: renditions зависит от моделей, а модели - от этого модуля
+    from .renditions import delete_renditions
+    delete_renditions(name)
+
+
+def _delete_content_renditions(digest):
+    from .renditions import delete_content_renditions
+    delete_content_renditions(digest)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, хранящий каждое уникальное содержимое один раз"""
+
+    def blob_name(self, digest):
+        return posixpath.join(BLOBS_DIR, digest[:2], digest)
+
+    def _physical_name(self, name):
+        digest = content_digest(name)
+        return self.blob_name(digest) if digest else name
+
+    def get_available_name(self, name, max_length=None):
+        """
+        Итоговое имя определяется хэшем содержимого в ``_save``; здесь имя файла
+        укорачивается (с сохранением расширения), чтобы вместе с каталогом-хэшем
+        поместиться в ``max_length``.
+        """
+        name = str(name).replace('\\', '/')
+        if max_length is None:
+            return name
+        # _save добавляет каталог «<digest>/»
+        overflow = len(name) + DIGEST_LENGTH + 1 - max_length
+        if overflow <= 0:
+            return name
+        directory, filename = posixpath.split(name)
+        root, ext = posixpath.splitext(filename)
+        root = root[:-overflow]
+        if not root:
+            raise SuspiciousFileOperation(
+                f'Storage can not find an available filename for "{name}". '
+                f'Please make sure that the corresponding file field allows sufficient "max_length".'
+            )
+        return posixpath.join(directory, root + ext)
+
+    def _save(self, name, content):
+        tmp_dir = self.path(posixpath.join(BLOBS_DIR, 'tmp'))
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        # Хэшируем по частям во время записи - файл целиком в память не читается
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    fh.write(chunk)
+
+            digest = sha256.hexdigest()
+            blob_path = self.path(self.blob_name(digest))
+            with transaction.atomic():
+                # Сначала ссылка (строка заблокирована до конца транзакции), потом файл:
+                # сборка мусора не удалит его между проверкой и ссылкой
+                self._add_reference(digest, size)
+                if os.path.exists(blob_path):
+                    os.remove(tmp_path)
+                else:
+                    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(tmp_path, self.file_permissions_mode)
+                    os.replace(tmp_path, blob_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        return posixpath.join(directory, digest, filename)
+
+    def _add_reference(self, digest, size):
+        """Ещё одна ссылка на blob; строка остаётся заблокированной до конца транзакции"""
+        StoredBlob = apps.get_model('main', 'StoredBlob')
+        while True:
+            if StoredBlob.objects.filter(digest=digest).update(ref_count=F('ref_count') + 1):
+                return
+            try:
+                with transaction.atomic():
+                    StoredBlob.objects.create(digest=digest, size=size, ref_count=1)
+                return
+            except IntegrityError:
+                # Строку вставила параллельная транзакция - увеличиваем её счётчик
+                continue
+
+    def delete(self, name):
+        """Снимает одну ссылку; сам файл удаляется после фиксации, если ссылок не осталось"""
+        digest = content_digest(name)
+        if not digest:
+            _delete_renditions(name)
+            return super().delete(name)
+
+        StoredBlob = apps.get_model('main', 'StoredBlob')
+        StoredBlob.objects.filter(digest=digest, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        transaction.on_commit(lambda: self._collect(digest))
+
+    def _collect(self, digest):
+        """Удаляет blob без ссылок; ноль ссылок перепроверяется под блокировкой строки"""
+        StoredBlob = apps.get_model('main', 'StoredBlob')
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(digest=digest, ref_count=0).first()
+            if blob is None:
+                return False
+            blob.delete()
+            super().delete(self.blob_name(digest))
+            # Под той же блокировкой: новое сохранение этого содержимого ждёт фиксации
+            _delete_content_renditions(digest)
+        return True
+
+    def _collect_orphan(self, digest):
+        """Удаляет файл blob'а без строки в таблице (откат транзакции сохранения)"""
+        StoredBlob = apps.get_model('main', 'StoredBlob')
+        try:
+            with transaction.atomic():
+                # Своя строка с нулём ссылок - та же блокировка, что у _save: сохранение
+                # с этим содержимым дождётся конца транзакции и положит файл заново
+                StoredBlob.objects.create(digest=digest, size=0, ref_count=0)
+                super().delete(self.blob_name(digest))
+                _delete_content_renditions(digest)
+                StoredBlob.objects.filter(digest=digest).delete()
+        except IntegrityError:
+            return False
+        return True
+
+    def sweep(self, min_age):
+        """
+        Удаляет файлы blob'ов без строк и без ссылок, а также брошенные временные
+        файлы - если они старше ``min_age`` секунд (моложе могут принадлежать
+        незавершённому сохранению). Возвращает число удалённых blob'ов.
+        """
+        StoredBlob = apps.get_model('main', 'StoredBlob')
+        root = self.path(BLOBS_DIR)
+        if not os.path.isdir(root):
+            return 0
+        deadline = time.time() - min_age
+        removed = 0
+
+        tmp_dir = os.path.join(root, 'tmp')
+        if os.path.isdir(tmp_dir):
+            for entry in os.scandir(tmp_dir):
+                if entry.is_file() and entry.stat().st_mtime < deadline:
+                    os.remove(entry.path)
+
+        digests = []
+        for prefix in os.scandir(root):
+            if prefix.name == 'tmp' or not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if _DIGEST_RE.match(entry.name) and entry.stat().st_mtime < deadline:
+                    digests.append(entry.name)
+        for start in range(0, len(digests), 1000):
+            chunk = digests[start:start + 1000]
+            known = dict(StoredBlob.objects.filter(digest__in=chunk).values_list('digest', 'ref_count'))
+            for digest in chunk:
+                if digest not in known:
+                    removed += self._collect_orphan(digest)
+                elif known[digest] == 0:
+                    # Сборка после удаления последней ссылки не успела выполниться
+                    removed += self._collect(digest)
+        return removed
+
+    # exists(), size(), open() и get_*_time() в FileSystemStorage работают через path()
+    def path(self, name):
+        return super().path(self._physical_name(name))
+
+    def url(self, name):
+        return super().url(self._physical_name(name))
+
+
+upload_storage = ContentAddressedStorage()
+
+
+def get_upload_storage():
+    """Хранилище для загружаемых файлов (callable, чтобы не попадать в миграции как объект)"""
+    return upload_storage
+
+
+def sweep_blobs(min_age=None):
+    """Сборка осиротевших файлов хранилища загрузок (см. ``ContentAddressedStorage.sweep``)"""
+    return upload_storage.sweep(settings.BLOB_SWEEP_MIN_AGE if min_age is None else min_age)
@@ -0,0 +1,266 @@
+"""
+Потоковая отдача больших таблиц без объектов моделей.
+
+Шаблон списка рендерится один раз без строк: вместо тела таблицы он выводит
+метку (``{{ table_rows }}``), по ней страница делится на «шапку» и «подвал».
+Ответ (``StreamingHttpResponse``) сразу отдаёт шапку, затем строки таблицы
+пачками по ``STREAM_CHUNK_ROWS`` и в конце подвал с итоговым количеством.
+Части страницы, которые дорого считать (``Deferred``, например количества
+фасетов), вычисляются после строк и подставляются в подвал.
+
+Строки читаются ``values_list(...).iterator()`` - кортежи, без экземпляров
+моделей, серверным курсором; пачка строк рендерится одним вызовом
+скомпилированного шаблона строк (``main/includes/part_rows.html``,
+``main/includes/journal_rows.html``) - тем же, что выводит постраничный список.
+Адреса собираются из префиксов, вычисленных одним ``reverse`` на страницу
+(``RowUrl``), названия справочников берутся из реестра (registry.py). Время до
+первого байта и память не зависят от количества строк.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.template.loader import get_template, render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from .models import MaterialOperationType, MaterialPart, MaterialStatus, MaterialUser, MaterialWarehouse
+from .prefetch import top_by_parent
+from .projections import build_row
+from .registry import registry
+
+ROWS_MARKER = mark_safe('<!--table-rows-->')
+COUNT_MARKER = mark_safe('<!--table-rows-count-->')
+
+# id, которого заведомо нет в адресах страниц: на его место подставляется id строки
+_URL_PLACEHOLDER = 2147483647
+
+
+class TableRows:
+    """
+    Строки таблицы для потоковой отдачи.
+
+    ``queryset`` - ``values_list(..., named=True)`` с сортировкой; ``render_chunk``
+    получает пачку кортежей и возвращает их HTML. В шаблоне ``{{ rows }}``
+    выводит метку места строк, ``{{ rows.count_placeholder }}`` - метку количества,
+    ``{% if rows %}`` проверяет наличие строк (один запрос EXISTS).
+    """
+    count_placeholder = COUNT_MARKER
+
+    def __init__(self, queryset, render_chunk, chunk_size=None):
+        self.queryset = queryset
+        self.render_chunk = render_chunk
+        self.chunk_size = chunk_size or settings.STREAM_CHUNK_ROWS
+        self.count = 0
+        self._exists = None
+
+    def __bool__(self):
+        if self._exists is None:
+            self._exists = self.queryset.exists()
+        return self._exists
+
+    def __str__(self):
+        return ROWS_MARKER
+
+    def __iter__(self):
+        chunk = []
+        for row in self.queryset.iterator(chunk_size=self.chunk_size):
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield self._render(chunk)
+                chunk = []
+        if chunk:
+            yield self._render(chunk)
+
+    def _render(self, chunk):
+        self.count += len(chunk)
+        return self.render_chunk(chunk)
+
+
+class Deferred:
+    """
+    Часть страницы, которая вычисляется после строк таблицы.
+
+    В шаблоне ``{{ value }}`` выводит метку; ``stream_page`` заменяет её
+    результатом ``render()`` (строка HTML) в подвале - или сразу, если строк нет.
+    """
+    def __init__(self, name, render):
+        self.marker = mark_safe(f'<!--deferred-{name}-->')
+        self.render = render
+
+    def __str__(self):
+        return self.marker
+
+
+def _table_rows(context):
+    for value in context.values():
+        if isinstance(value, TableRows):
+            return value
+    return None
+
+
+def _fill_deferred(html, deferred):
+    for value in deferred:
+        if value.marker in html:
+            html = html.replace(value.marker, value.render())
+    return html
+
+
+def stream_page(request, template_name, context):
+    """Страница со строками ``TableRows`` в контексте: шапка сразу, строки и подвал потоком"""
+    rows = _table_rows(context)
+    deferred = [value for value in context.values() if isinstance(value, Deferred)]
+    # Шапка рендерится до ответа: сообщения, CSRF-cookie и ошибки шаблона - как у render()
+    head, marker, tail = render_to_string(template_name, context, request).partition(ROWS_MARKER)
+
+    def content():
+        # Без метки (пустой список) строки не читаются, а вся страница - «шапка»
+        yield head if marker else _fill_deferred(head, deferred)
+        if marker:
+            yield from rows
+            yield _fill_deferred(tail.replace(COUNT_MARKER, str(rows.count)), deferred)
+    return StreamingHttpResponse(content())
+
+
+async def aiterate(iterator):
+    """Синхронный поток для ASGI: каждая пачка читается в потоке, где выполняются запросы к БД"""
+    iterator = iter(iterator)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+async def astream_page(request, template_name, context):
+    response = await sync_to_async(stream_page)(request, template_name, context)
+    response.streaming_content = aiterate(response.streaming_content)
+    return response
+
+
+# ============== СТРОКИ ТАБЛИЦ ==============
+
+class RowUrl:
+    """
+    Адрес строки по id: ``reverse`` выполняется один раз на страницу, а не на строку.
+
+    В Python - ``url(id)``, в шаблоне строки - ``{{ url.prefix }}{{ id }}{{ url.suffix }}``.
+    """
+    do_not_call_in_templates = True
+
+    def __init__(self, view_name):
+        self.prefix, self.suffix = reverse(view_name, args=[_URL_PLACEHOLDER]).split(str(_URL_PLACEHOLDER))
+
+    def __call__(self, object_id):
+        return f'{self.prefix}{object_id}{self.suffix}'
+
+
+def reference_text(model, attribute=None):
+    """
+    Функция id -> текст записи справочника из реестра.
+
+    Запись, появившаяся после последней проверки реестра, читается из БД один раз.
+    """
+    table = registry.table(model)
+    missing = {}
+
+    def text(object_id):
+        if object_id is None:
+            return ''
+        record = table.get(object_id)
+        if record is None:
+            if object_id not in missing:
+                missing[object_id] = model._base_manager.filter(pk=object_id).first()
+            record = missing[object_id]
+        if record is None:
+            return ''
+        return getattr(record, attribute) if attribute else str(record)
+    return text
+
+
+OPERATION_ROW_FIELDS = (
+    'id', 'datetime', 'material_operation_type_id', 'material_part_id', 'material_part__serial',
+    'material_user_id', 'material_status_id', 'material_warehouse_id',
+)
+
+
+def operation_row_urls():
+    return {
+        'detail': RowUrl('main:operation_detail'),
+        'edit': RowUrl('main:operation_edit'),
+        'delete': RowUrl('main:operation_delete'),
+        'part': RowUrl('main:material_part_detail'),
+    }
+
+
+def operation_rows(queryset, admin):
+    """Строки журнала операций (``includes/journal_rows.html``) из ``queryset`` операций"""
+    template = get_template('main/includes/journal_rows.html')
+    urls = operation_row_urls()
+    operation_type = reference_text(MaterialOperationType, 'name')
+    user = reference_text(MaterialUser)
+    status = reference_text(MaterialStatus, 'name')
+    warehouse = reference_text(MaterialWarehouse, 'name')
+
+    def render_chunk(chunk):
+        rows = [
+            {
+                'id': row.id,
+                'datetime': row.datetime,
+                'operation_type': operation_type(row.material_operation_type_id),
+                'part_id': row.material_part_id,
+                'serial': row.material_part__serial,
+                'user': user(row.material_user_id),
+                'status': status(row.material_status_id),
+                'warehouse': warehouse(row.material_warehouse_id),
+            }
+            for row in chunk
+        ]
+        return template.render({'rows': rows, 'urls': urls, 'is_admin': admin})
+    return TableRows(queryset.values_list(*OPERATION_ROW_FIELDS, named=True), render_chunk)
+
+
+MATERIAL_PART_ROW_FIELDS = (
+    'id', 'serial', 'part_names', 'type_names', 'revision_name', 'manufacturer_name', 'year',
+    'parent_id', 'parent_serial',
+)
+
+
+def material_part_row_urls():
+    return {
+        'detail': RowUrl('main:material_part_detail'),
+        'edit': RowUrl('main:material_part_edit'),
+        'delete': RowUrl('main:material_part_delete'),
+    }
+
+
+def material_part_rows(queryset, admin, operations_queryset, operations_limit):
+    """
+    Строки списка узлов (``includes/part_rows.html``, как и у постраничного вывода)
+    из ``queryset`` проекции ``MaterialPartRow`` - или узлов ``live_part_rows``, пока
+    проекция не готова; последние операции - одним запросом на пачку строк.
+    """
+    template = get_template('main/includes/part_rows.html')
+    urls = material_part_row_urls()
+    if queryset.model is MaterialPart:
+        # Строки собираются из узлов; prefetch выполняется на каждую пачку итератора
+        to_row = build_row
+    else:
+        queryset = queryset.values_list(*MATERIAL_PART_ROW_FIELDS, named=True)
+        to_row = None
+
+    def render_chunk(chunk):
+        if to_row is not None:
+            chunk = [to_row(part) for part in chunk]
+        operations = top_by_parent(
+            operations_queryset, 'material_part_id', [row.id for row in chunk], operations_limit,
+        )
+        rows = [
+            {
+                **{field: getattr(row, field) for field in MATERIAL_PART_ROW_FIELDS},
+                'last_operations': registry.attach(operations.get(row.id, ()), 'material_status'),
+            }
+            for row in chunk
+        ]
+        return template.render({'rows': rows, 'urls': urls, 'is_admin': admin})
+    return TableRows(queryset, render_chunk)
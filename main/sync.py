@@ -0,0 +1,135 @@
+"""
+Синхронизация станций сканирования, работающих без постоянной связи.
+
+Станция хранит у себя снимок справочников (статусы, типы операций, склады,
+пользователи и соответствие серийный номер -> id узла) и записывает операции
+локально. При появлении связи она:
+
+1. запрашивает ``GET /api/v1/sync/reference/?since=<токен>`` - приходят только
+   изменившиеся строки и id удалённых, плюс новый токен;
+2. выгружает очередь ``POST /api/v1/sync/operations/``; каждая операция несёт UUID,
+   созданный станцией, поэтому повторная выгрузка после обрыва не создаёт дублей.
+
+Токен - номер записи журнала изменений (см. outbox.py). Токен не продвигается
+дальше записей моложе ``CHANGELOG_SETTLE_SECONDS``: такие изменения придут
+повторно и будут применены идемпотентно.
+"""
+import uuid as uuid_lib
+
+from django.db import transaction
+
+from .forms import MaterialOperationsForm, build_bulk_forms
+from .models import (
+    ChangeLog, MaterialOperationType, MaterialOperations, MaterialPart, MaterialStatus,
+    MaterialUser, MaterialWarehouse
+)
+from .outbox import log_changes, pruned_sequence, settled_sequence
+
+PROTOCOL_VERSION = 1
+
+# Раздел снимка -> (модель, колонки строки). Строки передаются массивами в порядке колонок.
+REFERENCE_SECTIONS = {
+    'statuses': (MaterialStatus, ('id', 'name')),
+    'operation_types': (MaterialOperationType, ('id', 'name', 'material_group_id')),
+    'warehouses': (MaterialWarehouse, ('id', 'name', 'parent_id')),
+    'users': (MaterialUser, ('id', 'second_name', 'first_name', 'patronymic')),
+    'parts': (MaterialPart, ('id', 'serial')),
+}
+
+SYNC_MODELS = tuple(model for model, _ in REFERENCE_SECTIONS.values())
+
+
+def _rows(model, columns, queryset=None):
+    queryset = model.objects.all() if queryset is None else queryset
+    return [list(row) for row in queryset.order_by('id').values_list(*columns)]
+
+
+def build_snapshot(since=None):
+    """
+    Полный снимок справочников или дельта после токена ``since``.
+
+    Дельта - не больше одного запроса на раздел: id изменённых объектов берутся
+    из журнала, строки читаются одним запросом ``id__in``. Для токена старше
+    удалённых по сроку хранения записей журнала отдаётся полный снимок.
+    """
+    if since is not None and since < pruned_sequence():
+        since = None
+    token = settled_sequence()
+    snapshot = {'protocol': PROTOCOL_VERSION, 'token': token, 'full': since is None}
+
+    if since is None:
+        for section, (model, columns) in REFERENCE_SECTIONS.items():
+            snapshot[section] = _rows(model, columns)
+        return snapshot
+
+    changes = {}
+    for entity, object_id, action in (
+        ChangeLog.objects.filter(id__gt=since, id__lte=token, entity__in=[m._meta.label_lower for m in SYNC_MODELS])
+        .order_by('id').values_list('entity', 'object_id', 'action')
+    ):
+        # Важно только последнее действие над объектом
+        changes.setdefault(entity, {})[object_id] = action
+
+    deleted = {}
+    for section, (model, columns) in REFERENCE_SECTIONS.items():
+        entity_changes = changes.get(model._meta.label_lower, {})
+        saved = [pk for pk, action in entity_changes.items() if action == ChangeLog.ACTION_SAVE]
+        snapshot[section] = _rows(model, columns, model.objects.filter(id__in=saved)) if saved else []
+        removed = sorted(pk for pk, action in entity_changes.items() if action == ChangeLog.ACTION_DELETE)
+        if removed:
+            deleted[section] = removed
+    snapshot['deleted'] = deleted
+    return snapshot
+
+
+def ingest_operations(items):
+    """
+    Идемпотентная загрузка операций, записанных без связи.
+
+    Каждый элемент - поля ``MaterialOperationsForm`` плюс ``uuid``. Уже загруженные
+    UUID пропускаются, некорректные элементы возвращаются с ошибками и не мешают
+    остальным. Возвращает ``(accepted, rejected)``: ``{uuid: id операции}`` и
+    ``{uuid: ошибки}``.
+    """
+    by_uuid = {}
+    rejected = {}
+    for item in items:
+        raw = str(item.get('uuid') or '')
+        try:
+            uuid = str(uuid_lib.UUID(raw))
+        except ValueError:
+            rejected[raw] = {'uuid': [{'message': 'Некорректный UUID', 'code': 'invalid'}]}
+            continue
+        by_uuid[uuid] = item
+
+    existing = dict(
+        MaterialOperations.objects.filter(client_uuid__in=list(by_uuid))
+        .values_list('client_uuid', 'id')
+    )
+    accepted = {str(uuid): pk for uuid, pk in existing.items()}
+    pending = [(uuid, item) for uuid, item in by_uuid.items() if uuid not in accepted]
+
+    new_objects = []
+    new_uuids = []
+    form_list = build_bulk_forms(MaterialOperationsForm, [item for _, item in pending])
+    for (uuid, _), form in zip(pending, form_list):
+        if form.is_valid():
+            operation = form.save(commit=False)
+            operation.client_uuid = uuid
+            new_objects.append(operation)
+            new_uuids.append(uuid)
+        else:
+            rejected[uuid] = form.errors.get_json_data()
+
+    if new_objects:
+        with transaction.atomic():
+            # Параллельная выгрузка той же очереди: конфликт по UUID просто пропускается
+            MaterialOperations.objects.bulk_create(new_objects, batch_size=500, ignore_conflicts=True)
+            created = dict(
+                MaterialOperations.objects.filter(client_uuid__in=new_uuids).values_list('client_uuid', 'id')
+            )
+            for operation in new_objects:
+                operation.pk = created.get(uuid_lib.UUID(operation.client_uuid))
+            log_changes([op for op in new_objects if op.pk], ChangeLog.ACTION_SAVE)
+        accepted.update((str(uuid), pk) for uuid, pk in created.items())
+    return accepted, rejected
@@ -0,0 +1,46 @@
+"""Фоновые задачи приложения (выполняются командой runworker)"""
+from datetime import timedelta
+
+from django.apps import apps
+from django.utils import timezone
+
+from .archive import archive_operations
+from .deletion import fast_delete
+from .jobs import task
+from .projections import PROJECTIONS, REBUILD_TASK
+from .renditions import RENDITION_MODELS, generate_renditions
+from .search import search_index  # noqa: F401 - поисковый индекс тоже перестраивается задачей
+
+
+@task('renditions.generate')
+def generate_image_renditions(kind, object_id):
+    """Уменьшенные копии изображения операции или ревизии"""
+    obj = RENDITION_MODELS[kind].objects.only('image').filter(pk=object_id).first()
+    if obj is None or not obj.image:
+        return None
+    generate_renditions(obj.image.storage, obj.image.name)
+    return {'image': obj.image.name}
+
+
+@task('archive.operations')
+def archive_old_operations(days):
+    """Перенос старых операций в архив"""
+    count = archive_operations(before=timezone.now() - timedelta(days=days))
+    return {'archived': count}
+
+
+@task('deletion.fast_delete')
+def delete_objects(model, ids):
+    """Удаление объектов модели ``model`` (app_label.Model) со всеми зависимыми"""
+    queryset = apps.get_model(model)._base_manager.filter(pk__in=ids)
+    return fast_delete(queryset)
+
+
+@task(REBUILD_TASK)
+def rebuild_projection(projection):
+    """Полная перестройка проекции журнала изменений (см. projections.py)"""
+    target = PROJECTIONS[projection]
+    # Задача могла дождаться очереди, когда проекция уже перестроена
+    if not target.needs_rebuild():
+        return {'rows': None}
+    return {'rows': target.rebuild()}
@@ -0,0 +1,15 @@
+from django import template
+from django.urls import reverse
+
+from main.renditions import get_kind, get_version
+
+register = template.Library()
+
+
+@register.simple_tag
+def rendition_url(instance, size, fmt):
+    """Кэшируемый URL уменьшенной копии изображения объекта"""
+    url = reverse('main:image_rendition', kwargs={
+        'kind': get_kind(instance), 'object_id': instance.pk, 'size': size, 'fmt': fmt,
+    })
+    return f'{url}?v={get_version(instance.image.name)}'
@@ -1,7 +1,12 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
+from accounts.backends import user_cache_key
+
 
 class TestAccountsViews(TestCase):
     def setUp(self):
@@ -20,3 +25,41 @@ class TestAccountsViews(TestCase):
         self.client.login(username='u', password='p')
         resp = self.client.get(reverse('accounts:logout'))
         self.assertEqual(resp.status_code, 302)
+
+
+# Сессии в кэше включаются только при общем кэше; в тестах процесс один
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+class TestAuthCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+        self.url = reverse('main:scan_session')
+
+    def auth_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries if 'django_session' in q['sql'] or 'accounts_customuser' in q['sql']]
+
+    def test_session_and_user_cached(self):
+        self.client.get(self.url)
+        self.assertEqual(self.auth_queries(), [])
+
+    def test_user_save_invalidates(self):
+        self.client.get(self.url)
+        self.user.first_name = 'Пётр'
+        self.user.save()
+        self.assertEqual(len(self.auth_queries()), 1)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_logout_invalidates(self):
+        self.client.get(self.url)
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        self.client.post(reverse('accounts:logout'))
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertEqual(self.client.get(self.url).status_code, 302)
@@ -0,0 +1,158 @@
+import gzip
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main.models import (
+    AstralType, AstralVariant, AstralPart, AstralRevision, AstralManufacturer, AstralYear,
+    MaterialPart, MaterialGroup, MaterialOperationType, MaterialUser, MaterialStatus,
+    MaterialWarehouse, MaterialOperations
+)
+
+
+class ApiTestMixin:
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='user', password='pass')
+        astral_type = AstralType.objects.create(name='Тип', code='T')
+        self.variant = AstralVariant.objects.create(name='Вариант', code='V', astral_type=astral_type)
+        self.astral_part = AstralPart.objects.create(name='Узел', decimal_num='1.2.3', astral_variant=self.variant)
+        self.rev = AstralRevision.objects.create(name='Rev')
+        self.rev.astral_parts.add(self.astral_part)
+        manufacturer = AstralManufacturer.objects.create(name='Завод', code='A')
+        year = AstralYear.objects.create(astral_variant=self.variant, year=2024)
+        self.parts = [
+            MaterialPart.objects.create(
+                serial=f'SN{i:03}', astral_revision=self.rev,
+                astral_manufacturer=manufacturer, astral_year=year,
+            )
+            for i in range(5)
+        ]
+        group = MaterialGroup.objects.create(name='Группа')
+        self.op_type = MaterialOperationType.objects.create(name='Сборка', material_group=group)
+        self.material_user = MaterialUser.objects.create(first_name='Иван', second_name='Иванов')
+        self.status = MaterialStatus.objects.create(name='Готово')
+        self.warehouse = MaterialWarehouse.objects.create(name='Склад')
+        self.client.login(username='user', password='pass')
+
+    def operation_item(self, part, **extra):
+        item = {
+            'material_operation_type': self.op_type.id,
+            'material_user': self.material_user.id,
+            'datetime': '2024-05-01T10:00:00',
+            'material_status': self.status.id,
+            'material_warehouse': self.warehouse.id,
+            'material_part': part.id,
+        }
+        item.update(extra)
+        return item
+
+
+class TestApiRead(ApiTestMixin, TestCase):
+    def url(self, resource='material-parts'):
+        return reverse('main:api_list', kwargs={'resource_name': resource})
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url()).status_code, 401)
+
+    def test_keyset_pagination(self):
+        resp = self.client.get(self.url(), {'limit': 2})
+        data = resp.json()
+        self.assertEqual([row['serial'] for row in data['results']], ['SN000', 'SN001'])
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual([row['serial'] for row in data['results']], ['SN002', 'SN003'])
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual([row['serial'] for row in data['results']], ['SN004'])
+        self.assertIsNone(data['next'])
+
+    def test_sparse_fieldset(self):
+        data = self.client.get(self.url(), {'fields': 'serial,year', 'limit': 1}).json()
+        self.assertEqual(data['results'], [{'id': self.parts[0].id, 'serial': 'SN000', 'year': 2024}])
+
+        resp = self.client.get(self.url(), {'fields': 'password'})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_filters(self):
+        data = self.client.get(self.url(), {'serial': 'SN003'}).json()
+        self.assertEqual(len(data['results']), 1)
+        self.assertEqual(self.client.get(self.url(), {'parent': 'x'}).status_code, 400)
+
+        data = self.client.get(self.url('astral-revisions'), {'astral_part': self.astral_part.id}).json()
+        self.assertEqual(data['results'][0]['astral_parts'], [self.astral_part.id])
+
+    def test_query_count_bounded(self):
+        # Страница - один запрос (+ по одному на поле многие-ко-многим), не зависит от размера
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url(), {'limit': 100})
+        page_queries = [q for q in queries if 'material_part' in q['sql']]
+        self.assertEqual(len(page_queries), 1)
+
+    def test_detail(self):
+        url = reverse('main:api_detail', kwargs={'resource_name': 'astral-parts', 'object_id': self.astral_part.id})
+        data = self.client.get(url).json()
+        self.assertEqual(data['decimal_num'], '1.2.3')
+        self.assertEqual(data['astral_variant_name'], 'Вариант')
+
+        url = reverse('main:api_detail', kwargs={'resource_name': 'astral-parts', 'object_id': 999})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        url = reverse('main:api_list', kwargs={'resource_name': 'unknown'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(CHANGELOG_SETTLE_SECONDS=0)
+    def test_etag_and_gzip(self):
+        resp = self.client.get(self.url(), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(resp.content))['results']), 5)
+
+        etag = resp['ETag']
+        # ETag по версии данных: 304 без запроса списка
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(self.url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertFalse([q for q in queries if 'FROM "material_part"' in q['sql']])
+
+        self.parts[0].serial = 'CHANGED'
+        self.parts[0].save()
+        resp = self.client.get(self.url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+        # Строки зависят и от связанных моделей (имя ревизии)
+        etag = resp['ETag']
+        self.rev.name = 'Rev B'
+        self.rev.save()
+        self.assertEqual(self.client.get(self.url(), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class TestApiBulkCreate(ApiTestMixin, TestCase):
+    url = '/api/v1/material-operations/'
+
+    def post(self, payload):
+        return self.client.post(self.url, json.dumps(payload), content_type='application/json')
+
+    def test_bulk_create(self):
+        items = [self.operation_item(part) for part in self.parts] * 40
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.post({'items': items})
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(len(resp.json()['created']), 200)
+        self.assertEqual(MaterialOperations.objects.count(), 200)
+        # Связанные объекты загружаются по запросу на поле, а не на элемент
+        self.assertLess(len(queries), 20)
+
+    def test_invalid_item_rolls_back_everything(self):
+        items = [self.operation_item(self.parts[0]), self.operation_item(self.parts[1], material_status=999)]
+        resp = self.post(items)
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('material_status', resp.json()['details']['1'])
+        self.assertFalse(MaterialOperations.objects.exists())
+
+    def test_rejects_non_list(self):
+        self.assertEqual(self.post({'items': 'nope'}).status_code, 400)
+        resp = self.client.post('/api/v1/material-parts/', '[]', content_type='application/json')
+        self.assertEqual(resp.status_code, 405)
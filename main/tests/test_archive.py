@@ -0,0 +1,132 @@
+import shutil
+import tempfile
+from io import StringIO
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from main import archive
+from main.archive import archive_operations, get_archived_operations, has_archived_operations
+from main.models import (
+    ChangeLog, StoredBlob, AstralType, AstralVariant, AstralPart, AstralRevision,
+    AstralManufacturer, AstralYear, MaterialPart,
+    MaterialGroup, MaterialOperationType, MaterialUser,
+    MaterialStatus, MaterialWarehouse, MaterialOperations
+)
+
+
+class TestOperationsArchive(TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+        override = override_settings(ARCHIVE_ROOT=self.archive_dir, ARCHIVE_HORIZON_DAYS=365)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        User = get_user_model()
+        self.user = User.objects.create_user(username='user', password='pass')
+        self.type = AstralType.objects.create(name='Тип', code='T')
+        self.variant = AstralVariant.objects.create(name='Вариант', code='V', astral_type=self.type)
+        self.year = AstralYear.objects.create(astral_variant=self.variant, year=2020)
+        self.manu = AstralManufacturer.objects.create(name='Завод', code='M')
+        self.part = AstralPart.objects.create(name='Узел', decimal_num='1.2.3', astral_variant=self.variant)
+        self.rev = AstralRevision.objects.create(name='Rev')
+        self.rev.astral_parts.add(self.part)
+        self.mpart1 = MaterialPart.objects.create(
+            serial='SN1', astral_revision=self.rev, astral_manufacturer=self.manu, astral_year=self.year
+        )
+        self.mpart2 = MaterialPart.objects.create(
+            serial='SN2', astral_revision=self.rev, astral_manufacturer=self.manu, astral_year=self.year
+        )
+        self.group = MaterialGroup.objects.create(name='Гр')
+        self.op_type = MaterialOperationType.objects.create(name='Сборка', material_group=self.group)
+        self.mstatus = MaterialStatus.objects.create(name='Годен')
+        self.wh = MaterialWarehouse.objects.create(name='Склад')
+        self.muser = MaterialUser.objects.create(first_name='Иван', second_name='Иванов', material_group=self.group)
+
+    def _mk_operation(self, part, days_ago):
+        return MaterialOperations.objects.create(
+            material_operation_type=self.op_type,
+            material_user=self.muser,
+            datetime=timezone.now() - timedelta(days=days_ago),
+            material_status=self.mstatus,
+            material_warehouse=self.wh,
+            material_part=part,
+        )
+
+    def test_moves_only_old_operations(self):
+        old1 = self._mk_operation(self.mpart1, 800)
+        old2 = self._mk_operation(self.mpart1, 500)
+        old_other = self._mk_operation(self.mpart2, 600)
+        fresh = self._mk_operation(self.mpart1, 10)
+
+        self.assertEqual(archive_operations(segment_rows=2), 3)
+
+        self.assertEqual(list(MaterialOperations.objects.values_list('id', flat=True)), [fresh.id])
+        archived = get_archived_operations(self.mpart1.id)
+        self.assertEqual([op.id for op in archived], [old2.id, old1.id])
+        self.assertEqual(archived[0].operation_type, 'Сборка')
+        self.assertEqual(archived[0].user, 'Иванов Иван')
+        self.assertEqual([op.id for op in get_archived_operations(self.mpart2.id)], [old_other.id])
+
+    def test_dry_run_keeps_rows(self):
+        self._mk_operation(self.mpart1, 800)
+        self.assertEqual(archive_operations(dry_run=True), 1)
+        self.assertEqual(MaterialOperations.objects.count(), 1)
+        self.assertFalse(has_archived_operations(self.mpart1.id))
+
+    def test_management_command(self):
+        self._mk_operation(self.mpart1, 100)
+        call_command('archive_operations', days=30, stdout=StringIO())
+        self.assertEqual(MaterialOperations.objects.count(), 0)
+        self.assertTrue(has_archived_operations(self.mpart1.id))
+        self.assertFalse(has_archived_operations(self.mpart2.id))
+
+    def test_detail_shows_archive_on_demand(self):
+        self._mk_operation(self.mpart1, 800)
+        archive_operations()
+        self.client.login(username='user', password='pass')
+        url = reverse('main:material_part_detail', kwargs={'part_id': self.mpart1.id})
+
+        resp = self.client.get(url)
+        self.assertTrue(resp.context['has_archive'])
+        self.assertIsNone(resp.context['archived_operations'])
+
+        resp = self.client.get(url + '?archive=1')
+        self.assertEqual(len(resp.context['archived_operations']), 1)
+        self.assertContains(resp, 'Архивная история операций')
+
+    def test_archived_files_keep_references(self):
+        media_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_dir, ignore_errors=True)
+        with self.settings(MEDIA_ROOT=media_dir):
+            op = self._mk_operation(self.mpart1, 800)
+            op.file = SimpleUploadedFile('act.pdf', b'%PDF act')
+            op.save()
+            logged = ChangeLog.objects.count()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(archive_operations(), 1)
+
+            self.assertFalse(MaterialOperations.objects.exists())
+            self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+            self.assertEqual(get_archived_operations(self.mpart1.id)[0].file, op.file.name)
+        # Одна запись об удалении, без повторной от сигнала post_delete
+        self.assertEqual(
+            list(ChangeLog.objects.order_by('id')[logged:].values_list('action', 'object_id')),
+            [(ChangeLog.ACTION_DELETE, op.id)],
+        )
+
+    def test_manifest_updated_under_lock(self):
+        self._mk_operation(self.mpart1, 800)
+        self._mk_operation(self.mpart2, 700)
+        with mock.patch.object(archive, 'advisory_lock', wraps=archive.advisory_lock) as lock:
+            self.assertEqual(archive_operations(segment_rows=1), 2)
+        self.assertEqual(lock.call_args_list, [mock.call(archive.MANIFEST_LOCK, wait=True)] * 2)
+        self.assertEqual(len(archive.load_manifest()['segments']), 2)
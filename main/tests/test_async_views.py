@@ -0,0 +1,93 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase, override_settings
+
+from main import async_views
+from main.models import (
+    AstralType, AstralVariant, AstralPart, AstralRevision,
+    AstralManufacturer, AstralYear, MaterialPart
+)
+
+CONTENT = bytes(range(256)) * 40
+
+
+async def _body(response):
+    return b''.join([chunk async for chunk in response])
+
+
+class TestAsyncViews(TestCase):
+    def setUp(self):
+        self.media_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_dir, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_dir, SENDFILE_BACKEND='')
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.factory = AsyncRequestFactory()
+        self.user = get_user_model().objects.create_user(username='user', password='pass')
+        astral_type = AstralType.objects.create(name='Тип', code='T')
+        variant = AstralVariant.objects.create(name='Вариант', code='V', astral_type=astral_type)
+        self.part = AstralPart.objects.create(name='Узел', decimal_num='1.2.3', astral_variant=variant)
+        self.rev = AstralRevision.objects.create(name='Rev', file=SimpleUploadedFile('log.bin', CONTENT))
+        self.rev.astral_parts.add(self.part)
+        self.mp = MaterialPart.objects.create(
+            serial='SNA', astral_revision=self.rev,
+            astral_manufacturer=AstralManufacturer.objects.create(name='Завод', code='A'),
+            astral_year=AstralYear.objects.create(astral_variant=variant, year=2024),
+        )
+
+    def _get(self, path='/', user=None, **extra):
+        request = self.factory.get(path, **extra)
+        request.user = user or self.user
+        return request
+
+    async def test_requires_login(self):
+        response = await async_views.material_parts_list(self._get(user=AnonymousUser()))
+        self.assertEqual(response.status_code, 302)
+
+    async def test_lists(self):
+        response = await async_views.material_parts_list(self._get())
+        self.assertContains(response, 'SNA')
+        response = await async_views.astral_revisions_list(self._get())
+        self.assertContains(response, 'Rev')
+        response = await async_views.astral_parts_list(self._get())
+        self.assertContains(response, '1.2.3')
+        response = await async_views.operations_list(self._get())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertIn('Операции не найдены', (await _body(response)).decode())
+        response = await async_views.material_parts_list(self._get('/?all=1'))
+        self.assertIn('SNA', (await _body(response)).decode())
+
+    async def test_details_with_qr_codes(self):
+        response = await async_views.material_part_detail(self._get(), part_id=self.mp.id)
+        self.assertContains(response, 'SNA')
+        self.assertContains(response, 'data:image/png;base64,', count=2)
+
+        response = await async_views.astral_revision_detail(self._get(), revision_id=self.rev.id)
+        self.assertContains(response, 'data:image/png;base64,', count=2)
+
+        response = await async_views.astral_part_detail(self._get(), part_id=self.part.id)
+        self.assertContains(response, 'Узел')
+
+    async def test_missing_object(self):
+        with self.assertRaises(Http404):
+            await async_views.material_part_detail(self._get(), part_id=self.mp.id + 100)
+
+    async def test_file_streamed_asynchronously(self):
+        response = await async_views.media_download(
+            self._get(), kind='revision', object_id=self.rev.id, field='file'
+        )
+        self.assertTrue(response.is_async)
+        self.assertEqual(await _body(response), CONTENT)
+
+        response = await async_views.media_download(
+            self._get(headers={'Range': 'bytes=100-199'}), kind='revision', object_id=self.rev.id, field='file'
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(await _body(response), CONTENT[100:200])
@@ -0,0 +1,85 @@
+from django.contrib import messages
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main import async_views, views
+from main.conditional import page_etag
+from main.models import AstralPart
+from main.tests.test_api import ApiTestMixin
+
+
+# Сессии в кэше (при общем кэше в рабочей среде): 304 без запросов сессии
+@override_settings(CHANGELOG_SETTLE_SECONDS=0, SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+class TestConditionalPages(ApiTestMixin, TestCase):
+    def test_not_modified_without_main_queries(self):
+        url = reverse('main:material_parts_list')
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('no-cache', resp['Cache-Control'])
+        etag = resp['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp['ETag'], etag)
+        # Сессия и пользователь - из кэша, остаётся одна проверка версии
+        self.assertEqual(len(queries), 1)
+        self.assertFalse([q for q in queries if 'material_part' in q['sql']])
+
+    def test_change_invalidates(self):
+        url = reverse('main:material_part_detail', args=[self.parts[0].id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.status.name = 'Принято'
+        self.status.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        other = reverse('main:material_part_detail', args=[self.parts[1].id])
+        self.assertNotEqual(self.client.get(other)['ETag'], self.client.get(url)['ETag'])
+
+    def test_unrelated_change_keeps_etag(self):
+        url = reverse('main:astral_parts_list')
+        etag = self.client.get(url)['ETag']
+        self.status.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_revision_parts_link_invalidates(self):
+        url = reverse('main:astral_revisions_list')
+        extra = AstralPart.objects.create(name='Ещё', decimal_num='4.5.6', astral_variant=self.variant)
+        etag = self.client.get(url)['ETag']
+        self.rev.astral_parts.add(extra)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(CHANGELOG_SETTLE_SECONDS=3600)
+    def test_no_etag_for_fresh_changes(self):
+        resp = self.client.get(reverse('main:material_parts_list'))
+        self.assertFalse(resp.has_header('ETag'))
+
+    def test_no_etag_with_pending_messages(self):
+        request = RequestFactory().get('/operations/')
+        request.user = self.user
+        request.session = self.client.session
+        request._messages = FallbackStorage(request)
+        etag_func = page_etag(*views.OPERATIONS_MODELS)
+        self.assertIsNotNone(etag_func(request))
+
+        messages.success(request, 'Сохранено')
+        self.assertIsNone(etag_func(request))
+        # Проверка не расходует сообщение - оно будет показано на странице
+        self.assertEqual([str(m) for m in messages.get_messages(request)], ['Сохранено'])
+
+    async def test_async_view_not_modified(self):
+        factory = AsyncRequestFactory()
+        request = factory.get('/material-parts/')
+        request.user = self.user
+        response = await async_views.material_parts_list(request)
+        etag = response['ETag']
+
+        request = factory.get('/material-parts/', headers={'If-None-Match': etag})
+        request.user = self.user
+        response = await async_views.material_parts_list(request)
+        self.assertEqual(response.status_code, 304)
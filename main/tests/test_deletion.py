@@ -0,0 +1,151 @@
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.db.models import ProtectedError
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from main.admin import AstralRevisionAdmin, MaterialPartAdmin, delete_in_background
+from main.deletion import fast_delete, find_protected
+from main.jobs import run_pending
+from main.models import (
+    AstralPart, AstralRevision, AstralType, BackgroundJob,
+    ChangeLog, MaterialOperations, MaterialPart
+)
+from main.tests.test_api import ApiTestMixin
+
+
+class DeletionTestMixin(ApiTestMixin):
+    def setUp(self):
+        super().setUp()
+        for part in self.parts[:2]:
+            for hour in range(3):
+                MaterialOperations.objects.create(
+                    material_operation_type=self.op_type, material_user=self.material_user,
+                    datetime=f'2024-05-01T1{hour}:00:00Z', material_status=self.status,
+                    material_warehouse=self.warehouse, material_part=part,
+                )
+        self.parts[3].parent = self.parts[0]
+        self.parts[3].save()
+
+
+class TestFastDelete(DeletionTestMixin, TestCase):
+    def test_cascades_and_nulls_references(self):
+        counts = fast_delete(MaterialPart.objects.filter(pk__in=[self.parts[0].pk, self.parts[1].pk]))
+
+        self.assertEqual(counts, {'main.MaterialOperations': 6, 'main.MaterialPart': 2})
+        self.assertEqual(MaterialOperations.objects.count(), 0)
+        self.assertEqual(MaterialPart.objects.count(), 3)
+        self.parts[3].refresh_from_db()
+        self.assertIsNone(self.parts[3].parent_id)
+
+    def test_deletions_logged(self):
+        before = ChangeLog.objects.order_by('-id').values_list('id', flat=True).first()
+        fast_delete(MaterialPart.objects.filter(pk=self.parts[0].pk))
+
+        entries = ChangeLog.objects.filter(id__gt=before)
+        deleted = set(entries.filter(action=ChangeLog.ACTION_DELETE).values_list('entity', 'object_id'))
+        self.assertIn(('main.materialpart', self.parts[0].pk), deleted)
+        self.assertEqual(len([entity for entity, _ in deleted if entity == 'main.materialoperations']), 3)
+        # Обнулённая ссылка дочернего узла - изменение с новым состоянием
+        saved = entries.get(action=ChangeLog.ACTION_SAVE, entity='main.materialpart')
+        self.assertEqual(saved.object_id, self.parts[3].pk)
+        self.assertIsNone(saved.payload['parent_id'])
+
+    def test_protect_blocks_whole_delete(self):
+        queryset = AstralRevision.objects.filter(pk=self.rev.pk)
+        self.assertEqual(len(find_protected(queryset)), 5)
+        with self.assertRaises(ProtectedError):
+            fast_delete(queryset)
+        self.assertTrue(AstralRevision.objects.filter(pk=self.rev.pk).exists())
+
+    def test_protect_found_deep_in_tree(self):
+        # Тип -> вариант -> год выпуска, на который ссылаются узлы (PROTECT)
+        with self.assertRaises(ProtectedError):
+            fast_delete(AstralType.objects.all())
+        self.assertEqual(AstralPart.objects.count(), 1)
+
+    def test_cascade_through_tree_and_m2m(self):
+        MaterialPart.objects.all().delete()
+        counts = fast_delete(AstralType.objects.all())
+
+        self.assertEqual(counts['main.AstralVariant'], 1)
+        self.assertEqual(counts['main.AstralPart'], 1)
+        self.assertEqual(counts['main.AstralYear'], 1)
+        self.assertFalse(AstralRevision.astral_parts.through.objects.exists())
+        self.assertTrue(AstralRevision.objects.filter(pk=self.rev.pk).exists())
+
+    def test_chunks_report_progress(self):
+        calls = []
+        fast_delete(
+            MaterialPart.objects.filter(pk__in=[part.pk for part in self.parts[:3]]),
+            chunk_size=2, progress=lambda label, count: calls.append((label, count)),
+        )
+        self.assertEqual(calls, [
+            ('main.MaterialOperations', 2), ('main.MaterialOperations', 4),
+            ('main.MaterialOperations', 6), ('main.MaterialPart', 2), ('main.MaterialPart', 3),
+        ])
+
+
+class TestDeleteViews(DeletionTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        get_user_model().objects.create_user(username='admin', password='pass', is_staff=True)
+        self.client.login(username='admin', password='pass')
+
+    def test_part_delete(self):
+        part = self.parts[0]
+        resp = self.client.post(reverse('main:material_part_delete', args=[part.pk]))
+        self.assertRedirects(resp, reverse('main:material_parts_list'), fetch_redirect_response=False)
+        self.assertFalse(MaterialPart.objects.filter(pk=part.pk).exists())
+        self.assertFalse(MaterialOperations.objects.filter(material_part_id=part.pk).exists())
+
+    def test_protected_revision_reports_error(self):
+        url = reverse('main:astral_revision_delete', args=[self.rev.pk])
+        resp = self.client.post(url, follow=True)
+        self.assertRedirects(resp, reverse('main:astral_revision_detail', args=[self.rev.pk]))
+        self.assertContains(resp, 'Удаление запрещено')
+        self.assertTrue(AstralRevision.objects.filter(pk=self.rev.pk).exists())
+
+
+@override_settings(JOB_MAX_ATTEMPTS=1)
+class TestDeleteAction(DeletionTestMixin, TestCase):
+    def request(self):
+        request = RequestFactory().post('/')
+        request.user = self.user
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        return request
+
+    def messages(self, request):
+        return [str(message) for message in request._messages]
+
+    def test_enqueues_job(self):
+        request = self.request()
+        queryset = MaterialPart.objects.filter(pk__in=[part.pk for part in self.parts[:2]])
+        delete_in_background(MaterialPartAdmin(MaterialPart, AdminSite()), request, queryset)
+
+        job = BackgroundJob.objects.get(task='deletion.fast_delete')
+        self.assertIn(f'#{job.pk}', self.messages(request)[0])
+        self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.result, {'main.MaterialOperations': 6, 'main.MaterialPart': 2})
+        self.assertEqual(MaterialPart.objects.count(), 3)
+
+    def test_requires_delete_permission(self):
+        request = self.request()
+        self.user.is_staff = True
+        self.user.save()
+        modeladmin = MaterialPartAdmin(MaterialPart, AdminSite())
+        self.assertNotIn('delete_in_background', modeladmin.get_actions(request))
+
+        self.user.user_permissions.add(Permission.objects.get(codename='delete_materialpart'))
+        request.user = get_user_model().objects.get(pk=self.user.pk)
+        self.assertIn('delete_in_background', modeladmin.get_actions(request))
+
+    def test_protected_not_enqueued(self):
+        request = self.request()
+        delete_in_background(AstralRevisionAdmin(AstralRevision, AdminSite()), request, AstralRevision.objects.all())
+        self.assertFalse(BackgroundJob.objects.exists())
+        self.assertIn('Удаление запрещено', self.messages(request)[0])
@@ -0,0 +1,74 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from main.models import AstralRevision
+
+CONTENT = bytes(range(256)) * 40
+
+
+class TestMediaDownload(TestCase):
+    def setUp(self):
+        self.media_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_dir, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_dir, SENDFILE_BACKEND='')
+        override.enable()
+        self.addCleanup(override.disable)
+
+        User = get_user_model()
+        self.user = User.objects.create_user(username='user', password='pass')
+        self.rev = AstralRevision.objects.create(name='Rev', file=SimpleUploadedFile('log.bin', CONTENT))
+        self.url = reverse('main:media_download', kwargs={
+            'kind': 'revision', 'object_id': self.rev.id, 'field': 'file',
+        })
+
+    def test_requires_login(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_full_download(self):
+        self.client.login(username='user', password='pass')
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b''.join(resp.streaming_content), CONTENT)
+        self.assertEqual(resp['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(resp['Accept-Ranges'], 'bytes')
+        self.assertTrue(resp['ETag'])
+
+    def test_range_request(self):
+        self.client.login(username='user', password='pass')
+        resp = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(b''.join(resp.streaming_content), CONTENT[100:200])
+        self.assertEqual(resp['Content-Range'], f'bytes 100-199/{len(CONTENT)}')
+        self.assertEqual(resp['Content-Length'], '100')
+
+        resp = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(resp.streaming_content), CONTENT[-10:])
+
+        resp = self.client.get(self.url, HTTP_RANGE=f'bytes={len(CONTENT)}-')
+        self.assertEqual(resp.status_code, 416)
+
+    def test_conditional_requests(self):
+        self.client.login(username='user', password='pass')
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        resp = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(resp.status_code, 206)
+        resp.close()
+        # Файл изменился - вместо диапазона отдаётся весь файл
+        resp = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(resp.status_code, 200)
+        resp.close()
+
+    @override_settings(SENDFILE_BACKEND='nginx', SENDFILE_URL_PREFIX='/protected-media/')
+    def test_delegates_to_nginx(self):
+        self.client.login(username='user', password='pass')
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp['X-Accel-Redirect'].startswith('/protected-media/blobs/'))
+        self.assertEqual(resp.content, b'')
@@ -0,0 +1,28 @@
+from io import StringIO
+from unittest import skipIf, skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from main.models import MaterialPart, MaterialOperations
+
+
+class TestExplainViewsCommand(TestCase):
+    @skipUnless(connection.vendor == 'postgresql', 'EXPLAIN (ANALYZE, BUFFERS) есть только в PostgreSQL')
+    def test_reports_and_rolls_back_seed(self):
+        out = StringIO()
+        call_command('explain_views', seed=20, operations_per_part=5, stdout=out)
+        output = out.getvalue()
+        self.assertIn('operations_list', output)
+        self.assertIn('material_part_detail', output)
+        self.assertIn('Всего Seq Scan', output)
+        # Тестовые данные не остаются в базе
+        self.assertEqual(MaterialPart.objects.count(), 0)
+        self.assertEqual(MaterialOperations.objects.count(), 0)
+
+    @skipIf(connection.vendor == 'postgresql', 'проверка для остальных СУБД')
+    def test_requires_postgresql(self):
+        with self.assertRaises(CommandError):
+            call_command('explain_views', stdout=StringIO())
@@ -0,0 +1,131 @@
+import json
+import re
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main.facets import Facet, _count_sql, facet_counts
+from main.models import (
+    AstralManufacturer, AstralVariant, AstralYear, MaterialOperations, MaterialPart, MaterialPartRow, MaterialStatus
+)
+from main.projections import rebuild
+from main.tests.test_api import ApiTestMixin
+from main.views import PARTS_LIST_FACETS, PARTS_LIST_MODELS
+
+
+def _counts(options):
+    return {option.label: option.count for option in options}
+
+
+@override_settings(CHANGELOG_SETTLE_SECONDS=0)
+class TestFacets(ApiTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Номера журнала повторяются между тестами (откат транзакций) - ключи кеша тоже
+        cache.clear()
+        self.other = AstralManufacturer.objects.create(name='Другой', code='B')
+        MaterialPart.objects.create(
+            serial='XX001', astral_revision=self.rev, astral_manufacturer=self.other,
+            astral_year=AstralYear.objects.create(astral_variant=self.variant, year=2023),
+        )
+        rebuild()
+
+    def test_material_parts_list_counts(self):
+        resp = self.client.get(reverse('main:material_parts_list'))
+        facets = resp.context['facets']
+        self.assertEqual(_counts(facets['manufacturer']), {'Завод': 5, 'Другой': 1})
+        self.assertEqual([option.label for option in facets['year']], ['2024', '2023'])
+        self.assertContains(resp, 'Завод (5)')
+
+        # Фасет не учитывает свой фильтр, но учитывает остальные и поиск
+        resp = self.client.get(reverse('main:material_parts_list'), {'year': 2023, 'search': 'X'})
+        facets = resp.context['facets']
+        self.assertEqual(_counts(facets['manufacturer']), {'Завод': 0, 'Другой': 1})
+        self.assertEqual(_counts(facets['year']), {'2023': 1})
+        self.assertTrue(facets['year'][0].selected)
+        self.assertContains(resp, 'disabled')
+
+    def test_single_cached_query(self):
+        self.client.get(reverse('main:material_parts_list'))
+        rows = MaterialPartRow.objects.all()
+        params = {'manufacturer': str(self.other.pk)}
+        with CaptureQueriesContext(connection) as queries:
+            facets = facet_counts(rows, PARTS_LIST_FACETS, params, PARTS_LIST_MODELS)
+        self.assertEqual(len([q for q in queries if 'facet_base' in q['sql']]), 1)
+        self.assertEqual(_counts(facets['year']), {'2024': 0, '2023': 1})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(facet_counts(rows, PARTS_LIST_FACETS, params, PARTS_LIST_MODELS), facets)
+        self.assertFalse([q for q in queries if 'facet_base' in q['sql']])
+
+        # Изменение данных меняет версию и ключ кеша
+        self.other.save()
+        with CaptureQueriesContext(connection) as queries:
+            facet_counts(rows, PARTS_LIST_FACETS, params, PARTS_LIST_MODELS)
+        self.assertEqual(len([q for q in queries if 'facet_base' in q['sql']]), 1)
+
+    def test_operations_and_astral_parts_lists(self):
+        MaterialStatus.objects.create(name='Брак')
+        for part in self.parts[:3]:
+            MaterialOperations.objects.create(
+                material_operation_type=self.op_type, material_user=self.material_user,
+                datetime='2024-05-01T10:00:00Z', material_status=self.status,
+                material_warehouse=self.warehouse, material_part=part,
+            )
+        resp = self.client.get(reverse('main:operations_list'), {'operation_type': self.op_type.id})
+        # Шапка журнала - варианты без количеств, количества - в конце потока
+        facets = resp.context['facets']
+        self.assertEqual(_counts(facets['status']), {'Готово': None, 'Брак': None})
+        self.assertTrue(facets['operation_type'][0].selected)
+        content = b''.join(resp.streaming_content).decode()
+        script = re.search(r'<script id="facet-counts" type="application/json">(.*?)</script>', content)
+        self.assertGreater(script.start(), content.index('Найдено операций'))
+        brak = MaterialStatus.objects.get(name='Брак')
+        self.assertEqual(json.loads(script.group(1)), {
+            'status': {str(self.status.id): 3},
+            'operation_type': {str(self.op_type.id): 3},
+        })
+        self.assertIn('data-label="Брак"', content)
+        self.assertNotIn(f'value="{brak.id}" data-label="Брак" disabled', content)
+
+        # Пустой журнал: строк нет, количества подставляются сразу
+        content = b''.join(self.client.get(reverse('main:operations_list'), {'search': 'нет такого'}).streaming_content)
+        self.assertIn(b'facet-counts', content)
+        self.assertNotIn(b'<!--deferred-facets-->', content)
+
+        AstralVariant.objects.create(name='Пустой', code='E', astral_type=self.variant.astral_type)
+        resp = self.client.get(reverse('main:astral_parts_list'))
+        self.assertEqual(_counts(resp.context['facets']['variant']), {'Вариант': 1, 'Пустой': 0})
+
+    @override_settings(CHANGELOG_SETTLE_SECONDS=3600)
+    def test_unsettled_version_uses_last_result(self):
+        rows = MaterialPartRow.objects.all()
+        self.client.get(reverse('main:material_parts_list'))
+        facet_counts(rows, PARTS_LIST_FACETS, {}, PARTS_LIST_MODELS)
+        # Версия не устоялась - новый запрос не выполняется, пока есть прежний результат
+        with CaptureQueriesContext(connection) as queries:
+            facets = facet_counts(rows, PARTS_LIST_FACETS, {}, PARTS_LIST_MODELS)
+        self.assertFalse([q for q in queries if 'facet_base' in q['sql']])
+        self.assertEqual(_counts(facets['manufacturer']), {'Завод': 5, 'Другой': 1})
+
+    @skipUnless(connection.vendor == 'postgresql', 'GROUPING SETS выполняются только в PostgreSQL')
+    def test_grouping_sets_query_on_postgresql(self):
+        self.client.get(reverse('main:material_parts_list'))
+        rows = MaterialPartRow.objects.filter(serial__icontains='X')
+        facets = facet_counts(rows, PARTS_LIST_FACETS, {'year': '2023'}, PARTS_LIST_MODELS)
+        self.assertEqual(_counts(facets['manufacturer']), {'Завод': 0, 'Другой': 1})
+        self.assertEqual(_counts(facets['year']), {'2023': 1})
+
+    def test_grouping_sets_on_postgresql(self):
+        facets = (Facet('manufacturer', 'manufacturer_id'), Facet('year', 'year'))
+        rows = MaterialPartRow.objects.filter(serial__icontains='SN')
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            sql, params, grouping_sets = _count_sql(rows, facets, [None, 2024])
+        self.assertTrue(grouping_sets)
+        self.assertIn('GROUP BY GROUPING SETS (("facet_0"), ("facet_1"))', sql)
+        self.assertIn('COUNT(CASE WHEN "facet_1" = %s THEN 1 END), COUNT(*)', sql)
+        self.assertEqual(params, (2024, '%SN%'))
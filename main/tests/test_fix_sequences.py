@@ -0,0 +1,38 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from main.management.commands.fix_sequences import get_sequence_targets
+from main.models import MaterialStatus
+
+
+class TestFixSequences(TestCase):
+    def test_targets_discovered_from_models(self):
+        tables = {table for table, _ in get_sequence_targets()}
+        self.assertIn('material_operations', tables)
+        self.assertIn('astral_revision_astral_parts', tables)
+        self.assertIn('accounts_customuser', tables)
+        self.assertNotIn('devices', tables)
+
+    def test_targets_filtered_by_app(self):
+        tables = {table for table, _ in get_sequence_targets(['accounts'])}
+        self.assertIn('accounts_customuser', tables)
+        self.assertNotIn('material_part', tables)
+
+    def test_unknown_app(self):
+        with self.assertRaises(CommandError):
+            get_sequence_targets(['nope'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'последовательности есть только в PostgreSQL')
+    def test_resets_sequence(self):
+        MaterialStatus.objects.create(id=100, name='Импортирован')
+        out = StringIO()
+        call_command('fix_sequences', '--app', 'main', '--dry-run', stdout=out)
+        self.assertIn('material_status_id_seq', out.getvalue())
+
+        call_command('fix_sequences', '--app', 'main', stdout=StringIO())
+        self.assertEqual(MaterialStatus.objects.create(name='Новый').id, 101)
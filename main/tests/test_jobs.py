@@ -0,0 +1,157 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from main import jobs
+from main.models import BackgroundJob
+
+CALLS = []
+
+
+@jobs.task('tests.echo')
+def echo(value):
+    CALLS.append(value)
+    return {'value': value}
+
+
+@jobs.task('tests.fail')
+def fail():
+    raise RuntimeError('boom')
+
+
+@jobs.task('tests.reclaimed')
+def reclaimed():
+    # Пока задача выполняется, её признали брошенной и забрал другой обработчик
+    BackgroundJob.objects.filter(task='tests.reclaimed').update(
+        status=BackgroundJob.STATUS_PENDING, run_at=timezone.now(),
+    )
+    jobs.claim_jobs('other-worker', 1)
+    return {'stale': True}
+
+
+class TestBackgroundJobs(TestCase):
+    def setUp(self):
+        CALLS.clear()
+        override = override_settings(JOB_RETRY_DELAY=0)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_enqueue_and_run(self):
+        job = jobs.enqueue('tests.echo', value=42)
+        self.assertEqual(job.status, BackgroundJob.STATUS_PENDING)
+
+        self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.STATUS_DONE)
+        self.assertEqual(job.result, {'value': 42})
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(CALLS, [42])
+
+    def test_unknown_task_rejected(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue('tests.missing')
+
+    def test_delayed_job_not_claimed(self):
+        jobs.enqueue('tests.echo', delay=timedelta(hours=1), value=1)
+        self.assertEqual(jobs.claim_jobs('w', 10), [])
+
+    def test_retry_then_fail(self):
+        job = jobs.enqueue('tests.fail', max_attempts=2)
+        # Первая попытка возвращает задачу в очередь, вторая - окончательная ошибка
+        with self.assertLogs('main.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_pending(), 2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.STATUS_FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn('boom', job.error)
+
+    def test_requeue_stale(self):
+        job = jobs.enqueue('tests.echo', value=1)
+        jobs.claim_jobs('dead-worker', 1)
+        BackgroundJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(jobs.requeue_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.STATUS_PENDING)
+
+    def test_long_job_with_heartbeat_not_requeued(self):
+        job = jobs.enqueue('tests.echo', value=1)
+        jobs.claim_jobs('busy-worker', 1)
+        long_ago = timezone.now() - timedelta(days=1)
+        BackgroundJob.objects.filter(pk=job.pk).update(started_at=long_ago, heartbeat_at=long_ago)
+
+        self.assertEqual(jobs.heartbeat('busy-worker'), 1)
+        self.assertEqual(jobs.requeue_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.STATUS_RUNNING)
+
+    def test_stale_job_fails_after_last_attempt(self):
+        job = jobs.enqueue('tests.echo', max_attempts=1, value=1)
+        jobs.claim_jobs('dead-worker', 1)
+        BackgroundJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(days=1))
+
+        with self.assertLogs('main.jobs', 'ERROR'):
+            self.assertEqual(jobs.requeue_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.STATUS_FAILED)
+        self.assertIn('перестал отвечать', job.error)
+
+    def test_reclaimed_job_not_overwritten(self):
+        job = jobs.enqueue('tests.reclaimed')
+        with self.assertLogs('main.jobs', 'WARNING'):
+            self.assertEqual(jobs.run_pending('first-worker', limit=1), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.STATUS_RUNNING)
+        self.assertEqual(job.worker, 'other-worker')
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNone(job.result)
+
+    def test_runworker_once(self):
+        jobs.enqueue('tests.echo', value='x')
+        out = StringIO()
+        call_command('runworker', '--once', stdout=out)
+        self.assertIn('Выполнено задач: 1', out.getvalue())
+        self.assertEqual(CALLS, ['x'])
+
+
+class TestJobViews(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(username='admin', password='pass', is_staff=True)
+        self.user = User.objects.create_user(username='user', password='pass')
+
+    def test_archive_start_enqueues_job(self):
+        self.client.login(username='admin', password='pass')
+        resp = self.client.post(reverse('main:archive_start'))
+        self.assertEqual(resp.status_code, 202)
+        job = BackgroundJob.objects.get(pk=resp.json()['id'])
+        self.assertEqual(job.task, 'archive.operations')
+
+    def test_archive_start_requires_admin(self):
+        self.client.login(username='user', password='pass')
+        resp = self.client.post(reverse('main:archive_start'))
+        self.assertEqual(resp.status_code, 302)
+        self.assertFalse(BackgroundJob.objects.exists())
+
+    def test_job_status(self):
+        job = jobs.enqueue('tests.echo', created_by=self.user, value=7)
+        jobs.run_pending()
+        self.client.login(username='user', password='pass')
+        data = self.client.get(reverse('main:job_status', args=[job.id])).json()
+        self.assertEqual(data['status'], BackgroundJob.STATUS_DONE)
+        self.assertTrue(data['finished'])
+        self.assertEqual(data['result'], {'value': 7})
+
+    def test_job_status_scoped_to_owner_and_staff(self):
+        job = jobs.enqueue('tests.echo', created_by=self.admin, value=7)
+        self.client.login(username='user', password='pass')
+        self.assertEqual(self.client.get(reverse('main:job_status', args=[job.id])).status_code, 404)
+
+        other = jobs.enqueue('tests.echo', created_by=self.user, value=8)
+        self.client.login(username='admin', password='pass')
+        self.assertEqual(self.client.get(reverse('main:job_status', args=[other.id])).status_code, 200)
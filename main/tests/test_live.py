@@ -0,0 +1,90 @@
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from main import async_views, live
+from main.models import MaterialOperations
+from main.tests.test_api import ApiTestMixin
+
+
+def _events(body):
+    return [
+        json.loads(line[len('data: '):])
+        for line in body.splitlines() if line.startswith('data: ')
+    ]
+
+
+class LiveTestMixin(ApiTestMixin):
+    def create_operation(self, part):
+        return MaterialOperations.objects.create(
+            material_part=part, material_operation_type=self.op_type, material_user=self.material_user,
+            material_status=self.status, material_warehouse=self.warehouse, datetime=timezone.now(),
+        )
+
+
+class TestLiveOperations(LiveTestMixin, TestCase):
+    def test_dashboard_passes_cursor(self):
+        operation = self.create_operation(self.parts[0])
+        resp = self.client.get(reverse('main:dashboard'))
+        self.assertContains(resp, f'data-last-id="{operation.id}"')
+
+    def test_sync_stream_returns_events_after_cursor(self):
+        first = self.create_operation(self.parts[0])
+        self.create_operation(self.parts[1])
+        url = reverse('main:operations_stream')
+
+        resp = self.client.get(url, {'after': first.id})
+        self.assertEqual(resp['Content-Type'], 'text/event-stream')
+        self.assertEqual([event['serial'] for event in _events(resp.content.decode())], ['SN001'])
+
+        # Переподключение браузера: заголовок важнее параметра страницы
+        resp = self.client.get(url, {'after': 0}, HTTP_LAST_EVENT_ID=str(first.id + 1))
+        self.assertEqual(_events(resp.content.decode()), [])
+
+        resp = self.client.get(url)
+        self.assertEqual(resp.content.decode(), 'retry: 5000\n\n')
+
+
+class TestOperationsBroadcaster(TestCase):
+    def test_listener_connection_closed_on_restart(self):
+        listener = mock.MagicMock()
+        broadcaster = live.OperationsBroadcaster()
+        broadcaster._last_id = 0
+        with mock.patch.object(live, 'connection') as conn, \
+                mock.patch.object(live.select, 'select', side_effect=OSError('соединение потеряно')):
+            conn.vendor = 'postgresql'
+            conn.get_new_connection.return_value = listener
+            with self.assertRaises(OSError):
+                broadcaster._listen()
+        listener.cursor.return_value.__enter__.return_value.execute.assert_called_once_with(f'LISTEN {live.CHANNEL}')
+        listener.close.assert_called_once_with()
+
+
+@override_settings(LIVE_HEARTBEAT=1, LIVE_STREAM_SECONDS=3)
+class TestAsyncOperationsStream(LiveTestMixin, TestCase):
+    async def test_stream_pushes_published_events(self):
+        operation = await sync_to_async(self.create_operation)(self.parts[0])
+        request = AsyncRequestFactory().get('/operations/stream/', {'after': operation.id - 1})
+        request.user = self.user
+
+        with mock.patch.object(live.broadcaster, 'start'):
+            response = await async_views.operations_stream(request)
+            stream = response.streaming_content
+            self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+            backfill = await anext(stream)
+            self.assertEqual(_events(backfill.decode())[0]['id'], operation.id)
+
+            pushed = {'id': operation.id + 1, 'serial': 'SN999'}
+            live.broadcaster.publish([{'id': operation.id, 'serial': 'дубль'}, pushed])
+            chunk = await asyncio.wait_for(anext(stream), timeout=2)
+            self.assertEqual(_events(chunk.decode()), [pushed])
+
+            # Дальше только пинги, пока поток не закроется по LIVE_STREAM_SECONDS
+            rest = [chunk async for chunk in stream]
+            self.assertIn(b': ping\n\n', rest)
+        self.assertEqual(live.broadcaster._subscribers, set())
@@ -43,8 +43,8 @@ class TestMaterialParts(TestCase):
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, 200)
         parts = resp.context['parts']
-        self.assertEqual(parts.count(), 1)
-        self.assertEqual(parts.first().serial, 'SNA')
+        self.assertEqual(len(parts), 1)
+        self.assertEqual(parts[0].serial, 'SNA')
 
     def test_detail_ok(self):
         self.client.login(username='admin', password='pass')
@@ -0,0 +1,177 @@
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from main import async_views
+from main.archive import archive_operations
+from main.models import ChangeLog, MaterialOperations, MaterialStatus, ProjectionCursor
+from main.outbox import prune_change_log, pruned_sequence
+from main.sync import build_snapshot
+from main.tests.test_api import ApiTestMixin
+
+
+@override_settings(CHANGELOG_SETTLE_SECONDS=0)
+class TestChangeFeed(ApiTestMixin, TestCase):
+    url = '/api/v1/changes/'
+
+    def feed(self, **params):
+        resp = self.client.get(self.url, params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_save_and_delete_logged_with_payload(self):
+        cursor = self.feed(limit=1000)['cursor']
+        self.status.name = 'Принято'
+        self.status.save()
+        status_id = self.status.id
+        MaterialStatus.objects.create(name='Временный').delete()
+
+        data = self.feed(after=cursor)
+        changes = [(row['entity'], row['action'], row['data']['name']) for row in data['results']]
+        self.assertEqual(changes, [
+            ('main.materialstatus', 'save', 'Принято'),
+            ('main.materialstatus', 'save', 'Временный'),
+            ('main.materialstatus', 'delete', 'Временный'),
+        ])
+        self.assertEqual(data['results'][0]['id'], status_id)
+        self.assertEqual(self.feed(after=data['cursor'])['results'], [])
+
+    def test_cursor_pagination_and_entity_filter(self):
+        first = self.feed(limit=2, entity='main.materialpart')
+        self.assertEqual([row['data']['serial'] for row in first['results']], ['SN000', 'SN001'])
+        self.assertTrue(first['more'])
+        rest = self.feed(after=first['cursor'], entity='main.materialpart')
+        self.assertEqual([row['data']['serial'] for row in rest['results']], ['SN002', 'SN003', 'SN004'])
+        self.assertFalse(rest['more'])
+
+        resp = self.client.get(self.url, {'entity': 'auth.user'})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_bulk_paths_logged(self):
+        cursor = self.feed(limit=1000)['cursor']
+        self.client.post(
+            '/api/v1/material-operations/',
+            json.dumps([self.operation_item(part) for part in self.parts]), content_type='application/json',
+        )
+        data = self.feed(after=cursor, entity='main.materialoperations')
+        ids = sorted(MaterialOperations.objects.values_list('id', flat=True))
+        self.assertEqual(sorted(row['id'] for row in data['results']), ids)
+        self.assertEqual(data['results'][0]['data']['material_status_id'], self.status.id)
+
+        # Архивация удаляет строки мимо сигналов и журналирует удаление сама
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir, ignore_errors=True)
+        with self.settings(ARCHIVE_ROOT=archive_dir):
+            archive_operations(before=timezone.now())
+        deleted = self.feed(after=data['cursor'])['results']
+        self.assertEqual(sorted(row['id'] for row in deleted if row['action'] == 'delete'), ids)
+
+    def test_rollback_discards_entry(self):
+        before = ChangeLog.objects.count()
+        resp = self.client.post(
+            '/api/v1/material-operations/',
+            json.dumps([self.operation_item(self.parts[0], material_status=999)]), content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(ChangeLog.objects.count(), before)
+
+    @override_settings(CHANGELOG_SETTLE_SECONDS=3600)
+    def test_unsettled_changes_held_back(self):
+        data = self.feed()
+        self.assertEqual(data['results'], [])
+        self.assertEqual(data['cursor'], 0)
+
+    @override_settings(CHANGES_MAX_WAITERS=0, CHANGES_MAX_WAIT=5)
+    def test_long_poll_without_free_waiter_slot(self):
+        cursor = self.feed(limit=1000)['cursor']
+        with mock.patch('main.api.time.sleep') as sleep:
+            resp = self.client.get(self.url, {'after': cursor, 'wait': 5})
+        sleep.assert_not_called()
+        self.assertEqual(resp.json()['results'], [])
+        self.assertEqual(resp['Retry-After'], '1')
+
+    @override_settings(CHANGES_MAX_WAIT=5, CHANGES_POLL_INTERVAL=0.01)
+    def test_long_poll_waits_in_free_slot(self):
+        cursor = self.feed(limit=1000)['cursor']
+
+        def change_status(seconds):
+            self.status.name = 'Принято'
+            self.status.save()
+
+        with mock.patch('main.api.time.sleep', side_effect=change_status) as sleep:
+            data = self.feed(after=cursor, wait=5)
+        sleep.assert_called_once()
+        self.assertEqual([row['data']['name'] for row in data['results']], ['Принято'])
+
+    @override_settings(CHANGES_MAX_WAIT=5, CHANGES_POLL_INTERVAL=0.01)
+    def test_async_long_poll(self):
+        cursor = self.feed(limit=1000)['cursor']
+        factory = RequestFactory()
+
+        request = factory.get(self.url, {'after': cursor, 'wait': 1})
+        request.user = self.user
+        with mock.patch('main.async_views.asyncio.sleep', side_effect=self._async_change_status) as sleep:
+            resp = async_to_sync(async_views.api_changes)(request)
+        sleep.assert_called_once()
+        self.assertEqual([row['data']['name'] for row in json.loads(resp.content)['results']], ['Принято'])
+
+        request = factory.get(self.url, {'entity': 'auth.user'})
+        request.user = self.user
+        self.assertEqual(async_to_sync(async_views.api_changes)(request).status_code, 400)
+        request = factory.get(self.url)
+        request.user = AnonymousUser()
+        self.assertEqual(async_to_sync(async_views.api_changes)(request).status_code, 401)
+
+    async def _async_change_status(self, seconds):
+        self.status.name = 'Принято'
+        await self.status.asave()
+
+
+class TestChangeLogRetention(ApiTestMixin, TestCase):
+    def age(self, days):
+        ChangeLog.objects.update(created_at=timezone.now() - timedelta(days=days))
+
+    def test_prune_keeps_recent_and_unapplied_entries(self):
+        self.age(40)
+        old_last = ChangeLog.objects.latest('id').id
+        self.status.name = 'Свежий'
+        self.status.save()
+
+        # Проекция отстаёт - её записи не удаляются
+        ProjectionCursor.objects.create(name='test', position=old_last - 2)
+        expected = ChangeLog.objects.filter(id__lte=old_last - 2).count()
+        self.assertEqual(prune_change_log(30), expected)
+        self.assertEqual(pruned_sequence(), old_last - 2)
+        self.assertEqual(ChangeLog.objects.order_by('id').first().id, old_last - 1)
+
+        ProjectionCursor.objects.filter(name='test').update(position=old_last + 1)
+        out = StringIO()
+        call_command('prune_change_log', days=30, stdout=out)
+        self.assertIn('Удалено записей журнала: 2', out.getvalue())
+        self.assertEqual(pruned_sequence(), old_last)
+        self.assertEqual(list(ChangeLog.objects.values_list('payload__name', flat=True)), ['Свежий'])
+        # Повторный запуск ничего не трогает
+        self.assertEqual(prune_change_log(30), 0)
+
+    def test_stale_cursor_and_sync_token(self):
+        token = build_snapshot()['token']
+        self.status.name = 'Принято'
+        self.status.save()
+        self.age(40)
+        prune_change_log(30)
+
+        resp = self.client.get('/api/v1/changes/', {'after': token})
+        self.assertEqual(resp.status_code, 410)
+        self.assertEqual(resp.json()['details']['pruned'], pruned_sequence())
+        self.assertEqual(self.client.get('/api/v1/changes/', {'after': pruned_sequence()}).status_code, 200)
+        self.assertTrue(build_snapshot(since=token)['full'])
+        self.assertFalse(build_snapshot(since=pruned_sequence())['full'])
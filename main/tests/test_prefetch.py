@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from main import views
+from main.models import MaterialOperations
+from main.prefetch import decode_cursor, keyset_page
+from main.tests.test_api import ApiTestMixin
+
+
+class TestWindowedPrefetch(ApiTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.part = self.parts[0]
+        start = timezone.now() - timedelta(days=30)
+        # Две операции с одинаковым временем проверяют сортировку по id внутри секунды
+        MaterialOperations.objects.bulk_create([
+            MaterialOperations(
+                material_part=self.part, material_operation_type=self.op_type, material_user=self.material_user,
+                material_status=self.status, material_warehouse=self.warehouse,
+                datetime=start + timedelta(hours=i // 2),
+            )
+            for i in range(45)
+        ])
+        self.expected = list(
+            MaterialOperations.objects.filter(material_part=self.part).order_by('-datetime', '-id')
+            .values_list('id', flat=True)
+        )
+
+    def test_detail_loads_only_top_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('main:material_part_detail', args=[self.part.id]))
+        operations = resp.context['operations']
+        self.assertEqual([op.id for op in operations], self.expected[:20])
+        window = [q['sql'] for q in queries if 'ROW_NUMBER' in q['sql'].upper()]
+        self.assertEqual(len(window), 1)
+        self.assertIsNotNone(resp.context['operations_more_url'])
+
+    def test_load_more_pages_through_remainder(self):
+        url = reverse('main:material_part_detail', args=[self.part.id])
+        next_url = self.client.get(url).context['operations_more_url']
+        seen = []
+        while next_url:
+            page = self.client.get(next_url).json()
+            seen.append(page['html'].count('<tr>'))
+            next_url = page['next']
+        self.assertEqual(seen, [20, 5])
+
+    def test_keyset_page_is_stable(self):
+        queryset = MaterialOperations.objects.filter(material_part=self.part)
+        ids, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(queryset, views.OPERATIONS_ORDERING, cursor, 7)
+            ids += [row.id for row in rows]
+            if cursor is None:
+                break
+        self.assertEqual(ids, self.expected)
+
+        with self.assertRaises(ValueError):
+            decode_cursor('garbage', MaterialOperations, views.OPERATIONS_ORDERING)
+        bad = self.client.get(reverse('main:material_part_operations', args=[self.part.id]), {'after': '!!'})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_list_shows_last_operations_per_part(self):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('main:material_parts_list'))
+        parts = {part.id: part for part in resp.context['parts']}
+        self.assertEqual([op.id for op in parts[self.part.id].last_operations], self.expected[:3])
+        self.assertEqual(parts[self.parts[1].id].last_operations, [])
+        # Последние операции всех узлов страницы - одним оконным запросом
+        self.assertEqual(len([q for q in queries if 'material_operations' in q['sql']]), 1)
+
+    def test_list_keyset_pages(self):
+        url = reverse('main:material_parts_list')
+        views_page_size, views.MATERIAL_PARTS_PAGE_SIZE = views.MATERIAL_PARTS_PAGE_SIZE, 2
+        self.addCleanup(setattr, views, 'MATERIAL_PARTS_PAGE_SIZE', views_page_size)
+        serials = []
+        while url:
+            resp = self.client.get(url)
+            serials += [part.serial for part in resp.context['parts']]
+            next_page = resp.context['next_page_url']
+            url = reverse('main:material_parts_list') + next_page if next_page else None
+        self.assertEqual(serials, [f'SN{i:03}' for i in range(5)])
@@ -0,0 +1,148 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main.deletion import fast_delete
+from main.jobs import run_pending
+from main.models import AstralPart, BackgroundJob, MaterialOperations, MaterialPart, MaterialPartRow, ProjectionCursor
+from main.projections import NAME, REBUILD_TASK, catch_up, rebuild
+from main.tests.test_api import ApiTestMixin
+
+
+@override_settings(CHANGELOG_SETTLE_SECONDS=0)
+class TestMaterialPartRows(ApiTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.parts[1].parent = self.parts[0]
+        self.parts[1].save()
+
+    def row(self, part):
+        return MaterialPartRow.objects.get(pk=part.pk)
+
+    def test_rebuild(self):
+        self.assertEqual(rebuild(), 5)
+        row = self.row(self.parts[1])
+        self.assertEqual(
+            (row.serial, row.part_names, row.type_names, row.revision_name, row.manufacturer_name, row.year),
+            ('SN001', 'Узел', 'Тип', 'Rev', 'Завод', 2024),
+        )
+        self.assertEqual(row.parent_serial, 'SN000')
+        self.assertEqual(row.astral_part_ids, f',{self.astral_part.pk},')
+        self.assertTrue(ProjectionCursor.objects.filter(name=NAME).exists())
+
+    def test_catch_up_applies_changes(self):
+        rebuild()
+        self.rev.name = 'Rev B'
+        self.rev.save()
+        self.parts[0].serial = 'SN100'
+        self.parts[0].save()
+        self.variant.astral_type.name = 'Блок'
+        self.variant.astral_type.save()
+
+        self.assertGreater(catch_up(), 0)
+        row = self.row(self.parts[1])
+        self.assertEqual((row.revision_name, row.type_names, row.parent_serial), ('Rev B', 'Блок', 'SN100'))
+        self.assertEqual(self.row(self.parts[0]).serial, 'SN100')
+        # Повторный вызов без новых записей ничего не делает
+        self.assertEqual(catch_up(), 0)
+
+    def test_revision_composition_and_astral_part_delete(self):
+        rebuild()
+        extra = AstralPart.objects.create(name='Плата', decimal_num='1.2.4', astral_variant=self.variant)
+        self.rev.astral_parts.add(extra)
+        catch_up()
+        self.assertEqual(self.row(self.parts[2]).part_names, 'Узел, Плата')
+
+        extra.delete()
+        catch_up()
+        row = self.row(self.parts[2])
+        self.assertEqual((row.part_names, row.astral_part_ids), ('Узел', f',{self.astral_part.pk},'))
+
+    def test_fast_delete_removes_rows(self):
+        rebuild()
+        fast_delete(MaterialPart.objects.filter(pk=self.parts[0].pk))
+        catch_up()
+        self.assertFalse(MaterialPartRow.objects.filter(pk=self.parts[0].pk).exists())
+        row = self.row(self.parts[1])
+        self.assertEqual((row.parent_id, row.parent_serial), (None, ''))
+
+    def test_lag_over_limit_rebuilds(self):
+        rebuild()
+        MaterialPart.objects.filter(pk=self.parts[2].pk).update(serial='SN200')
+        for part in (self.parts[0], self.parts[3], self.parts[4]):
+            part.save()
+        with self.settings(PROJECTION_MAX_LAG=2):
+            # Запрос не перестраивает таблицу сам - задача ставится в очередь один раз
+            self.assertIsNone(catch_up())
+            self.assertIsNone(catch_up())
+            self.assertEqual(BackgroundJob.objects.filter(task=REBUILD_TASK).count(), 1)
+            self.assertEqual(self.row(self.parts[2]).serial, 'SN002')
+            self.assertEqual(run_pending(), 1)
+        self.assertEqual(self.row(self.parts[2]).serial, 'SN200')
+        self.assertEqual(BackgroundJob.objects.get(task=REBUILD_TASK).result, {'rows': 5})
+
+    def test_rebuild_command(self):
+        out = StringIO()
+        call_command('rebuild_part_rows', if_needed=True, stdout=out)
+        self.assertIn('5', out.getvalue())
+        self.assertEqual(MaterialPartRow.objects.count(), 5)
+
+        out = StringIO()
+        call_command('rebuild_part_rows', if_needed=True, stdout=out)
+        self.assertIn('актуальны', out.getvalue())
+
+
+@override_settings(CHANGELOG_SETTLE_SECONDS=0)
+class TestMaterialPartsListFromRows(ApiTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for part in self.parts[:2]:
+            MaterialOperations.objects.create(
+                material_operation_type=self.op_type, material_user=self.material_user,
+                datetime='2024-05-01T10:00:00Z', material_status=self.status,
+                material_warehouse=self.warehouse, material_part=part,
+            )
+
+    def test_list_reads_row_table_only(self):
+        rebuild()
+        url = reverse('main:material_parts_list')
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url, {'manufacturer': self.parts[0].astral_manufacturer_id, 'year': 2024})
+        self.assertContains(resp, 'SN004')
+        self.assertContains(resp, 'Узел')
+        self.assertContains(resp, 'Готово')
+        for query in queries:
+            self.assertNotIn('JOIN', query['sql'], query['sql'])
+            self.assertNotIn('"material_part"', query['sql'], query['sql'])
+
+    def test_live_rows_until_projection_built(self):
+        url = reverse('main:material_parts_list')
+        for params in ({}, {'search': 'Узел', 'manufacturer': self.parts[0].astral_manufacturer_id, 'year': 2024}):
+            resp = self.client.get(url, params)
+            self.assertEqual([part.serial for part in resp.context['parts']], [p.serial for p in self.parts])
+            self.assertEqual(resp.context['parts'][0].part_names, 'Узел')
+            self.assertEqual(len(resp.context['parts'][0].last_operations), 1)
+            self.assertEqual(
+                {option.label: option.count for option in resp.context['facets']['year']}, {'2024': 5},
+            )
+        content = b''.join(self.client.get(url, {'all': 1, 'search': 'SN003'}).streaming_content).decode()
+        self.assertIn('SN003', content)
+        self.assertNotIn('SN004', content)
+        self.assertFalse(MaterialPartRow.objects.exists())
+
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(MaterialPartRow.objects.count(), 5)
+        self.assertEqual(len(self.client.get(url, {'search': 'Узел'}).context['parts']), 5)
+
+    def test_search_by_part_name(self):
+        resp = self.client.get(reverse('main:material_parts_list'), {'search': 'Узел'})
+        self.assertEqual(len(resp.context['parts']), 5)
+        resp = self.client.get(reverse('main:material_parts_list'), {'search': 'SN003'})
+        self.assertEqual([part.serial for part in resp.context['parts']], ['SN003'])
+        self.assertEqual(len(resp.context['parts'][0].last_operations), 0)
+        resp = self.client.get(reverse('main:material_parts_list'), {'year': 2023})
+        self.assertEqual(len(resp.context['parts']), 0)
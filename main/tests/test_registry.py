@@ -0,0 +1,64 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main.models import ChangeLog, MaterialOperations, MaterialStatus
+from main.outbox import log_change
+from main.registry import registry
+from main.tests.test_api import ApiTestMixin
+
+
+class TestReferenceRegistry(ApiTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for part in self.parts:
+            MaterialOperations.objects.create(
+                material_operation_type=self.op_type, material_user=self.material_user,
+                datetime='2024-05-01T10:00:00Z', material_status=self.status,
+                material_warehouse=self.warehouse, material_part=part,
+            )
+
+    def test_operations_list_reads_only_large_tables(self):
+        self.client.get(reverse('main:operations_list'))
+        with CaptureQueriesContext(connection) as queries, self.settings(REFERENCE_CHECK_INTERVAL=60):
+            resp = self.client.get(reverse('main:operations_list'))
+            # Строки отдаются потоком - запросы выполняются при чтении ответа
+            content = b''.join(resp.streaming_content).decode()
+        self.assertIn('Готово', content)
+        self.assertIn('Склад', content)
+        self.assertIn('Иванов Иван', content)
+        reference_tables = ('material_status', 'material_operation_type', 'material_warehouse', 'material_user')
+        for query in queries:
+            self.assertFalse(
+                [table for table in reference_tables if f'"{table}"' in query['sql']], query['sql'],
+            )
+
+    def test_save_in_process_resets_registry(self):
+        with self.settings(REFERENCE_CHECK_INTERVAL=60):
+            self.assertEqual(registry.get(MaterialStatus, self.status.id).name, 'Готово')
+            self.status.name = 'Принято'
+            self.status.save()
+            self.assertEqual(registry.get(MaterialStatus, self.status.id).name, 'Принято')
+
+    @override_settings(CHANGELOG_SETTLE_SECONDS=0, REFERENCE_CHECK_INTERVAL=0)
+    def test_refresh_on_version_change(self):
+        self.assertEqual(registry.get(MaterialStatus, self.status.id).name, 'Готово')
+        # Изменение в другом процессе: сигналы здесь не срабатывают, меняется только журнал
+        MaterialStatus.objects.filter(pk=self.status.pk).update(name='Принято')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(registry.get(MaterialStatus, self.status.id).name, 'Готово')
+        self.assertEqual(len(queries), 1)
+
+        self.status.refresh_from_db()
+        log_change(self.status, ChangeLog.ACTION_SAVE)
+        self.assertEqual(registry.get(MaterialStatus, self.status.id).name, 'Принято')
+
+    def test_missing_record_left_to_lazy_load(self):
+        registry.tables()
+        status = MaterialStatus.objects.bulk_create([MaterialStatus(name='Новый')])[0]
+        operation = MaterialOperations.objects.filter(material_part=self.parts[0]).first()
+        operation.material_status_id = status.pk
+        with self.settings(REFERENCE_CHECK_INTERVAL=60):
+            registry.attach([operation], 'material_status')
+        self.assertEqual(operation.material_status.name, 'Новый')
@@ -0,0 +1,102 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from main.models import AstralRevision
+from main.renditions import RENDITION_FORMATS, RENDITION_SIZES, generate_renditions, rendition_name
+
+
+def _png(size=(2000, 1000)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color='red').save(buffer, format='PNG')
+    return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+
+class TestImageRenditions(TestCase):
+    def setUp(self):
+        self.media_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_dir, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        User = get_user_model()
+        self.user = User.objects.create_user(username='user', password='pass')
+        self.rev = AstralRevision.objects.create(name='Rev', image=_png())
+
+    def test_rendition_name_next_to_original(self):
+        self.assertEqual(
+            rendition_name('astral_revisions/images/photo.png', 'thumb', 'webp'),
+            'astral_revisions/images/photo.png.thumb.webp',
+        )
+        self.assertNotEqual(
+            rendition_name('images/photo.png', 'thumb', 'webp'), rendition_name('images/photo.jpg', 'thumb', 'webp')
+        )
+
+    def test_generate_renditions(self):
+        generate_renditions(self.rev.image.storage, self.rev.image.name)
+        name = rendition_name(self.rev.image.name, 'thumb', 'jpg')
+        self.assertTrue(default_storage.exists(name))
+        with default_storage.open(name) as fh, Image.open(fh) as img:
+            self.assertEqual(img.size, (480, 240))
+
+    def test_rendition_view_is_cacheable(self):
+        self.client.login(username='user', password='pass')
+        url = reverse('main:image_rendition', kwargs={
+            'kind': 'revision', 'object_id': self.rev.id, 'size': 'thumb', 'fmt': 'webp',
+        })
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'image/webp')
+        self.assertIn('immutable', resp['Cache-Control'])
+        resp.close()
+
+        bad_url = reverse('main:image_rendition', kwargs={
+            'kind': 'revision', 'object_id': self.rev.id, 'size': 'huge', 'fmt': 'webp',
+        })
+        self.assertEqual(self.client.get(bad_url).status_code, 404)
+
+    def test_detail_page_does_not_inline_image(self):
+        self.client.login(username='user', password='pass')
+        resp = self.client.get(reverse('main:astral_revision_detail', kwargs={'revision_id': self.rev.id}))
+        self.assertEqual(resp.status_code, 200)
+        # base64 остаётся только у двух QR-кодов
+        self.assertContains(resp, 'data:image/png;base64,', count=2)
+        self.assertContains(resp, '/renditions/revision/')
+
+    def _rendition_names(self, image_name):
+        return [rendition_name(image_name, size, fmt) for size in RENDITION_SIZES for fmt in RENDITION_FORMATS]
+
+    def test_renditions_deleted_with_last_reference(self):
+        generate_renditions(self.rev.image.storage, self.rev.image.name)
+        names = self._rendition_names(self.rev.image.name)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rev.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+    def test_shared_content_keeps_renditions(self):
+        other = AstralRevision.objects.create(name='Other', image=_png())
+        self.assertEqual(other.image.name, self.rev.image.name)
+        generate_renditions(self.rev.image.storage, self.rev.image.name)
+        names = self._rendition_names(self.rev.image.name)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rev.delete()
+        self.assertTrue(all(default_storage.exists(name) for name in names))
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+    def test_replaced_image_renditions_deleted(self):
+        generate_renditions(self.rev.image.storage, self.rev.image.name)
+        names = self._rendition_names(self.rev.image.name)
+        self.rev.image = _png(size=(300, 200))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rev.save()
+        self.assertFalse(any(default_storage.exists(name) for name in names))
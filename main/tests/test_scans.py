@@ -0,0 +1,78 @@
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main.models import MaterialOperations
+from main.scans import parse_scan, resolve_scans
+from main.tests.test_api import ApiTestMixin
+
+
+class TestScanResolution(ApiTestMixin, TestCase):
+    def test_parse_scan(self):
+        self.assertEqual(parse_scan(' SN001 '), ('serial', 'SN001'))
+        self.assertEqual(parse_scan('https://ntdc.local/material-parts/42/'), ('id', 42))
+        self.assertEqual(parse_scan('S/N: SN002'), ('serial', 'SN002'))
+
+    def test_resolve_in_one_query(self):
+        url = f'http://testserver/material-parts/{self.parts[1].id}/'
+        with self.assertNumQueries(1):
+            parts, unknown = resolve_scans(['SN000', url, 'SN000', 'SN001', 'NOPE', ''])
+        self.assertEqual([part.serial for part in parts], ['SN000', 'SN001'])
+        self.assertEqual(unknown, ['NOPE'])
+
+
+class TestScanSession(ApiTestMixin, TestCase):
+    def common(self):
+        return {
+            'material_operation_type': self.op_type.id,
+            'material_status': self.status.id,
+            'material_warehouse': self.warehouse.id,
+            'material_user': self.material_user.id,
+        }
+
+    def test_page_creates_operations(self):
+        resp = self.client.post(reverse('main:scan_session'), {
+            **self.common(), 'description': 'Пачка', 'scans': 'SN000\r\nSN001\r\nSN002\r\n',
+        }, follow=True)
+        self.assertContains(resp, 'Создано операций: 3')
+        self.assertEqual(MaterialOperations.objects.count(), 3)
+        # Post/Redirect/Get: общие поля переходят в адрес страницы
+        url, status = resp.redirect_chain[0]
+        self.assertEqual(status, 302)
+        self.assertTrue(url.startswith(reverse('main:scan_session') + '?'))
+        form = resp.context['form']
+        self.assertEqual(form.initial['material_status'], str(self.status.id))
+        self.assertEqual(form.initial['description'], 'Пачка')
+        self.assertNotIn('scans', form.initial)
+
+    def test_page_rejects_unknown(self):
+        resp = self.client.post(reverse('main:scan_session'), {**self.common(), 'scans': 'SN000\nMISSING'})
+        self.assertContains(resp, 'Не найдены узлы: MISSING')
+        self.assertFalse(MaterialOperations.objects.exists())
+
+    def test_api(self):
+        scans = [part.serial for part in self.parts]
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.post(
+                reverse('main:api_scans'), json.dumps({**self.common(), 'scans': scans}),
+                content_type='application/json',
+            )
+        self.assertEqual(resp.status_code, 201)
+        created = resp.json()['created']
+        self.assertEqual([row['serial'] for row in created], scans)
+        self.assertEqual(MaterialOperations.objects.filter(material_part__in=self.parts).count(), 5)
+        # Сессия + пользователь, 4 справочника, один запрос узлов, вставка операций
+        # и журнала изменений (+ savepoint)
+        self.assertLessEqual(len(queries), 11)
+
+    def test_api_unknown_serial_saves_nothing(self):
+        resp = self.client.post(
+            reverse('main:api_scans'), json.dumps({**self.common(), 'scans': ['SN000', 'MISSING']}),
+            content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()['details']['unknown'], ['MISSING'])
+        self.assertFalse(MaterialOperations.objects.exists())
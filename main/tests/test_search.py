@@ -0,0 +1,147 @@
+import json
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from main.jobs import run_pending
+from main.models import BackgroundJob, MaterialOperations, MaterialPart, SearchEntry
+from main.projections import REBUILD_TASK
+from main.search import SearchIndex, _search_sql, normalize, rebuild, search
+from main.tests.test_api import ApiTestMixin
+
+
+def _titles(groups):
+    return {group['entity']: [result['title'] for result in group['results']] for group in groups}
+
+
+@override_settings(CHANGELOG_SETTLE_SECONDS=0, SEARCH_INDEX_CHECK_INTERVAL=0)
+class TestSearch(ApiTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.operation = MaterialOperations.objects.create(
+            material_operation_type=self.op_type, material_user=self.material_user,
+            datetime='2024-05-01T10:00:00Z', material_status=self.status,
+            material_warehouse=self.warehouse, material_part=self.parts[0],
+            description='Замена платы питания',
+        )
+
+    def test_normalize(self):
+        self.assertEqual(normalize('  Ёлка   SN-01 '), 'елка sn-01')
+        self.assertEqual(normalize(None), '')
+
+    def test_rebuild_and_prefix_search(self):
+        self.assertEqual(rebuild(), 5 + 2 + 1 + 1)
+        groups = search('sn00')
+        self.assertEqual([group['entity'] for group in groups], ['material_part'])
+        self.assertEqual(groups[0]['title'], 'Материальные узлы')
+        self.assertEqual(_titles(groups)['material_part'], ['SN000', 'SN001', 'SN002', 'SN003', 'SN004'])
+        self.assertEqual(
+            groups[0]['results'][0]['url'], reverse('main:material_part_detail', args=[self.parts[0].pk])
+        )
+        with self.settings(SEARCH_GROUP_SIZE=2):
+            self.assertEqual(len(search('SN')[0]['results']), 2)
+
+    def test_fields_of_each_entity(self):
+        rebuild()
+        self.assertEqual(_titles(search('1.2')), {'astral_part': ['Узел (1.2.3)']})
+        self.assertEqual(_titles(search('узе')), {'astral_part': ['Узел (1.2.3)']})
+        self.assertEqual(_titles(search('rev')), {'astral_revision': ['Rev']})
+        self.assertEqual(_titles(search('плат')), {'operation': ['01.05.2024 13:00 - Замена платы питания']})
+        # Спецсимволы LIKE ищутся как текст
+        self.assertEqual(search('%%'), [])
+
+    def test_incremental_updates(self):
+        rebuild()
+        self.parts[0].serial = 'ZX900'
+        self.parts[0].save()
+        self.parts[1].delete()
+        self.assertEqual(_titles(search('zx9')), {'material_part': ['ZX900']})
+        self.assertEqual(_titles(search('sn'))['material_part'], ['SN002', 'SN003', 'SN004'])
+        # Пакетное изменение мимо save() - тоже через журнал изменений
+        resp = self.client.post(
+            reverse('main:api_list', kwargs={'resource_name': 'material-operations'}),
+            json.dumps({'items': [self.operation_item(self.parts[2], description='Пайка разъёма')]}),
+            content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 201)
+        self.assertIn('operation', _titles(search('пайка')))
+
+    def test_index_built_in_background(self):
+        self.assertFalse(SearchEntry.objects.exists())
+        self.assertEqual(search('SN004'), [])
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(_titles(search('SN004')), {'material_part': ['SN004']})
+
+    def test_short_query(self):
+        rebuild()
+        self.assertEqual(search('s'), [])
+        self.assertEqual(search('  '), [])
+
+    def test_endpoint(self):
+        rebuild()
+        resp = self.client.get(reverse('main:global_search'), {'q': 'Rev'})
+        self.assertEqual(resp.json()['query'], 'Rev')
+        self.assertEqual(_titles(resp.json()['groups']), {'astral_revision': ['Rev']})
+        self.assertIn('private', resp['Cache-Control'])
+
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('main:global_search'), {'q': 'Rev'}).status_code, 302)
+
+    def test_trigram_sql_on_postgresql(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            sql, params = _search_sql('пла', 5)
+            short_sql, _ = _search_sql('пл', 5)
+        self.assertEqual(sql.count('word_similarity(%s, text)'), 4)
+        self.assertIn('%s <%% text', sql)
+        self.assertEqual(params[:7], ['material_part', 'пла%', 5, 'пла', 'material_part', 'пла', 5])
+        self.assertNotIn('similarity', short_sql)
+        self.assertEqual(sql.count(' UNION ALL '), 7)
+
+    @skipUnless(connection.vendor == 'postgresql', 'триграммы (pg_trgm) есть только в PostgreSQL')
+    def test_trigram_search_matches_word_in_long_text(self):
+        rebuild()
+        # Опечатка в одном слове длинного описания: похожесть со всей строкой мала
+        self.assertEqual(
+            _titles(search('питаня')), {'operation': ['01.05.2024 13:00 - Замена платы питания']}
+        )
+
+    def test_rebuild_command(self):
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Строк поискового индекса: 9', out.getvalue())
+        out = StringIO()
+        call_command('rebuild_search_index', if_needed=True, stdout=out)
+        self.assertIn('актуален', out.getvalue())
+
+    def test_rebuild_keeps_index_searchable(self):
+        rebuild()
+        MaterialPart.objects.filter(pk=self.parts[0].pk).update(serial='ZX000')
+        SearchEntry.objects.create(entity='material_part', object_id=10 ** 9, text='sn999', title='SN999')
+        sizes = []
+        original = SearchIndex.refresh
+
+        def refresh(index, keys):
+            sizes.append(SearchEntry.objects.count())
+            original(index, keys)
+
+        with mock.patch.object(SearchIndex, 'refresh', refresh), self.settings(SEARCH_INDEX_CHUNK_SIZE=2):
+            self.assertEqual(rebuild(), 9)
+        self.assertNotIn(0, sizes)
+        self.assertEqual(_titles(search('zx0')), {'material_part': ['ZX000']})
+        self.assertNotIn('SN999', _titles(search('sn'))['material_part'])
+
+    def test_own_lag_threshold(self):
+        rebuild()
+        for part in self.parts:
+            part.save()
+        with self.settings(SEARCH_INDEX_MAX_LAG=2, PROJECTION_MAX_LAG=1000):
+            # Поиск не перестраивает индекс сам, а отвечает по имеющимся записям
+            self.assertEqual(len(search('sn0')[0]['results']), 5)
+            self.assertEqual(BackgroundJob.objects.filter(task=REBUILD_TASK, kwargs__projection='search_index').count(), 1)
+        with self.settings(SEARCH_INDEX_MAX_LAG=10):
+            self.assertEqual(run_pending(), 1)
+        self.assertEqual(BackgroundJob.objects.get(task=REBUILD_TASK).result, {'rows': None})
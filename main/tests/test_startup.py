@@ -0,0 +1,40 @@
+import subprocess
+import sys
+
+from django.test import SimpleTestCase
+
+from main.management.commands.importtime import parse_importtime, summarize
+from main.warmup import template_names, warm_up
+
+IMPORTTIME_OUTPUT = '''\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     django.utils.version
+import time:      3000 |       3120 |   django.utils
+import time:       500 |       3620 | django
+import time:      2000 |       2000 | main.views
+'''
+
+
+class TestStartup(SimpleTestCase):
+    def test_views_do_not_import_qrcode(self):
+        script = (
+            'import django, sys; django.setup(); '
+            'from django.urls import get_resolver; get_resolver().url_patterns; '
+            'print("qrcode" in sys.modules, "PIL.Image" in sys.modules)'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], capture_output=True, text=True, check=True,
+        )
+        self.assertEqual(result.stdout.split(), ['False', 'False'])
+
+    def test_warm_up_loads_templates_and_modules(self):
+        self.assertIn('base.html', template_names())
+        self.assertGreaterEqual(warm_up(), 0)
+        self.assertIn('qrcode', sys.modules)
+
+    def test_importtime_summary(self):
+        report = summarize(parse_importtime(IMPORTTIME_OUTPUT), top=2)
+        self.assertEqual(report['total_ms'], 5.6)
+        self.assertEqual(report['modules'], 4)
+        self.assertEqual(report['packages'], [{'name': 'django', 'ms': 3.6}, {'name': 'main', 'ms': 2.0}])
+        self.assertEqual(report['slowest'][0], {'name': 'django.utils', 'self_ms': 3.0, 'cumulative_ms': 3.1})
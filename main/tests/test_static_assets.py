@@ -0,0 +1,74 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.utils.functional import empty
+
+from main import static_assets
+
+CSS = 'body { color: #123456; }\n' * 200
+
+
+class TestStaticAssets(SimpleTestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.source, 'css'))
+        with open(os.path.join(self.source, 'css', 'site.css'), 'w') as fh:
+            fh.write(CSS)
+        with open(os.path.join(self.source, 'logo.png'), 'wb') as fh:
+            fh.write(b'\x89PNG' + os.urandom(512))
+
+        override = override_settings(STATICFILES_DIRS=[self.source], STATIC_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        call_command('collectstatic', interactive=False, verbosity=0)
+        # Хранилище с только что записанным манифестом, как у нового процесса
+        staticfiles_storage._wrapped = empty
+        with open(os.path.join(self.root, 'staticfiles.json')) as fh:
+            self.hashed = json.load(fh)['paths']['css/site.css']
+
+    def test_collect_hashes_and_compresses(self):
+        self.assertRegex(self.hashed, r'^css/site\.[0-9a-f]{12}\.css$')
+        self.assertEqual(staticfiles_storage.url('css/site.css'), '/static/' + self.hashed)
+        with gzip.open(os.path.join(self.root, self.hashed + '.gz'), 'rt') as fh:
+            self.assertEqual(fh.read(), CSS)
+        self.assertEqual(os.path.exists(os.path.join(self.root, self.hashed + '.br')), static_assets.brotli is not None)
+        # Бинарные файлы не сжимаются
+        self.assertFalse([name for name in os.listdir(self.root) if name.startswith('logo') and name.endswith('.gz')])
+
+    def test_hashed_file_served_compressed_and_immutable(self):
+        resp = self.client.get('/static/' + self.hashed, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertEqual(resp['Cache-Control'], static_assets.IMMUTABLE)
+        self.assertEqual(resp['Vary'], 'Accept-Encoding')
+        self.assertTrue(resp['Content-Type'].startswith('text/css'))
+        body = b''.join(resp.streaming_content)
+        self.assertEqual(int(resp['Content-Length']), len(body))
+        self.assertEqual(gzip.decompress(body).decode(), CSS)
+
+        plain = self.client.get('/static/' + self.hashed, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(plain.streaming_content).decode(), CSS)
+        self.assertNotEqual(plain['ETag'], resp['ETag'])
+
+    def test_unhashed_name_revalidated(self):
+        resp = self.client.get('/static/css/site.css')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Cache-Control'], static_assets.REVALIDATE)
+
+        resp = self.client.get('/static/css/site.css', HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+    def test_unknown_and_traversal_paths_fall_through(self):
+        self.assertEqual(self.client.get('/static/missing.css').status_code, 404)
+        self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
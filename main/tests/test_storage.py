@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from main.models import AstralRevision, StoredBlob
+from main.storage import content_digest, sweep_blobs, upload_storage
+
+
+class TestContentAddressedStorage(TestCase):
+    def setUp(self):
+        self.media_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_dir, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _blob_files(self):
+        blobs_dir = os.path.join(self.media_dir, 'blobs')
+        return [
+            name for root, dirs, files in os.walk(blobs_dir) if not root.endswith('tmp')
+            for name in files
+        ]
+
+    def test_same_content_stored_once(self):
+        rev1 = AstralRevision.objects.create(name='R1', file=SimpleUploadedFile('datasheet.pdf', b'%PDF same'))
+        rev2 = AstralRevision.objects.create(name='R2', file=SimpleUploadedFile('copy.pdf', b'%PDF same'))
+
+        self.assertEqual(len(self._blob_files()), 1)
+        self.assertEqual(content_digest(rev1.file.name), content_digest(rev2.file.name))
+        self.assertTrue(rev2.file.name.endswith('/copy.pdf'))
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+        with rev2.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'%PDF same')
+
+    def test_blob_removed_with_last_reference(self):
+        rev1 = AstralRevision.objects.create(name='R1', file=SimpleUploadedFile('a.bin', b'payload'))
+        rev2 = AstralRevision.objects.create(name='R2', file=SimpleUploadedFile('b.bin', b'payload'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rev1.delete()
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        self.assertTrue(rev2.file.storage.exists(rev2.file.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rev2.delete()
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertEqual(self._blob_files(), [])
+
+    def test_replaced_file_releases_reference(self):
+        rev = AstralRevision.objects.create(name='R', file=SimpleUploadedFile('v1.txt', b'v1'))
+        rev.file = SimpleUploadedFile('v2.txt', b'v2')
+        with self.captureOnCommitCallbacks(execute=True):
+            rev.save()
+        self.assertEqual(list(StoredBlob.objects.values_list('ref_count', flat=True)), [1])
+        self.assertEqual(len(self._blob_files()), 1)
+
+    def test_same_content_uploaded_again_keeps_one_reference(self):
+        rev = AstralRevision.objects.create(name='R', file=SimpleUploadedFile('v1.txt', b'same'))
+        name = rev.file.name
+        for _ in range(2):
+            rev.file = SimpleUploadedFile('v1.txt', b'same')
+            with self.captureOnCommitCallbacks(execute=True):
+                rev.save()
+        self.assertEqual(rev.file.name, name)
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        self.assertTrue(rev.file.storage.exists(name))
+
+        # Сохранение без новой загрузки ссылку не снимает
+        with self.captureOnCommitCallbacks(execute=True):
+            rev.save()
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+
+    def test_long_filename_fits_field(self):
+        filename = 'a' * 246 + '.pdf'
+        rev = AstralRevision.objects.create(name='R', file=SimpleUploadedFile(filename, b'%PDF long'))
+        max_length = AstralRevision._meta.get_field('file').max_length
+        self.assertLessEqual(len(rev.file.name), max_length)
+        self.assertRegex(rev.file.name, r'^astral_revisions/[0-9a-f]{64}/a+\.pdf$')
+        rev.refresh_from_db()
+        with rev.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'%PDF long')
+
+    def test_legacy_names_use_plain_paths(self):
+        name = 'astral_revisions/old.txt'
+        os.makedirs(os.path.join(self.media_dir, 'astral_revisions'))
+        with open(os.path.join(self.media_dir, name), 'wb') as fh:
+            fh.write(b'old')
+        self.assertIsNone(content_digest(name))
+        self.assertTrue(upload_storage.exists(name))
+        self.assertEqual(upload_storage.size(name), 3)
+
+    def test_save_returns_digest_name(self):
+        name = upload_storage.save('material_operations/log.txt', ContentFile(b'log'))
+        self.assertRegex(name, r'^material_operations/[0-9a-f]{64}/log\.txt$')
+
+    def test_collect_rechecks_references(self):
+        rev1 = AstralRevision.objects.create(name='R1', file=SimpleUploadedFile('a.bin', b'shared'))
+        digest = content_digest(rev1.file.name)
+        # Сборка после удаления ещё не выполнилась, а то же содержимое загружено снова
+        rev1.delete()
+        rev2 = AstralRevision.objects.create(name='R2', file=SimpleUploadedFile('b.bin', b'shared'))
+        self.assertFalse(upload_storage._collect(digest))
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        self.assertTrue(rev2.file.storage.exists(rev2.file.name))
+
+    def test_sweep_removes_files_without_references(self):
+        try:
+            with transaction.atomic():
+                AstralRevision.objects.create(name='R', file=SimpleUploadedFile('a.bin', b'rolled back'))
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        AstralRevision.objects.create(name='D', file=SimpleUploadedFile('d.bin', b'deleted')).delete()
+        kept = AstralRevision.objects.create(name='K', file=SimpleUploadedFile('k.bin', b'kept'))
+        self.assertEqual(len(self._blob_files()), 3)
+
+        # Молодые файлы могут принадлежать незавершённому сохранению
+        self.assertEqual(sweep_blobs(min_age=3600), 0)
+        self.assertEqual(sweep_blobs(min_age=0), 2)
+        self.assertEqual(len(self._blob_files()), 1)
+        self.assertEqual(list(StoredBlob.objects.values_list('ref_count', flat=True)), [1])
+        self.assertTrue(kept.file.storage.exists(kept.file.name))
+
@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main.models import MaterialOperations
+from main.tests.test_api import ApiTestMixin
+
+
+def _chunks(response):
+    return [chunk.decode() for chunk in response.streaming_content]
+
+
+@override_settings(CHANGELOG_SETTLE_SECONDS=0, STREAM_CHUNK_ROWS=2)
+class TestStreamedLists(ApiTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.operations = [
+            MaterialOperations.objects.create(
+                material_operation_type=self.op_type, material_user=self.material_user,
+                datetime=f'2024-05-01T1{i}:00:00Z', material_status=self.status,
+                material_warehouse=self.warehouse, material_part=part,
+            )
+            for i, part in enumerate(self.parts)
+        ]
+
+    def test_operations_list_streams_rows_in_chunks(self):
+        resp = self.client.get(reverse('main:operations_list'))
+        self.assertTrue(resp.streaming)
+        chunks = _chunks(resp)
+        # Шапка, три пачки строк по две и подвал
+        self.assertEqual(len(chunks), 5)
+        content = ''.join(chunks)
+        self.assertIn('Найдено операций: 5', content)
+        self.assertIn('<td>01.05.2024 17:00</td>', content)
+        self.assertIn(reverse('main:operation_detail', args=[self.operations[0].id]), content)
+        self.assertIn(f'<a href="{reverse("main:material_part_detail", args=[self.parts[4].id])}">SN004</a>', content)
+        self.assertIn('Иванов Иван', content)
+        self.assertNotIn(reverse('main:operation_edit', args=[self.operations[0].id]), content)
+        # Сортировка журнала - от новых к старым
+        self.assertLess(content.index('SN004'), content.index('SN000'))
+
+    def test_operations_list_filters_and_escaping(self):
+        self.parts[2].serial = '<b>SN</b>'
+        self.parts[2].save()
+        content = ''.join(_chunks(self.client.get(reverse('main:operations_list'), {'search': 'SN</b>'})))
+        self.assertIn('&lt;b&gt;SN&lt;/b&gt;', content)
+        self.assertIn('Найдено операций: 1', content)
+
+        content = ''.join(_chunks(self.client.get(reverse('main:operations_list'), {'status': self.status.id + 1})))
+        self.assertIn('Операции не найдены', content)
+
+    def test_material_parts_show_all(self):
+        with mock.patch('main.views.MATERIAL_PARTS_PAGE_SIZE', 2):
+            resp = self.client.get(reverse('main:material_parts_list'))
+        self.assertEqual(resp.context['show_all_url'], '?all=1')
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('main:material_parts_list'), {'all': 1})
+            content = ''.join(_chunks(resp))
+        self.assertTrue(resp.streaming)
+        for part in self.parts:
+            self.assertIn(part.serial, content)
+        self.assertIn('Показано узлов: <strong>5</strong>', content)
+        self.assertIn('title="01.05.2024 13:00">Готово</span>', content)
+        # Последние операции - один запрос на пачку строк
+        window = [q['sql'] for q in queries if 'ROW_NUMBER' in q['sql'].upper()]
+        self.assertEqual(len(window), 3)
+        self.assertNotIn('Следующие узлы', content)
+
+    def test_paged_and_streamed_rows_match(self):
+        # Обе версии списка рендерят строки одним шаблоном
+        self.parts[1].serial = '<i>SN</i>'
+        self.parts[1].save()
+        self.user.is_staff = True
+        self.user.save()
+
+        def tbody(content):
+            return ' '.join(content.split('<tbody>')[1].split('</tbody>')[0].split())
+
+        paged = self.client.get(reverse('main:material_parts_list')).content.decode()
+        streamed = ''.join(_chunks(self.client.get(reverse('main:material_parts_list'), {'all': 1})))
+        self.assertEqual(tbody(paged), tbody(streamed))
+        self.assertIn('&lt;i&gt;SN&lt;/i&gt;', tbody(streamed))
+        self.assertIn(reverse('main:material_part_edit', args=[self.parts[0].id]), tbody(streamed))
@@ -0,0 +1,69 @@
+import json
+import uuid
+
+from django.test import TestCase, override_settings
+
+from main.models import MaterialOperations, MaterialStatus
+from main.tests.test_api import ApiTestMixin
+
+
+@override_settings(CHANGELOG_SETTLE_SECONDS=0)
+class TestSyncReference(ApiTestMixin, TestCase):
+    url = '/api/v1/sync/reference/'
+
+    def test_full_snapshot(self):
+        data = self.client.get(self.url).json()
+        self.assertTrue(data['full'])
+        self.assertEqual(data['statuses'], [[self.status.id, 'Готово']])
+        self.assertEqual([row[1] for row in data['parts']], [f'SN{i:03}' for i in range(5)])
+        self.assertGreater(data['token'], 0)
+
+    def test_delta(self):
+        token = self.client.get(self.url).json()['token']
+        data = self.client.get(self.url, {'since': token}).json()
+        self.assertFalse(data['full'])
+        self.assertEqual(data['statuses'], [])
+        self.assertEqual(data['deleted'], {})
+
+        self.status.name = 'Принято'
+        self.status.save()
+        removed = MaterialStatus.objects.create(name='Временный')
+        removed_id = removed.id
+        removed.delete()
+
+        data = self.client.get(self.url, {'since': token}).json()
+        self.assertEqual(data['statuses'], [[self.status.id, 'Принято']])
+        self.assertEqual(data['deleted'], {'statuses': [removed_id]})
+        self.assertEqual(data['parts'], [])
+
+    @override_settings(CHANGELOG_SETTLE_SECONDS=3600)
+    def test_token_waits_for_settle_window(self):
+        # Свежие изменения ещё могут «догнать» журнал - токен на них не продвигается
+        self.assertEqual(self.client.get(self.url).json()['token'], 0)
+
+
+class TestSyncOperations(ApiTestMixin, TestCase):
+    url = '/api/v1/sync/operations/'
+
+    def post(self, items):
+        return self.client.post(self.url, json.dumps(items), content_type='application/json')
+
+    def test_reupload_is_idempotent(self):
+        items = [dict(self.operation_item(part), uuid=str(uuid.uuid4())) for part in self.parts]
+        first = self.post(items).json()
+        self.assertEqual(len(first['accepted']), 5)
+        self.assertEqual(first['rejected'], {})
+
+        second = self.post(items).json()
+        self.assertEqual(second['accepted'], first['accepted'])
+        self.assertEqual(MaterialOperations.objects.count(), 5)
+
+    def test_invalid_items_rejected_individually(self):
+        good = dict(self.operation_item(self.parts[0]), uuid=str(uuid.uuid4()))
+        bad = dict(self.operation_item(self.parts[1], material_status=999), uuid=str(uuid.uuid4()))
+        no_uuid = self.operation_item(self.parts[2])
+        data = self.post([good, bad, no_uuid]).json()
+        self.assertEqual(list(data['accepted']), [good['uuid']])
+        self.assertIn('material_status', data['rejected'][bad['uuid']])
+        self.assertIn('uuid', data['rejected'][''])
+        self.assertEqual(MaterialOperations.objects.get().client_uuid, uuid.UUID(good['uuid']))
@@ -1,5 +1,15 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
+
+# В режиме ASGI страницы только для чтения и длинный опрос ленты изменений
+# обслуживают асинхронные версии
+if settings.ASYNC_VIEWS:
+    from . import async_views as read_views
+    changes_view = read_views.api_changes
+else:
+    read_views = views
+    changes_view = api.api_changes
 
 app_name = 'main'
 
@@ -9,29 +19,52 @@ urlpatterns = [
     path('admin-panel/', views.admin_panel_view, name='admin_panel'),
 
     # URLs для материальных узлов (основная рабочая таблица)
-    path('material-parts/', views.material_parts_list, name='material_parts_list'),
-    path('material-parts/<int:part_id>/', views.material_part_detail, name='material_part_detail'),
+    path('material-parts/', read_views.material_parts_list, name='material_parts_list'),
+    path('material-parts/<int:part_id>/', read_views.material_part_detail, name='material_part_detail'),
+    path('material-parts/<int:part_id>/operations/', views.material_part_operations, name='material_part_operations'),
     path('material-parts/<int:part_id>/edit/', views.material_part_edit, name='material_part_edit'),
     path('material-parts/create/', views.material_part_create, name='material_part_create'),
     path('material-parts/<int:part_id>/delete/', views.material_part_delete, name='material_part_delete'),
 
     # URLs для операций (журнал)
-    path('operations/', views.operations_list, name='operations_list'),
-    path('operations/<int:operation_id>/', views.operation_detail, name='operation_detail'),
+    path('operations/', read_views.operations_list, name='operations_list'),
+    path('operations/<int:operation_id>/', read_views.operation_detail, name='operation_detail'),
     path('operations/<int:operation_id>/edit/', views.operation_edit, name='operation_edit'),
     path('operations/create/', views.operation_create, name='operation_create'),
+    path('operations/scan/', views.scan_session, name='scan_session'),
+    path('operations/stream/', read_views.operations_stream, name='operations_stream'),
     path('operations/<int:operation_id>/delete/', views.operation_delete, name='operation_delete'),
 
     # URLs для астральных ревизий
-    path('astral-revisions/', views.astral_revisions_list, name='astral_revisions_list'),
-    path('astral-revisions/<int:revision_id>/', views.astral_revision_detail, name='astral_revision_detail'),
+    path('astral-revisions/', read_views.astral_revisions_list, name='astral_revisions_list'),
+    path('astral-revisions/<int:revision_id>/', read_views.astral_revision_detail, name='astral_revision_detail'),
+    path('astral-revisions/<int:revision_id>/material-parts/', views.astral_revision_material_parts, name='astral_revision_material_parts'),
     path('astral-revisions/<int:revision_id>/edit/', views.astral_revision_edit, name='astral_revision_edit'),
     path('astral-revisions/create/', views.astral_revision_create, name='astral_revision_create'),
     path('astral-revisions/<int:revision_id>/delete/', views.astral_revision_delete, name='astral_revision_delete'),
 
     # URLs для астральных узлов
-    path('astral-parts/', views.astral_parts_list, name='astral_parts_list'),
-    path('astral-parts/<int:part_id>/', views.astral_part_detail, name='astral_part_detail'),
+    path('astral-parts/', read_views.astral_parts_list, name='astral_parts_list'),
+    path('astral-parts/<int:part_id>/', read_views.astral_part_detail, name='astral_part_detail'),
     path('astral-parts/create/', views.astral_part_create, name='astral_part_create'),
     path('astral-parts/<int:part_id>/edit/', views.astral_part_edit, name='astral_part_edit'),
+
+    # Общий поиск по мере ввода
+    path('search/', views.global_search, name='global_search'),
+
+    # Файлы и уменьшенные копии изображений
+    path('media-files/<slug:kind>/<int:object_id>/<slug:field>/', read_views.media_download, name='media_download'),
+    path('renditions/<slug:kind>/<int:object_id>/<slug:size>.<slug:fmt>', read_views.image_rendition, name='image_rendition'),
+
+    # JSON API
+    path('api/v1/scans/', api.api_scans, name='api_scans'),
+    path('api/v1/sync/reference/', api.api_sync_reference, name='api_sync_reference'),
+    path('api/v1/sync/operations/', api.api_sync_operations, name='api_sync_operations'),
+    path('api/v1/changes/', changes_view, name='api_changes'),
+    path('api/v1/<slug:resource_name>/', api.api_list, name='api_list'),
+    path('api/v1/<slug:resource_name>/<int:object_id>/', api.api_detail, name='api_detail'),
+
+    # Фоновые задачи
+    path('jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('jobs/archive/', views.archive_start, name='archive_start'),
 ]
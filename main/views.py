@@ -1,14 +1,36 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.core.files.storage import default_storage
+from django.utils.cache import patch_cache_control
+from django.utils.http import urlencode
+from django.views.decorators.http import require_POST
+from django.conf import settings
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Q, Count
+from django.db.models import Q, Count, ProtectedError
 from .models import (
     MaterialPart, MaterialOperations, AstralRevision, AstralPart, AstralType,
     AstralVariant, AstralYear, AstralManufacturer, MaterialStatus, MaterialWarehouse,
-    MaterialOperationType, MaterialUser, MaterialGroup
+    MaterialOperationType, MaterialUser, MaterialGroup, BackgroundJob, MaterialPartRow
 )
-from .forms import MaterialPartForm, MaterialOperationsForm, AstralRevisionForm, AstralPartForm
+from .forms import MaterialPartForm, MaterialOperationsForm, AstralRevisionForm, AstralPartForm, ScanSessionForm
 from .qr_utils import get_material_part_url_qr, get_material_part_info_qr, get_astral_revision_url_qr, get_astral_revision_info_qr
+from .archive import has_archived_operations, get_archived_operations
+from .renditions import RENDITION_FORMATS, RENDITION_MODELS, RENDITION_SIZES, ensure_rendition
+from .downloads import DOWNLOAD_FIELDS, DOWNLOAD_MODELS, serve_field_file
+from .jobs import enqueue
+from .deletion import fast_delete
+from .scans import record_operations, resolve_scans
+from .conditional import conditional_page
+from .facets import Facet, deferred_facets, facet_counts
+from .prefetch import keyset_page, split_top, top_by_parent, top_related
+from .projections import build_row, catch_up, live_part_names_match, live_part_rows
+from .live import format_event, last_operation_id, operation_events, prepare_stream_response, stream_cursor
+from .registry import registry
+from .search import search
+from .streaming import material_part_row_urls, material_part_rows, operation_rows, stream_page
 
 
 def is_admin(user):
@@ -31,9 +53,12 @@ def dashboard_view(request):
     """Панель управления"""
     context = {
         'user': request.user,
-        'recent_operations': MaterialOperations.objects.select_related(
-            'material_part', 'material_operation_type', 'material_status'
-        ).order_by('-datetime')[:10],
+        'recent_operations': registry.attach(
+            MaterialOperations.objects.select_related('material_part').order_by('-datetime')[:10],
+            'material_operation_type', 'material_status',
+        ),
+        # Курсор живого журнала: страница получает только операции, созданные после неё
+        'last_operation_id': last_operation_id(),
     }
     return render(request, 'main/dashboard.html', context)
 
@@ -49,78 +74,221 @@ def admin_panel_view(request):
     return render(request, 'main/admin_panel.html', context)
 
 
+# ============== ВЕРСИИ СТРАНИЦ ==============
+# Модели, из которых строятся страницы: их изменения меняют ETag (см. conditional.py)
+
+ASTRAL_PARTS_MODELS = (AstralPart, AstralVariant, AstralType, AstralRevision)
+REVISIONS_MODELS = ASTRAL_PARTS_MODELS
+REVISION_DETAIL_MODELS = REVISIONS_MODELS + (MaterialPart,)
+OPERATIONS_MODELS = (
+    MaterialOperations, MaterialPart, MaterialOperationType, MaterialUser, MaterialStatus, MaterialWarehouse
+)
+OPERATION_DETAIL_MODELS = OPERATIONS_MODELS + (AstralRevision, AstralPart)
+# Список узлов показывает и последние операции с их статусами
+PARTS_LIST_MODELS = ASTRAL_PARTS_MODELS + (
+    MaterialPart, AstralYear, AstralManufacturer, MaterialOperations, MaterialStatus
+)
+PART_DETAIL_MODELS = PARTS_LIST_MODELS + (MaterialOperationType, MaterialUser, MaterialWarehouse)
+
+# ============== ОГРАНИЧЕННЫЕ ВЫБОРКИ СВЯЗАННЫХ СТРОК ==============
+# Сколько строк показывается сразу; остальное - «Показать ещё» по курсору (см. prefetch.py)
+
+MATERIAL_PARTS_PAGE_SIZE = 100
+LIST_LAST_OPERATIONS = 3
+PART_ROW_COLUMNS = (
+    'serial', 'part_names', 'type_names', 'revision_name', 'manufacturer_name', 'year', 'parent_id', 'parent_serial',
+)
+DETAIL_OPERATIONS_LIMIT = 20
+REVISION_PARTS_LIMIT = 50
+
+PARTS_ORDERING = ('id',)
+OPERATIONS_ORDERING = ('-datetime', '-id')
+
+
+# Справочники строк операций подставляются из реестра (registry.py), а не присоединяются
+OPERATION_REFERENCES = ('material_operation_type', 'material_user', 'material_status', 'material_warehouse')
+
+
+def part_operations_queryset():
+    return MaterialOperations.objects.order_by(*OPERATIONS_ORDERING)
+
+
+def revision_parts_queryset():
+    return MaterialPart.objects.select_related('astral_manufacturer', 'astral_year').order_by(*PARTS_ORDERING)
+
+
+def _more_url(view_name, object_id, cursor):
+    if cursor is None:
+        return None
+    return f"{reverse(view_name, args=[object_id])}?after={cursor}"
+
+
+def _rows_response(request, template_name, rows, more_url):
+    """Продолжение таблицы для «Показать ещё»: строки HTML и адрес следующей порции"""
+    return JsonResponse({'html': render_to_string(template_name, {'rows': rows}, request), 'next': more_url})
+
+
+# ============== ФАСЕТНЫЕ ФИЛЬТРЫ ==============
+# Количества для вариантов фильтров - одним запросом (см. facets.py)
+
+def _registry_choices(model):
+    return lambda: ((obj.pk, obj.name) for obj in registry.table(model).values())
+
+
+PARTS_LIST_FACETS = (
+    Facet('manufacturer', 'manufacturer_id', choices=_registry_choices(AstralManufacturer)),
+    Facet('year', 'year', descending=True),
+)
+OPERATIONS_LIST_FACETS = (
+    Facet('status', 'material_status_id', choices=_registry_choices(MaterialStatus)),
+    Facet('operation_type', 'material_operation_type_id', choices=_registry_choices(MaterialOperationType)),
+)
+ASTRAL_PARTS_FACETS = (
+    Facet('variant', 'astral_variant_id', choices=lambda: AstralVariant.objects.values_list('id', 'name')),
+)
+
+
 # ============== МАТЕРИАЛЬНЫЕ УЗЛЫ ==============
 
 @login_required
+@conditional_page(*PARTS_LIST_MODELS)
 def material_parts_list(request):
     """Список материальных узлов"""
+    context = material_parts_list_context(request)
+    if context['show_all']:
+        return stream_page(request, 'main/material_parts_list.html', context)
+    return render(request, 'main/material_parts_list.html', context)
+
+
+def material_parts_list_context(request):
+    """
+    Контекст списка материальных узлов (общий для WSGI и ASGI версий).
+
+    Страница по курсору ?after=; с ?all=1 - все найденные узлы потоком (streaming.py).
+    """
     search_query = request.GET.get('search', '')
     manufacturer_filter = request.GET.get('manufacturer', '')
     year_filter = request.GET.get('year', '')
 
-    parts = MaterialPart.objects.select_related(
-        'astral_revision',
-        'astral_year__astral_variant',
-        'astral_manufacturer',
-        'parent'
-    ).prefetch_related('astral_revision__astral_parts__astral_variant__astral_type').all()
+    # Строки списка - из проекции material_part_row (projections.py), без соединений;
+    # пока проекция перестраивается в фоне - из исходных таблиц с теми же полями
+    from_rows = catch_up() is not None
+    parts = MaterialPartRow.objects.only(*PART_ROW_COLUMNS) if from_rows else live_part_rows()
 
     if search_query:
         parts = parts.filter(
             Q(serial__icontains=search_query) |
-            Q(astral_revision__name__icontains=search_query) |
-            Q(astral_revision__astral_parts__name__icontains=search_query)
+            Q(revision_name__icontains=search_query) |
+            (Q(part_names__icontains=search_query) if from_rows else live_part_names_match(search_query))
         )
+    facets = facet_counts(parts, PARTS_LIST_FACETS, request.GET, PARTS_LIST_MODELS)
 
     if manufacturer_filter:
-        parts = parts.filter(astral_manufacturer_id=manufacturer_filter)
+        parts = parts.filter(manufacturer_id=manufacturer_filter)
 
     if year_filter:
-        parts = parts.filter(astral_year__year=year_filter)
+        parts = parts.filter(year=year_filter)
+
+    last_operations_queryset = MaterialOperations.objects.only(
+        'datetime', 'material_part', 'material_status'
+    ).order_by(*OPERATIONS_ORDERING)
+    show_all = bool(request.GET.get('all'))
+    show_all_url = None
+    if show_all:
+        parts = material_part_rows(
+            parts.order_by(*PARTS_ORDERING), is_admin(request.user), last_operations_queryset, LIST_LAST_OPERATIONS,
+        )
+        next_page_url = None
+    else:
+        try:
+            parts, cursor = keyset_page(parts, PARTS_ORDERING, request.GET.get('after'), MATERIAL_PARTS_PAGE_SIZE)
+        except ValueError:
+            raise Http404('Некорректный курсор')
+        if not from_rows:
+            parts = [build_row(part) for part in parts]
+        last_operations = top_by_parent(
+            last_operations_queryset, 'material_part_id', [part.id for part in parts], LIST_LAST_OPERATIONS,
+        )
+        for part in parts:
+            part.last_operations = registry.attach(last_operations.get(part.id, []), 'material_status')
+        next_page_url = None
+        if cursor is not None:
+            query = request.GET.copy()
+            query['after'] = cursor
+            next_page_url = f'?{query.urlencode()}'
+            query.pop('after')
+            query['all'] = '1'
+            show_all_url = f'?{query.urlencode()}'
 
     context = {
         'parts': parts,
+        'part_urls': material_part_row_urls(),
+        'next_page_url': next_page_url,
+        'show_all_url': show_all_url,
+        'show_all': show_all,
         'search_query': search_query,
-        'manufacturers': AstralManufacturer.objects.all(),
-        'years': AstralYear.objects.values_list('year', flat=True).distinct().order_by('-year'),
+        'facets': facets,
         'manufacturer_filter': manufacturer_filter,
         'year_filter': year_filter,
         'is_admin': is_admin(request.user)
     }
-    return render(request, 'main/material_parts_list.html', context)
+    return context
 
 
 @login_required
+@conditional_page(*PART_DETAIL_MODELS)
 def material_part_detail(request, part_id):
     """Детальная информация о материальном узле"""
-    part = get_object_or_404(
-        MaterialPart.objects.select_related(
-            'astral_revision',
-            'astral_year__astral_variant',
-            'astral_manufacturer',
-            'parent'
-        ).prefetch_related(
-            'astral_revision__astral_parts__astral_variant__astral_type',
-            'children',
-            'operations'
-        ),
-        pk=part_id
-    )
+    part = get_object_or_404(material_part_detail_queryset(), pk=part_id)
+    context = material_part_detail_context(request, part)
 
     # Генерируем QR-коды
-    qr_url = get_material_part_url_qr(part, request)
-    qr_info = get_material_part_info_qr(part)
+    context['qr_url'] = get_material_part_url_qr(part, request)
+    context['qr_info'] = get_material_part_info_qr(part)
+    return render(request, 'main/material_part_detail.html', context)
 
-    context = {
+
+def material_part_detail_queryset():
+    return MaterialPart.objects.select_related(
+        'astral_revision',
+        'astral_year__astral_variant',
+        'astral_manufacturer',
+        'parent'
+    ).prefetch_related(
+        'astral_revision__astral_parts__astral_variant__astral_type',
+        'children',
+        top_related('operations', part_operations_queryset(), DETAIL_OPERATIONS_LIMIT, to_attr='recent_operations'),
+    )
+
+
+def material_part_detail_context(request, part):
+    """Контекст карточки материального узла без QR-кодов"""
+    # Архивная история читается из холодного хранилища только по запросу
+    show_archive = request.GET.get('archive') == '1'
+
+    operations, cursor = split_top(part.recent_operations, DETAIL_OPERATIONS_LIMIT, OPERATIONS_ORDERING)
+    registry.attach(operations, *OPERATION_REFERENCES)
+    return {
         'part': part,
-        'qr_url': qr_url,
-        'qr_info': qr_info,
-        'operations': part.operations.select_related(
-            'material_operation_type', 'material_user', 'material_status', 'material_warehouse'
-        ).order_by('-datetime')[:20],
+        'operations': operations,
+        'operations_more_url': _more_url('main:material_part_operations', part.id, cursor),
+        'has_archive': has_archived_operations(part.id),
+        'archived_operations': get_archived_operations(part.id) if show_archive else None,
         'is_admin': is_admin(request.user)
     }
-    return render(request, 'main/material_part_detail.html', context)
+
+
+@login_required
+def material_part_operations(request, part_id):
+    """Следующая порция истории операций узла (после курсора ?after=)"""
+    operations = part_operations_queryset().filter(material_part_id=part_id)
+    try:
+        rows, cursor = keyset_page(operations, OPERATIONS_ORDERING, request.GET.get('after'), DETAIL_OPERATIONS_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'Некорректный курсор'}, status=400)
+    registry.attach(rows, *OPERATION_REFERENCES)
+    more_url = _more_url('main:material_part_operations', part_id, cursor)
+    return _rows_response(request, 'main/includes/operation_rows.html', rows, more_url)
 
 
 @login_required
@@ -174,7 +342,11 @@ def material_part_delete(request, part_id):
 
     if request.method == 'POST':
         serial = part.serial
-        part.delete()
+        try:
+            fast_delete(MaterialPart.objects.filter(pk=part.pk))
+        except ProtectedError as e:
+            messages.error(request, e.args[0])
+            return redirect('main:material_part_detail', part_id=part.pk)
         messages.success(request, f'Материальный узел {serial} успешно удален!')
         return redirect('main:material_parts_list')
 
@@ -187,25 +359,29 @@ def material_part_delete(request, part_id):
 # ============== ОПЕРАЦИИ ==============
 
 @login_required
+@conditional_page(*OPERATIONS_MODELS)
 def operations_list(request):
-    """Список операций (журнал)"""
+    """Список операций (журнал); строки таблицы отдаются потоком"""
+    return stream_page(request, 'main/operations_list.html', operations_list_context(request))
+
+
+def operations_list_context(request):
+    """Контекст журнала операций (общий для WSGI и ASGI версий)"""
     search_query = request.GET.get('search', '')
     status_filter = request.GET.get('status', '')
     operation_type_filter = request.GET.get('operation_type', '')
 
-    operations = MaterialOperations.objects.select_related(
-        'material_operation_type',
-        'material_user',
-        'material_part',
-        'material_status',
-        'material_warehouse'
-    ).all()
+    # Присоединяется только material_part; справочники - из реестра.
+    # Сортировка модели (-datetime) и колонки строки покрываются индексом mo_datetime_cover_idx
+    operations = MaterialOperations.objects.all()
 
     if search_query:
         operations = operations.filter(
             Q(material_part__serial__icontains=search_query) |
             Q(description__icontains=search_query)
         )
+    # Количества по всему журналу считаются после строк - первый байт их не ждёт
+    facets, facet_counts_script = deferred_facets(operations, OPERATIONS_LIST_FACETS, request.GET, OPERATIONS_MODELS)
 
     if status_filter:
         operations = operations.filter(material_status_id=status_filter)
@@ -214,30 +390,37 @@ def operations_list(request):
         operations = operations.filter(material_operation_type_id=operation_type_filter)
 
     context = {
-        'operations': operations,
+        'operations': operation_rows(operations, is_admin(request.user)),
         'search_query': search_query,
-        'statuses': MaterialStatus.objects.all(),
-        'operation_types': MaterialOperationType.objects.all(),
+        'facets': facets,
+        'facet_counts': facet_counts_script,
         'status_filter': status_filter,
         'operation_type_filter': operation_type_filter,
         'is_admin': is_admin(request.user)
     }
-    return render(request, 'main/operations_list.html', context)
+    return context
+
+
+@login_required
+def operations_stream(request):
+    """
+    Новые операции для живого журнала (text/event-stream).
+
+    Синхронный режим не держит соединение открытым: ответ содержит операции после
+    курсора и сразу закрывается, браузер переподключается через ``retry``.
+    Постоянный поток - у асинхронной версии (ASGI).
+    """
+    after = stream_cursor(request)
+    events = operation_events(after, settings.LIVE_BATCH_SIZE) if after is not None else []
+    body = f'retry: {settings.LIVE_RETRY_MS}\n\n' + ''.join(format_event(event) for event in events)
+    return prepare_stream_response(HttpResponse(body, content_type='text/event-stream'))
 
 
 @login_required
+@conditional_page(*OPERATION_DETAIL_MODELS)
 def operation_detail(request, operation_id):
     """Детальная информация об операции"""
-    operation = get_object_or_404(
-        MaterialOperations.objects.select_related(
-            'material_operation_type',
-            'material_user',
-            'material_part__astral_revision',
-            'material_status',
-            'material_warehouse'
-        ).prefetch_related('material_part__astral_revision__astral_parts'),
-        pk=operation_id
-    )
+    operation = get_object_or_404(operation_detail_queryset(), pk=operation_id)
 
     context = {
         'operation': operation,
@@ -246,6 +429,16 @@ def operation_detail(request, operation_id):
     return render(request, 'main/operation_detail.html', context)
 
 
+def operation_detail_queryset():
+    return MaterialOperations.objects.select_related(
+        'material_operation_type',
+        'material_user',
+        'material_part__astral_revision',
+        'material_status',
+        'material_warehouse'
+    ).prefetch_related('material_part__astral_revision__astral_parts')
+
+
 @login_required
 def operation_create(request):
     """Создание операции"""
@@ -305,11 +498,52 @@ def operation_delete(request, operation_id):
     return render(request, 'main/operation_confirm_delete.html', context)
 
 
+@login_required
+def scan_session(request):
+    """Сеанс сканирования: одна операция для пачки узлов"""
+    if request.method == 'POST':
+        form = ScanSessionForm(request.POST)
+        if form.is_valid():
+            parts, unknown = resolve_scans(form.scan_list())
+            if unknown:
+                form.add_error('scans', 'Не найдены узлы: ' + ', '.join(unknown))
+            elif not parts:
+                form.add_error('scans', 'Нет ни одного скана')
+            else:
+                data = form.cleaned_data
+                created = record_operations(
+                    parts,
+                    material_operation_type=data['material_operation_type'],
+                    material_status=data['material_status'],
+                    material_warehouse=data['material_warehouse'],
+                    material_user=data['material_user'],
+                    datetime=data['datetime'],
+                    description=data['description'],
+                )
+                messages.success(request, f'Создано операций: {len(created)}')
+                # Перенаправление: обновление страницы не отправит пачку повторно;
+                # общие поля переходят в адрес и остаются заполненными
+                shared = {name: request.POST[name] for name in ScanSessionForm.shared_fields if request.POST.get(name)}
+                url = reverse('main:scan_session')
+                return redirect(f'{url}?{urlencode(shared)}' if shared else url)
+    else:
+        initial = {name: request.GET[name] for name in ScanSessionForm.shared_fields if request.GET.get(name)}
+        form = ScanSessionForm(initial=initial)
+
+    return render(request, 'main/scan_session.html', {'form': form})
+
+
 # ============== АСТРАЛЬНЫЕ РЕВИЗИИ ==============
 
 @login_required
+@conditional_page(*REVISIONS_MODELS)
 def astral_revisions_list(request):
     """Список астральных ревизий"""
+    return render(request, 'main/astral_revisions_list.html', astral_revisions_list_context(request))
+
+
+def astral_revisions_list_context(request):
+    """Контекст списка астральных ревизий"""
     search_query = request.GET.get('search', '')
 
     revisions = AstralRevision.objects.prefetch_related(
@@ -322,36 +556,55 @@ def astral_revisions_list(request):
             Q(astral_parts__name__icontains=search_query)
         )
 
-    context = {
+    return {
         'revisions': revisions,
         'search_query': search_query,
         'is_admin': is_admin(request.user)
     }
-    return render(request, 'main/astral_revisions_list.html', context)
 
 
 @login_required
+@conditional_page(*REVISION_DETAIL_MODELS)
 def astral_revision_detail(request, revision_id):
     """Детальная информация об астральной ревизии"""
-    revision = get_object_or_404(
-        AstralRevision.objects.prefetch_related(
-            'astral_parts__astral_variant__astral_type'
-        ).select_related('parent').prefetch_related('material_parts'),
-        pk=revision_id
-    )
+    revision = get_object_or_404(astral_revision_detail_queryset(), pk=revision_id)
+    context = astral_revision_detail_context(request, revision)
 
     # Генерируем QR-коды
-    qr_url = get_astral_revision_url_qr(revision, request)
-    qr_info = get_astral_revision_info_qr(revision)
+    context['qr_url'] = get_astral_revision_url_qr(revision, request)
+    context['qr_info'] = get_astral_revision_info_qr(revision)
+    return render(request, 'main/astral_revision_detail.html', context)
 
-    context = {
+
+def astral_revision_detail_queryset():
+    return AstralRevision.objects.prefetch_related(
+        'astral_parts__astral_variant__astral_type'
+    ).select_related('parent').prefetch_related(
+        top_related('material_parts', revision_parts_queryset(), REVISION_PARTS_LIMIT, to_attr='first_material_parts')
+    )
+
+
+def astral_revision_detail_context(request, revision):
+    """Контекст карточки астральной ревизии без QR-кодов"""
+    material_parts, cursor = split_top(revision.first_material_parts, REVISION_PARTS_LIMIT, PARTS_ORDERING)
+    return {
         'revision': revision,
-        'qr_url': qr_url,
-        'qr_info': qr_info,
-        'material_parts': revision.material_parts.all()[:50],
+        'material_parts': material_parts,
+        'material_parts_more_url': _more_url('main:astral_revision_material_parts', revision.id, cursor),
         'is_admin': is_admin(request.user)
     }
-    return render(request, 'main/astral_revision_detail.html', context)
+
+
+@login_required
+def astral_revision_material_parts(request, revision_id):
+    """Следующая порция материальных узлов ревизии (после курсора ?after=)"""
+    parts = revision_parts_queryset().filter(astral_revision_id=revision_id)
+    try:
+        rows, cursor = keyset_page(parts, PARTS_ORDERING, request.GET.get('after'), REVISION_PARTS_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'Некорректный курсор'}, status=400)
+    more_url = _more_url('main:astral_revision_material_parts', revision_id, cursor)
+    return _rows_response(request, 'main/includes/revision_part_rows.html', rows, more_url)
 
 
 @login_required
@@ -405,7 +658,11 @@ def astral_revision_delete(request, revision_id):
 
     if request.method == 'POST':
         name = revision.name
-        revision.delete()
+        try:
+            fast_delete(AstralRevision.objects.filter(pk=revision.pk))
+        except ProtectedError as e:
+            messages.error(request, e.args[0])
+            return redirect('main:astral_revision_detail', revision_id=revision.pk)
         messages.success(request, f'Астральная ревизия {name} успешно удалена!')
         return redirect('main:astral_revisions_list')
 
@@ -418,8 +675,14 @@ def astral_revision_delete(request, revision_id):
 # ============== АСТРАЛЬНЫЕ УЗЛЫ ==============
 
 @login_required
+@conditional_page(*ASTRAL_PARTS_MODELS)
 def astral_parts_list(request):
     """Список астральных узлов"""
+    return render(request, 'main/astral_parts_list.html', astral_parts_list_context(request))
+
+
+def astral_parts_list_context(request):
+    """Контекст списка астральных узлов"""
     search_query = request.GET.get('search', '')
     variant_filter = request.GET.get('variant', '')
 
@@ -432,6 +695,7 @@ def astral_parts_list(request):
             Q(name__icontains=search_query) |
             Q(decimal_num__icontains=search_query)
         )
+    facets = facet_counts(parts, ASTRAL_PARTS_FACETS, request.GET, ASTRAL_PARTS_MODELS)
 
     if variant_filter:
         parts = parts.filter(astral_variant_id=variant_filter)
@@ -439,22 +703,18 @@ def astral_parts_list(request):
     context = {
         'parts': parts,
         'search_query': search_query,
-        'variants': AstralVariant.objects.all(),
+        'facets': facets,
         'variant_filter': variant_filter,
         'is_admin': is_admin(request.user)
     }
-    return render(request, 'main/astral_parts_list.html', context)
+    return context
 
 
 @login_required
+@conditional_page(*ASTRAL_PARTS_MODELS)
 def astral_part_detail(request, part_id):
     """Детальная информация об астральном узле"""
-    part = get_object_or_404(
-        AstralPart.objects.select_related(
-            'astral_variant__astral_type'
-        ).prefetch_related('revisions'),
-        pk=part_id
-    )
+    part = get_object_or_404(astral_part_detail_queryset(), pk=part_id)
 
     context = {
         'part': part,
@@ -464,6 +724,12 @@ def astral_part_detail(request, part_id):
     return render(request, 'main/astral_part_detail.html', context)
 
 
+def astral_part_detail_queryset():
+    return AstralPart.objects.select_related(
+        'astral_variant__astral_type'
+    ).prefetch_related('revisions')
+
+
 @login_required
 @user_passes_test(is_admin)
 def astral_part_create(request):
@@ -505,3 +771,78 @@ def astral_part_edit(request, part_id):
         'title': f'Редактирование {part.name}'
     }
     return render(request, 'main/astral_part_form.html', context)
+
+
+# ============== ОБЩИЙ ПОИСК ==============
+
+@login_required
+def global_search(request):
+    """Поиск по мере ввода для строки поиска в шапке: результаты, сгруппированные по сущностям"""
+    query = request.GET.get('q', '').strip()
+    response = JsonResponse({'query': query, 'groups': search(query)})
+    # Повторный ввод той же строки (стёр и набрал снова) браузер возьмёт из своего кеша
+    patch_cache_control(response, private=True, max_age=10)
+    return response
+
+
+# ============== ФАЙЛЫ И ИЗОБРАЖЕНИЯ ==============
+
+@login_required
+def media_download(request, kind, object_id, field):
+    """Скачивание файла или изображения операции / ревизии"""
+    model = DOWNLOAD_MODELS.get(kind)
+    if model is None or field not in DOWNLOAD_FIELDS:
+        raise Http404
+    obj = get_object_or_404(model.objects.only(field), pk=object_id)
+    field_file = getattr(obj, field)
+    if not field_file:
+        raise Http404
+    return serve_field_file(request, field_file, as_attachment=request.GET.get('inline') != '1')
+
+
+@login_required
+def image_rendition(request, kind, object_id, size, fmt):
+    """Уменьшенная копия изображения операции или ревизии"""
+    model = RENDITION_MODELS.get(kind)
+    if model is None or size not in RENDITION_SIZES or fmt not in RENDITION_FORMATS:
+        raise Http404
+    obj = get_object_or_404(model.objects.only('image'), pk=object_id)
+    if not obj.image:
+        raise Http404
+
+    # Если фоновая генерация ещё не успела, создаём копию синхронно
+    name = ensure_rendition(obj.image.storage, obj.image.name, size, fmt)
+    response = FileResponse(default_storage.open(name, 'rb'), content_type=RENDITION_FORMATS[fmt][1])
+    # URL содержит версию изображения (?v=...), поэтому ответ можно кэшировать навсегда
+    patch_cache_control(response, private=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response
+
+
+# ============== ФОНОВЫЕ ЗАДАЧИ ==============
+
+@login_required
+@user_passes_test(is_admin)
+@require_POST
+def archive_start(request):
+    """Запуск архивации старых операций в фоне"""
+    job = enqueue('archive.operations', created_by=request.user, days=settings.ARCHIVE_HORIZON_DAYS)
+    return JsonResponse({'id': job.id, 'status': job.status}, status=202)
+
+
+@login_required
+def job_status(request, job_id):
+    """Состояние фоновой задачи (опрашивается со страницы): только поставившему её и персоналу"""
+    jobs = BackgroundJob.objects.all()
+    if not is_admin(request.user):
+        jobs = jobs.filter(created_by=request.user)
+    job = get_object_or_404(jobs, pk=job_id)
+    return JsonResponse({
+        'id': job.id,
+        'task': job.task,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': job.result,
+        'finished': job.status in (BackgroundJob.STATUS_DONE, BackgroundJob.STATUS_FAILED),
+    })
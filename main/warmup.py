@@ -0,0 +1,51 @@
+"""
+Прогрев процесса перед первым запросом.
+
+Django многое делает лениво: импорт представлений при первом разрешении URL,
+построение таблиц ``reverse``, компиляцию шаблонов (кэширующий загрузчик),
+тяжёлые библиотеки QR-кодов и изображений импортируются при первом
+использовании. ``warm_up`` выполняет всё это заранее - в мастере gunicorn при
+``preload_app`` (воркеры получают готовое через fork) или в каждом воркере.
+"""
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+# Модули, которые приложение импортирует лениво, при первом QR-коде или рендишене
+HEAVY_MODULES = ('qrcode', 'qrcode.image.pil', 'PIL.Image', 'PIL.ImageOps')
+
+
+def template_names():
+    names = []
+    for directory in settings.TEMPLATES[0]['DIRS']:
+        root = Path(directory)
+        names += [path.relative_to(root).as_posix() for path in sorted(root.rglob('*.html'))]
+    return names
+
+
+def warm_up(heavy_modules=True):
+    """Разрешение URL, таблицы reverse и шаблоны проекта; возвращает время в секундах"""
+    started = time.monotonic()
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+    for namespace in resolver.namespace_dict:
+        resolver.namespace_dict[namespace][1].reverse_dict
+
+    for name in template_names():
+        try:
+            get_template(name)
+        except (TemplateDoesNotExist, TemplateSyntaxError):
+            logger.exception('Шаблон %s не загружен при прогреве', name)
+
+    if heavy_modules:
+        for module in HEAVY_MODULES:
+            __import__(module)
+    return time.monotonic() - started
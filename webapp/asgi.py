@@ -0,0 +1,9 @@
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webapp.settings')
+# Асинхронные версии представлений только для чтения (main/async_views.py)
+os.environ.setdefault('ASYNC_VIEWS', '1')
+
+application = get_asgi_application()
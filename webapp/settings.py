@@ -1,5 +1,6 @@
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -26,6 +27,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'main.static_assets.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -108,3 +110,122 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Архив (холодное хранилище) журнала операций
+ARCHIVE_ROOT = config('ARCHIVE_ROOT', default=str(BASE_DIR / 'archive'))
+ARCHIVE_HORIZON_DAYS = config('ARCHIVE_HORIZON_DAYS', default=365, cast=int)
+ARCHIVE_SEGMENT_ROWS = config('ARCHIVE_SEGMENT_ROWS', default=50000, cast=int)
+
+# Отдача файлов через обратный прокси: '' (сам Django), 'nginx' (X-Accel-Redirect)
+# или 'sendfile' (X-Sendfile для Apache/lighttpd)
+SENDFILE_BACKEND = config('SENDFILE_BACKEND', default='')
+SENDFILE_URL_PREFIX = config('SENDFILE_URL_PREFIX', default='/protected-media/')
+
+# Фоновые задачи (manage.py runworker)
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=3, cast=int)
+JOB_RETRY_DELAY = config('JOB_RETRY_DELAY', default=30, cast=int)  # секунд, удваивается с каждой попыткой
+JOB_STALE_TIMEOUT = config('JOB_STALE_TIMEOUT', default=900, cast=int)  # секунд без сигнала обработчика до перезапуска задачи
+JOB_HEARTBEAT_INTERVAL = config('JOB_HEARTBEAT_INTERVAL', default=30, cast=int)  # секунд между сигналами обработчика
+JOB_POLL_INTERVAL = config('JOB_POLL_INTERVAL', default=1.0, cast=float)
+
+# Режим ASGI (webapp/asgi.py): асинхронные представления только для чтения
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+ASYNC_CPU_WORKERS = config('ASYNC_CPU_WORKERS', default=4, cast=int)  # потоки для QR-кодов и рендишенов
+
+# JSON API
+API_PAGE_SIZE = config('API_PAGE_SIZE', default=100, cast=int)
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=1000, cast=int)
+API_BULK_MAX_ITEMS = config('API_BULK_MAX_ITEMS', default=1000, cast=int)
+
+# Журнал изменений (outbox): курсор не продвигается дальше изменений моложе этого срока
+CHANGELOG_SETTLE_SECONDS = config('CHANGELOG_SETTLE_SECONDS', default=5, cast=int)
+# Срок хранения журнала (manage.py prune_change_log) и размер пачки удаления
+CHANGELOG_RETENTION_DAYS = config('CHANGELOG_RETENTION_DAYS', default=30, cast=int)
+CHANGELOG_PRUNE_CHUNK_SIZE = config('CHANGELOG_PRUNE_CHUNK_SIZE', default=5000, cast=int)
+# Длинный опрос ленты изменений: максимальное ожидание и интервал проверки, секунды
+CHANGES_MAX_WAIT = config('CHANGES_MAX_WAIT', default=25, cast=int)
+CHANGES_POLL_INTERVAL = config('CHANGES_POLL_INTERVAL', default=1, cast=float)
+# Сколько потоков синхронного воркера могут одновременно ждать в длинном опросе
+# (меньше GUNICORN_THREADS в gunicorn.conf.py); остальным ответ приходит сразу. В режиме ASGI не ограничено
+CHANGES_MAX_WAITERS = config('CHANGES_MAX_WAITERS', default=1, cast=int)
+
+# Живой журнал операций (SSE): опрос таблицы без LISTEN/NOTIFY, размер пачки,
+# очередь клиента, пинг и длительность потока (секунды), пауза переподключения (мс)
+LIVE_POLL_INTERVAL = config('LIVE_POLL_INTERVAL', default=1, cast=float)
+LIVE_BATCH_SIZE = config('LIVE_BATCH_SIZE', default=100, cast=int)
+LIVE_QUEUE_SIZE = config('LIVE_QUEUE_SIZE', default=100, cast=int)
+LIVE_HEARTBEAT = config('LIVE_HEARTBEAT', default=15, cast=int)
+LIVE_STREAM_SECONDS = config('LIVE_STREAM_SECONDS', default=300, cast=int)
+LIVE_RETRY_MS = config('LIVE_RETRY_MS', default=5000, cast=int)
+
+# Быстрое удаление (main/deletion.py): строк в одной пачке / транзакции
+DELETE_CHUNK_SIZE = config('DELETE_CHUNK_SIZE', default=1000, cast=int)
+
+# Кэш. По умолчанию - память процесса (разработка, один процесс); при нескольких
+# процессах нужен общий кэш, иначе выход из системы и изменения пользователя
+# видны другим процессам только по истечении срока записи:
+# CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache, CACHE_LOCATION=memcached:11211
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+# Кэш памяти процесса и заглушка не общие для процессов gunicorn
+SHARED_CACHE = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Сессии и пользователь запроса читаются из кэша (accounts/backends.py). Сессии
+# в кэше - только при общем кэше: иначе выход из системы сбрасывает сессию лишь в
+# кэше обработавшего его процесса, а остальные принимают её до истечения записи
+SESSION_ENGINE = config(
+    'SESSION_ENGINE',
+    default='django.contrib.sessions.backends.cached_db' if SHARED_CACHE else 'django.contrib.sessions.backends.db',
+)
+if not SHARED_CACHE and SESSION_ENGINE in (
+    'django.contrib.sessions.backends.cache', 'django.contrib.sessions.backends.cached_db',
+):
+    raise ImproperlyConfigured(f'{SESSION_ENGINE} требует общего кэша (CACHE_BACKEND), а не памяти процесса')
+AUTHENTICATION_BACKENDS = ['accounts.backends.CachedModelBackend']
+AUTH_USER_CACHE_SECONDS = config('AUTH_USER_CACHE_SECONDS', default=60, cast=int)
+
+# Статика: имена с хэшем, gzip / brotli копии при collectstatic и отдача с
+# Cache-Control: immutable (main/static_assets.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'main.static_assets.CompressedManifestStorage'},
+}
+STATIC_SERVE = config('STATIC_SERVE', default=True, cast=bool)
+
+# Справочники в памяти процесса (main/registry.py): как часто проверять версию, секунды
+REFERENCE_CHECK_INTERVAL = config('REFERENCE_CHECK_INTERVAL', default=1, cast=float)
+
+# Проекция списка материальных узлов (main/projections.py): сколько записей журнала
+# применяется в запросе страницы; при большем отставании таблица перестраивается
+# фоновой задачей, а список читает исходные таблицы
+PROJECTION_MAX_LAG = config('PROJECTION_MAX_LAG', default=1000, cast=int)
+
+# Потоковая отдача больших таблиц (main/streaming.py): строк в одной пачке ответа
+STREAM_CHUNK_ROWS = config('STREAM_CHUNK_ROWS', default=500, cast=int)
+
+# Количества фасетных фильтров списков (main/facets.py): время жизни в кеше, секунды
+FACETS_CACHE_SECONDS = config('FACETS_CACHE_SECONDS', default=300, cast=int)
+
+# Общий поиск (main/search.py): минимальная длина запроса, с какой длины
+# включается нечёткий поиск по триграммам (PostgreSQL), результатов в группе
+SEARCH_MIN_LENGTH = config('SEARCH_MIN_LENGTH', default=2, cast=int)
+SEARCH_TRIGRAM_MIN_LENGTH = config('SEARCH_TRIGRAM_MIN_LENGTH', default=3, cast=int)
+SEARCH_GROUP_SIZE = config('SEARCH_GROUP_SIZE', default=5, cast=int)
+# Объектов в одной пачке обновления индекса и как часто догонять журнал изменений, секунды
+SEARCH_INDEX_CHUNK_SIZE = config('SEARCH_INDEX_CHUNK_SIZE', default=1000, cast=int)
+SEARCH_INDEX_CHECK_INTERVAL = config('SEARCH_INDEX_CHECK_INTERVAL', default=1, cast=float)
+# Сколько записей журнала применяет запрос поиска (запросы идут на каждое нажатие
+# клавиши); при большем отставании индекс перестраивается фоновой задачей
+SEARCH_INDEX_MAX_LAG = config('SEARCH_INDEX_MAX_LAG', default=200, cast=int)
+
+# Сборка осиротевших файлов дедуплицирующего хранилища (manage.py sweep_blobs):
+# файлы моложе этого возраста (секунды) не трогаются - их сохранение может ещё идти
+BLOB_SWEEP_MIN_AGE = config('BLOB_SWEEP_MIN_AGE', default=3600, cast=int)